@@ -0,0 +1,232 @@
+# batch.py
+
+# Mode batch de l'agent : les questions d'un fichier (JSONL ou CSV) sont traduites en SQL
+# et exécutées en parallèle sur un pool de threads borné, avec une connexion du pool MySQL
+# par thread. Chaque question terminée est aussitôt inscrite dans un journal, ce qui
+# permet de reprendre un lot interrompu sans refaire ce qui a déjà réussi.
+#
+# Usage : python -m agent.batch questions.jsonl --output-dir rapports/ [--format parquet] [--workers 8]
+#
+# Dans le dossier de sortie :
+#   journal.jsonl          une ligne par question traitée (reprise après interruption) ;
+#   summary.csv|parquet    question, SQL généré, nombre de lignes, statut et durée de chaque étape ;
+#   results/<id>.csv|parquet  les résultats de chaque question réussie.
+
+# Importations
+import argparse
+import contextvars
+import csv
+import importlib.util
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import pandas as pd
+
+from agent.cache import fingerprint
+from agent.pipeline import StageTimer
+from agent.sql_agent import execute_sql_dataframe, generate_sql_query, get_database_schema, get_db_pool, setup_groq_client
+from agent.sql_guard import QueryGuardError
+from agent.workload import set_session
+
+OUTPUT_FORMATS = ("csv", "parquet")
+JOURNAL_NAME = "journal.jsonl"
+
+
+def read_questions(path):
+    """
+    Lit les questions d'un fichier JSONL (`{"question": ..., "id": ...}` par ligne) ou CSV
+    (colonnes `question` et, facultativement, `id`).
+
+    Sans identifiant explicite, l'identifiant est l'empreinte de la question : il reste le
+    même d'une exécution à l'autre, ce qui sert à la reprise.
+
+    Returns:
+        list: Liste de dictionnaires {"id", "question"}, sans doublon d'identifiant.
+    """
+    if path.lower().endswith(".csv"):
+        with open(path, newline="", encoding="utf-8-sig") as questions_file:
+            records = list(csv.DictReader(questions_file))
+    else:
+        with open(path, encoding="utf-8") as questions_file:
+            records = [json.loads(line) for line in questions_file if line.strip()]
+
+    questions, seen = [], set()
+    for record in records:
+        question = (record.get("question") or "").strip()
+        if not question:
+            continue
+        question_id = str(record.get("id") or fingerprint(question))
+        if question_id in seen:
+            continue
+        seen.add(question_id)
+        questions.append({"id": question_id, "question": question})
+    return questions
+
+
+def read_journal(output_dir):
+    """Dernier état connu de chaque question (id -> ligne du journal)."""
+    journal_path = os.path.join(output_dir, JOURNAL_NAME)
+    entries = {}
+    if not os.path.exists(journal_path):
+        return entries
+    with open(journal_path, encoding="utf-8") as journal_file:
+        for line in journal_file:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                # Dernière ligne tronquée par une interruption : la question sera refaite.
+                continue
+            entries[entry["id"]] = entry
+    return entries
+
+
+def write_results(df, path, output_format):
+    if output_format == "parquet":
+        df.to_parquet(path, index=False)
+    else:
+        df.to_csv(path, index=False)
+
+
+def run_question(pool, item, db_schema, groq_client, results_dir, output_format):
+    """
+    Génère et exécute la requête d'une question, puis enregistre ses résultats.
+
+    Returns:
+        dict: La ligne du journal (statut, SQL, nombre de lignes, durées par étape).
+    """
+    timer = StageTimer()
+    entry = {"id": item["id"], "question": item["question"], "status": "ok", "sql": None,
+             "row_count": None, "truncated": False, "error": None, "results_file": None}
+    try:
+        with timer.span("sql_generation"):
+            sql_query = generate_sql_query(item["question"], db_schema, groq_client)
+        entry["sql"] = sql_query
+        if not sql_query:
+            entry.update(status="error", error="Aucune requête générée.")
+        else:
+            with timer.span("sql_execute"):
+                results = execute_sql_dataframe(pool, sql_query)
+            if results is None:
+                entry.update(status="error", error="Échec de l'exécution de la requête.")
+            else:
+                entry["row_count"] = len(results)
+                entry["truncated"] = bool(results.attrs.get("truncated"))
+                results_file = os.path.join(results_dir, f"{item['id']}.{output_format}")
+                with timer.span("export"):
+                    write_results(results, results_file, output_format)
+                entry["results_file"] = os.path.relpath(results_file, os.path.dirname(results_dir))
+    except QueryGuardError as e:
+        entry.update(status="rejected", error=str(e))
+    except Exception as e:
+        entry.update(status="error", error=f"{type(e).__name__}: {e}")
+    summary = timer.summary()
+    for stage, seconds in summary["stages"].items():
+        entry[f"{stage}_s"] = round(seconds, 4)
+    entry["total_s"] = round(summary["wall"], 4)
+    entry["finished_at"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+    return entry
+
+
+def write_summary(entries, questions, output_dir, output_format):
+    """Récapitulatif dans l'ordre du fichier de questions (dernier état de chacune)."""
+    rows = [entries[item["id"]] for item in questions if item["id"] in entries]
+    summary = pd.DataFrame(rows)
+    path = os.path.join(output_dir, f"summary.{output_format}")
+    write_results(summary, path, output_format)
+    return path
+
+
+def run_batch(questions_path, output_dir, output_format="csv", workers=None, retry_failed=True):
+    """
+    Traite toutes les questions du fichier qui n'ont pas encore abouti.
+
+    Args:
+        workers (int): Questions traitées simultanément (BATCH_WORKERS ; par défaut la
+            taille du pool de connexions DB_POOL_SIZE, pour qu'aucun thread n'attende une connexion).
+        retry_failed (bool): Refaire aussi les questions en erreur lors d'une exécution précédente.
+
+    Returns:
+        dict: Nombre de questions par statut pour cette exécution, et chemin du récapitulatif.
+    """
+    workers = workers or int(os.getenv("BATCH_WORKERS", os.getenv("DB_POOL_SIZE", "5")))
+    questions = read_questions(questions_path)
+    results_dir = os.path.join(output_dir, "results")
+    os.makedirs(results_dir, exist_ok=True)
+
+    entries = read_journal(output_dir)
+    done = {question_id for question_id, entry in entries.items() if entry["status"] == "ok" or not retry_failed}
+    pending = [item for item in questions if item["id"] not in done]
+    print(f"{len(questions)} questions, {len(questions) - len(pending)} déjà traitées, {len(pending)} à traiter.")
+    counts = {}
+    if not pending:
+        return {"counts": counts, "summary": write_summary(entries, questions, output_dir, output_format)}
+
+    pool = get_db_pool()
+    if pool is None:
+        return {"counts": counts, "summary": None}
+    groq_client = setup_groq_client()
+    # Schéma lu une seule fois pour tout le lot.
+    db_schema = get_database_schema(pool)
+    if not db_schema:
+        print("Impossible de récupérer le schéma de la base de données. Abandon.")
+        pool.close()
+        return {"counts": counts, "summary": None}
+
+    # Toutes les requêtes du lot forment une session du journal de charge.
+    set_session(f"batch-{time.strftime('%Y%m%dT%H%M%S')}", "batch")
+    started = time.perf_counter()
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="sqler-batch")
+    try:
+        with open(os.path.join(output_dir, JOURNAL_NAME), "a", encoding="utf-8") as journal:
+            futures = [
+                executor.submit(
+                    contextvars.copy_context().run,
+                    run_question, pool, item, db_schema, groq_client, results_dir, output_format,
+                )
+                for item in pending
+            ]
+            # Le journal n'est écrit que par ce thread, au fil des questions terminées.
+            for index, future in enumerate(as_completed(futures), start=1):
+                entry = future.result()
+                journal.write(json.dumps(entry, ensure_ascii=False, default=str) + "\n")
+                journal.flush()
+                entries[entry["id"]] = entry
+                counts[entry["status"]] = counts.get(entry["status"], 0) + 1
+                print(f"[{index}/{len(pending)}] {entry['status']:<8} {entry['total_s']:>7.2f} s  {entry['question']}")
+    except KeyboardInterrupt:
+        print("\nInterruption : les questions terminées sont enregistrées, relancer la même commande pour reprendre.")
+        executor.shutdown(wait=True, cancel_futures=True)
+        raise
+    finally:
+        executor.shutdown(wait=True)
+        pool.close()
+
+    print(f"{len(pending)} questions traitées en {time.perf_counter() - started:.1f} s avec {workers} threads.")
+    return {"counts": counts, "summary": write_summary(entries, questions, output_dir, output_format)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Exécute en lot les questions d'un fichier JSONL ou CSV.")
+    parser.add_argument("questions", help="Fichier de questions (.jsonl ou .csv).")
+    parser.add_argument("--output-dir", default="batch_output", help="Dossier des résultats et du journal.")
+    parser.add_argument("--format", choices=OUTPUT_FORMATS, default="csv", help="Format des fichiers de sortie.")
+    parser.add_argument("--workers", type=int, default=None, help="Questions traitées simultanément (BATCH_WORKERS).")
+    parser.add_argument("--skip-failed", action="store_true", help="Ne pas refaire les questions déjà en erreur.")
+    args = parser.parse_args()
+
+    if args.format == "parquet" and importlib.util.find_spec("pyarrow") is None:
+        print("Erreur: le format parquet nécessite le paquet pyarrow (pip install pyarrow).")
+        return
+    try:
+        outcome = run_batch(args.questions, args.output_dir, args.format, args.workers, not args.skip_failed)
+    except KeyboardInterrupt:
+        return
+    if outcome["summary"]:
+        counts = ", ".join(f"{count} {status}" for status, count in sorted(outcome["counts"].items())) or "rien à faire"
+        print(f"Terminé ({counts}). Récapitulatif : {outcome['summary']}")
+
+
+if __name__ == "__main__":
+    main()
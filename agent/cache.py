@@ -0,0 +1,180 @@
+# cache.py
+
+# Importations
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+from agent.metrics import metrics
+
+
+class LRUCache:
+    """
+    Cache mémoire thread-safe avec éviction LRU et durée de vie (TTL).
+
+    Args:
+        max_entries (int): Nombre maximal d'entrées conservées.
+        ttl (float): Durée de vie d'une entrée en secondes (None = illimitée).
+    """
+
+    def __init__(self, max_entries=512, ttl=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at is not None and expires_at < time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def put(self, key, value, expires_at=None):
+        if expires_at is None and self.ttl is not None:
+            expires_at = time.time() + self.ttl
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            item = self._data.pop(key, None)
+        return None if item is None else item[0]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+def normalize_question(question):
+    """Normalise une question pour la clé de cache (casse, espaces, ponctuation finale)."""
+    text = unicodedata.normalize("NFC", question).lower().strip()
+    text = re.sub(r"\s+", " ", text)
+    return text.rstrip(" ?!.;")
+
+
+def fingerprint(*parts):
+    """Empreinte courte et stable d'une ou plusieurs chaînes."""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(str(part).encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()[:16]
+
+
+class SQLQueryCache:
+    """
+    Cache des requêtes SQL générées par le LLM (question → SQL), partagé par le processus.
+
+    La clé combine la question normalisée, l'empreinte du schéma et la version des
+    règles/documentation : toute modification de l'un d'eux invalide les anciennes entrées.
+    Un fichier SQLite optionnel conserve les entrées d'un redémarrage à l'autre.
+    """
+
+    def __init__(self, max_entries=512, ttl=24 * 3600, db_path=None):
+        self.ttl = ttl
+        self._memory = LRUCache(max_entries=max_entries, ttl=ttl)
+        self._db = None
+        self._db_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if db_path:
+            self._open_store(db_path)
+
+    @classmethod
+    def from_env(cls):
+        """Crée le cache à partir des variables SQL_CACHE_SIZE, SQL_CACHE_TTL et SQL_CACHE_PATH."""
+        return cls(
+            max_entries=int(os.getenv("SQL_CACHE_SIZE", "512")),
+            ttl=float(os.getenv("SQL_CACHE_TTL", str(24 * 3600))),
+            db_path=os.getenv("SQL_CACHE_PATH") or None,
+        )
+
+    def _open_store(self, db_path):
+        try:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS sql_cache (key TEXT PRIMARY KEY, sql TEXT NOT NULL, expires_at REAL)"
+            )
+            self._db.execute("DELETE FROM sql_cache WHERE expires_at < ?", (time.time(),))
+            self._db.commit()
+        except sqlite3.Error as e:
+            print(f"Cache SQL persistant indisponible ({db_path}) : {e}")
+            self._db = None
+
+    @staticmethod
+    def make_key(question, schema_fingerprint, rules_version):
+        return fingerprint(normalize_question(question), schema_fingerprint, rules_version)
+
+    def get(self, key):
+        sql = self._memory.get(key)
+        if sql is not None:
+            self._count("hits", "hit")
+            return sql
+        if self._db is not None:
+            try:
+                with self._db_lock:
+                    row = self._db.execute(
+                        "SELECT sql, expires_at FROM sql_cache WHERE key = ? AND expires_at >= ?",
+                        (key, time.time()),
+                    ).fetchone()
+            except sqlite3.Error as e:
+                print(f"Lecture du cache SQL persistant impossible : {e}")
+                row = None
+            if row:
+                self._memory.put(key, row[0], expires_at=row[1])
+                self._count("disk_hits", "disk_hit")
+                return row[0]
+        self._count("misses", "miss")
+        return None
+
+    def _count(self, counter, result):
+        with self._stats_lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+        metrics.inc("sql_cache_lookups_total", result=result)
+
+    def put(self, key, sql):
+        expires_at = time.time() + self.ttl
+        self._memory.put(key, sql, expires_at=expires_at)
+        if self._db is not None:
+            # Base verrouillée, disque plein... : l'entrée reste au moins en mémoire.
+            try:
+                with self._db_lock:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO sql_cache (key, sql, expires_at) VALUES (?, ?, ?)",
+                        (key, sql, expires_at),
+                    )
+                    self._db.commit()
+            except sqlite3.Error as e:
+                print(f"Écriture dans le cache SQL persistant impossible : {e}")
+
+    def stats(self):
+        """Compteurs de succès/échecs du cache (aussi publiés dans `sql_cache_lookups_total`)."""
+        with self._stats_lock:
+            hits, disk_hits, misses = self.hits, self.disk_hits, self.misses
+        lookups = hits + disk_hits + misses
+        return {
+            "entries": len(self._memory),
+            "hits": hits,
+            "disk_hits": disk_hits,
+            "misses": misses,
+            "hit_rate": (hits + disk_hits) / lookups if lookups else 0.0,
+        }
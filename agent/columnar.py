@@ -0,0 +1,100 @@
+# columnar.py
+
+# Lecture des résultats par lots (fetchmany) directement en colonnes typées : pas de
+# dictionnaire par ligne, et chaque lot est converti en tableaux NumPy dès sa lecture.
+
+# Importations
+import time
+
+import numpy as np
+import pandas as pd
+from mysql.connector import FieldType
+
+INTEGER_TYPES = {
+    FieldType.TINY, FieldType.SHORT, FieldType.INT24, FieldType.LONG, FieldType.LONGLONG, FieldType.YEAR,
+}
+# Les DECIMAL sont convertis en flottants : c'est ce que font déjà le tableau et les graphiques.
+FLOAT_TYPES = {FieldType.DECIMAL, FieldType.NEWDECIMAL, FieldType.FLOAT, FieldType.DOUBLE}
+DATETIME_TYPES = {FieldType.DATE, FieldType.NEWDATE, FieldType.DATETIME, FieldType.TIMESTAMP}
+
+
+def _object_array(values):
+    array = np.empty(len(values), dtype=object)
+    array[:] = values
+    return array
+
+
+def column_array(values, type_code):
+    """
+    Tableau NumPy typé pour les valeurs d'une colonne (type MySQL `type_code`).
+
+    Comme pandas.read_sql : un entier NULL rend la colonne flottante (NaN), une date NULL
+    devient NaT.
+    """
+    if type_code in INTEGER_TYPES:
+        if None in values:
+            return np.array(values, dtype=float)
+        try:
+            return np.array(values, dtype=np.int64)
+        except OverflowError:
+            # BIGINT UNSIGNED au-delà de 2**63.
+            return _object_array(values)
+    if type_code in FLOAT_TYPES:
+        return np.array(values, dtype=float)
+    if type_code in DATETIME_TYPES:
+        return np.array(values, dtype="datetime64[ns]")
+    return _object_array(values)
+
+
+class ColumnarBuilder:
+    """
+    Accumule des lots de lignes (tuples) sous forme de tableaux par colonne.
+
+    Args:
+        description: `cursor.description` de la requête (nom et type de chaque colonne).
+    """
+
+    def __init__(self, description):
+        self.columns = [column[0] for column in description]
+        self._types = [column[1] for column in description]
+        self._chunks = [[] for _ in self.columns]
+        self.row_count = 0
+        # Temps passé à convertir les lots (hors lecture réseau).
+        self.build_seconds = 0.0
+
+    def add(self, rows):
+        """Convertit un lot de lignes ; les objets Python du lot peuvent ensuite être libérés."""
+        if not rows:
+            return
+        started = time.perf_counter()
+        for index, values in enumerate(zip(*rows)):
+            self._chunks[index].append(column_array(list(values), self._types[index]))
+        self.row_count += len(rows)
+        self.build_seconds += time.perf_counter() - started
+
+    def to_dataframe(self):
+        arrays = {}
+        for index, chunks in enumerate(self._chunks):
+            if not chunks:
+                arrays[index] = column_array([], self._types[index])
+            elif len(chunks) == 1:
+                arrays[index] = chunks[0]
+            else:
+                arrays[index] = np.concatenate(chunks)
+        df = pd.DataFrame(arrays, copy=False)
+        # Noms appliqués après coup : deux colonnes peuvent porter le même nom.
+        df.columns = self.columns
+        return df
+
+
+def iter_row_batches(cursor, batch_size, max_rows=None):
+    """Lots de lignes lus par `fetchmany`, sans dépasser `max_rows` lignes au total."""
+    remaining = max_rows
+    while remaining is None or remaining > 0:
+        size = batch_size if remaining is None else min(batch_size, remaining)
+        rows = cursor.fetchmany(size)
+        if not rows:
+            return
+        if remaining is not None:
+            remaining -= len(rows)
+        yield rows
@@ -0,0 +1,179 @@
+# db_pool.py
+
+# Importations
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+import mysql.connector
+from mysql.connector import Error
+
+
+class PoolTimeoutError(Error):
+    """Aucune connexion n'a pu être empruntée dans le délai imparti."""
+
+
+class ConnectionPool:
+    """
+    Pool de connexions MySQL partagé entre les sessions.
+
+    Les connexions sont ouvertes à la demande, jusqu'à `pool_size`. À chaque emprunt,
+    une connexion restée inactive plus de `ping_interval` secondes est vérifiée
+    (ping avec reconnexion) ; si elle est morte, elle est remplacée par une nouvelle.
+    """
+
+    def __init__(self, pool_size=5, checkout_timeout=10.0, ping_interval=5.0, **connect_kwargs):
+        if pool_size < 1:
+            raise ValueError("pool_size doit être supérieur ou égal à 1.")
+        self.pool_size = pool_size
+        self.checkout_timeout = checkout_timeout
+        self.ping_interval = ping_interval
+        # autocommit : sinon chaque connexion garde un instantané REPEATABLE READ
+        # ouvert et ne voit plus les mises à jour des tables.
+        connect_kwargs.setdefault("autocommit", True)
+        self._connect_kwargs = connect_kwargs
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(pool_size)
+        self._lock = threading.Lock()
+        self._opened = 0
+        self._closed = False
+
+    # --- Cycle de vie des connexions ---
+    def _open(self):
+        connection = mysql.connector.connect(**self._connect_kwargs)
+        with self._lock:
+            self._opened += 1
+        return connection
+
+    def _discard(self, connection):
+        with self._lock:
+            self._opened -= 1
+        try:
+            connection.close()
+        except Error:
+            pass
+
+    def _is_healthy(self, connection, last_used):
+        if time.monotonic() - last_used < self.ping_interval:
+            return True
+        try:
+            connection.ping(reconnect=True, attempts=2, delay=0)
+            return True
+        except Error:
+            return False
+
+    def acquire(self, timeout=None):
+        """Emprunte une connexion saine, en attendant au plus `timeout` secondes."""
+        if self._closed:
+            raise Error("Le pool de connexions est fermé.")
+        timeout = self.checkout_timeout if timeout is None else timeout
+        if not self._slots.acquire(timeout=timeout):
+            raise PoolTimeoutError(
+                f"Aucune connexion disponible après {timeout:.1f} s "
+                f"({self.pool_size} connexions déjà empruntées)."
+            )
+        try:
+            while True:
+                try:
+                    connection, last_used = self._idle.get_nowait()
+                except queue.Empty:
+                    return self._open()
+                if self._is_healthy(connection, last_used):
+                    return connection
+                self._discard(connection)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def release(self, connection, broken=False):
+        """Rend une connexion au pool (ou la ferme si elle est inutilisable)."""
+        try:
+            if broken or self._closed or not connection.is_connected():
+                self._discard(connection)
+            else:
+                self._idle.put((connection, time.monotonic()))
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def connection(self, timeout=None):
+        """Contexte d'emprunt : `with pool.connection() as conn: ...`."""
+        connection = self.acquire(timeout)
+        broken = False
+        try:
+            yield connection
+        except (mysql.connector.InterfaceError, mysql.connector.OperationalError):
+            broken = True
+            raise
+        except BaseException:
+            # Lecture interrompue (erreur de l'appelant pendant un fetch...) : les lignes non lues
+            # doivent être consommées, sinon l'emprunteur suivant reçoit « Unread result found ».
+            try:
+                connection.consume_results()
+            except Error:
+                broken = True
+            raise
+        finally:
+            self.release(connection, broken=broken)
+
+    def kill_query(self, connection_id):
+        """
+        Interrompt la requête en cours sur la connexion `connection_id` (KILL QUERY).
+
+        Passe par une connexion annexe, hors du pool : l'annulation doit rester possible
+        même lorsque toutes les connexions sont empruntées.
+        """
+        connection = mysql.connector.connect(**self._connect_kwargs)
+        try:
+            cursor = connection.cursor()
+            cursor.execute(f"KILL QUERY {int(connection_id)}")
+            cursor.close()
+        finally:
+            connection.close()
+
+    def close(self):
+        """Ferme toutes les connexions inactives et refuse les nouveaux emprunts."""
+        self._closed = True
+        while True:
+            try:
+                connection, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(connection)
+
+    def stats(self):
+        """Renvoie l'état courant du pool."""
+        return {
+            "pool_size": self.pool_size,
+            "opened": self._opened,
+            "idle": self._idle.qsize(),
+        }
+
+
+@contextmanager
+def borrow(connection):
+    """
+    Fournit une connexion brute, qu'on reçoive un pool ou une connexion directe.
+
+    Permet aux fonctions de l'agent d'accepter indifféremment les deux.
+    """
+    if isinstance(connection, ConnectionPool):
+        with connection.connection() as conn:
+            yield conn
+    else:
+        yield connection
+
+
+def create_pool_from_env():
+    """Crée un pool configuré par les variables d'environnement DB_*."""
+    return ConnectionPool(
+        pool_size=int(os.getenv("DB_POOL_SIZE", "5")),
+        checkout_timeout=float(os.getenv("DB_POOL_TIMEOUT", "10")),
+        ping_interval=float(os.getenv("DB_POOL_PING_INTERVAL", "5")),
+        host=os.getenv("DB_HOST"),
+        user=os.getenv("DB_USER"),
+        password=os.getenv("DB_PASSWORD"),
+        database=os.getenv("DB_DATABASE"),
+    )
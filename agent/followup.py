@@ -0,0 +1,596 @@
+# followup.py
+
+# Questions de suivi (« seulement le top 5 », « trie par pays », « juste 2004 »,
+# « en pourcentage »...) : elles sont traduites en opérations pandas (filtre, tri, premières
+# lignes, regroupement, part du total) appliquées au résultat précédent, déjà en mémoire,
+# sans nouvelle requête SQL. Les règles locales reconnaissent les formulations courantes ;
+# le LLM n'est consulté que pour interpréter une formulation inconnue. Une nouvelle requête
+# n'est générée que si le résultat précédent ne contient pas les colonnes ou les lignes
+# nécessaires.
+
+# Importations
+import difflib
+import json
+import os
+import re
+from collections import namedtuple
+
+import pandas as pd
+
+from agent.llm_gateway import gateway
+from agent.metrics import metrics
+from agent.rules import normalize_text
+from agent.templates import COUNTRIES, PRODUCT_LINES
+from chart_planner import classify_columns, humanize
+
+OPERATIONS = ("filter", "sort", "head", "group", "ratio")
+OPERATORS = ("==", "!=", ">", ">=", "<", "<=", "in", "year")
+
+# mode : 'local' (résultat affiné, dans `results`) ou 'sql' (nouvelle requête pour `question`,
+# qui reprend la question précédente et la précision demandée).
+Refinement = namedtuple("Refinement", ["mode", "operations", "results", "question"])
+
+# Mots sans incidence sur l'opération demandée.
+FILLER_WORDS = {
+    "le", "la", "les", "l", "un", "une", "des", "du", "de", "d", "the", "a", "an", "of",
+    "only", "just", "juste", "seulement", "uniquement", "que", "qu", "ne", "garde", "garder", "keep",
+    "montre", "montrer", "show", "me", "moi", "affiche", "afficher", "donne", "give", "please", "stp", "svp",
+    "maintenant", "now", "plutot", "instead", "et", "and", "mais", "but", "alors", "ok", "donc", "puis", "then",
+    "lignes", "ligne", "rows", "row", "resultats", "resultat", "results", "result", "valeurs", "values",
+    "en", "pour", "in", "for", "a", "au", "aux", "dans", "sur", "on", "with", "avec", "to",
+}
+
+# Vocabulaire français des colonnes de la base Classicmodels (noms en anglais).
+COLUMN_SYNONYMS = {
+    "pays": "country", "ville": "city", "villes": "city", "client": "customer", "clients": "customer",
+    "produit": "product", "produits": "product", "annee": "year", "annees": "year", "mois": "month",
+    "trimestre": "quarter", "montant": "amount", "montants": "amount", "commande": "order",
+    "commandes": "order", "employe": "employee", "employes": "employee", "vendeur": "employee",
+    "vendeurs": "employee", "bureau": "office", "bureaux": "office", "gamme": "productline",
+    "gammes": "productline", "quantite": "quantity", "quantites": "quantity", "prix": "price",
+    "ventes": "sales", "vente": "sales", "nom": "name", "statut": "status", "paiement": "payment",
+    "paiements": "payment", "ca": "chiffreaffaire", "chiffre": "chiffre", "affaires": "affaire",
+}
+
+NEGATION = re.compile(r"\b(sans|sauf|hors|except|excepte|excluding|exclude|exclure|not|pas)\b")
+RATIO = re.compile(r"\b(pourcentages?|percentages?|percent|pct|proportions?|part du total|share)\b|%")
+YEAR = re.compile(r"\b((?:19|20)\d{2})\b")
+TOP = [
+    (re.compile(r"\b(?:top|premiers?|premieres?|first)\s+(\d{1,4})\b"), False),
+    (re.compile(r"\b(\d{1,4})\s+(?:premiers?|premieres?|meilleurs?|meilleures?|first|best|plus grands?|plus grandes?|largest|highest|top)\b"), False),
+    (re.compile(r"\b(?:bottom|derniers?|dernieres?|last)\s+(\d{1,4})\b"), True),
+    (re.compile(r"\b(\d{1,4})\s+(?:derniers?|dernieres?|pires?|last|worst|plus petits?|plus petites?|smallest|lowest|plus faibles?)\b"), True),
+]
+SORT = re.compile(
+    r"^(?:sort|sorted|order|ordered|trie|tries|triee|triees|trier|tri|classe|classes|classer|range|ranger|ordonne|ordonner)\b"
+    r"(?:\s+(?:by|par|selon|sur|on))?\s*(?P<rest>.*)$"
+)
+ASCENDING_WORDS = re.compile(r"\b(ordre croissant|croissante?|ascending|asc|alphabetique|du plus petit au plus grand)\b")
+DESCENDING_WORDS = re.compile(r"\b(ordre decroissant|decroissante?|descending|desc|du plus grand au plus petit)\b")
+GROUP = re.compile(
+    r"^(?:(?:regroupe|regrouper|regroupes|group|grouped|groupe|agrege|agreger|aggregate|aggregated|total|totaux|somme|sum|cumule)\s+)?"
+    r"(?:by|par|per)\s+(?P<rest>.+)$"
+)
+COMPARISON = re.compile(
+    r"^(?P<column>[a-z ]*?)\s*(?P<operator>>=|<=|!=|>|<|=|superieure? ou egale? a|inferieure? ou egale? a|superieure? a|"
+    r"inferieure? a|au moins|au plus|at least|at most|greater than|less than|above|below|over|under|plus de|moins de|"
+    r"au dessus de|en dessous de)\s*(?P<value>-?\d[\d ]*(?:[.,]\d+)?)\s*(?P<unit>k|m)?$"
+)
+COMPARISON_OPERATORS = {
+    ">=": ">=", "<=": "<=", "!=": "!=", ">": ">", "<": "<", "=": "==",
+    "superieur ou egal a": ">=", "superieure ou egale a": ">=", "inferieur ou egal a": "<=", "inferieure ou egale a": "<=",
+    "superieur a": ">", "superieure a": ">", "inferieur a": "<", "inferieure a": "<",
+    "au moins": ">=", "at least": ">=", "au plus": "<=", "at most": "<=",
+    "greater than": ">", "above": ">", "over": ">", "plus de": ">", "au dessus de": ">",
+    "less than": "<", "below": "<", "under": "<", "moins de": "<", "en dessous de": "<",
+}
+# Début de phrase propre aux questions de suivi : seules celles-ci sont soumises au LLM
+# quand les règles locales ne suffisent pas.
+FOLLOWUP_START = re.compile(
+    r"^(only|just|juste|seulement|uniquement|que|et|and|now|maintenant|plutot|instead|mais|but|sort|trie|trier|tri|"
+    r"classe|classer|range|ranger|ordonne|ordonner|order|top|bottom|sans|sauf|except|hors|par|by|per|en|as|in|pour|"
+    r"for|garde|keep|filtre|filtrer|filter|limite|limit|regroupe|regrouper|group|montre seulement|affiche seulement|"
+    r"les \d+|the \d+)\b"
+)
+MAX_FOLLOWUP_WORDS = 10
+
+# « top 2 par pays » : premières lignes de chaque groupe plutôt que du résultat entier.
+PER_GROUP = re.compile(r"\b(par|by|per|pour chaque|chaque|for each|each)\b")
+
+# Colonne absente du résultat : la précision demande une nouvelle requête.
+MISSING = object()
+
+FOLLOWUP_PROMPT = """
+You refine the result of a previous SQL query without querying the database again.
+
+Previous question: {question}
+Result columns (name: dtype, examples): {columns}
+Follow-up request: {followup}
+
+Reply with a single JSON object and no other text, one of:
+{{"operations": [...]}} where each operation is one of
+  {{"op": "filter", "column": C, "operator": "==" | "!=" | ">" | ">=" | "<" | "<=" | "in" | "year", "value": V}}
+  {{"op": "sort", "column": C, "ascending": true | false}}
+  {{"op": "head", "n": N, "column": C or null, "ascending": false, "by": C or null}} ("by": first rows of each group)
+  {{"op": "group", "by": C, "agg": "sum" | "mean" | "count"}}
+  {{"op": "ratio", "column": C}}
+{{"needs_sql": true}} if the follow-up needs columns or rows that are not in the result,
+{{"new_question": true}} if it is not a refinement of the previous result.
+Use only the column names listed above.
+"""
+
+
+# --- Colonnes ---
+def _compact(text):
+    return re.sub(r"[^a-z0-9]", "", normalize_text(str(text)))
+
+
+def resolve_column(phrase, columns):
+    """Colonne désignée par `phrase` (« pays », « customer name », « totalSales »), ou None."""
+    words = [word for word in re.findall(r"[a-z0-9]+", normalize_text(phrase)) if word not in FILLER_WORDS]
+    if not words:
+        return None
+    target = "".join(COLUMN_SYNONYMS.get(word, word) for word in words)
+    keys = {_compact(column): column for column in columns}
+    for candidate in (target, target.rstrip("s")):
+        if candidate in keys:
+            return keys[candidate]
+    # Nom partiel : « customer » pour customerName, « sales » pour totalSales.
+    partial = [key for key in keys if target.rstrip("s") in key]
+    if partial:
+        return keys[min(partial, key=len)]
+    close = difflib.get_close_matches(target, list(keys), n=1, cutoff=0.8)
+    return keys[close[0]] if close else None
+
+
+def _column_roles(df):
+    return classify_columns(list(df.columns), df)
+
+
+def _measure(df, roles, question=""):
+    """Colonne numérique la plus probable pour classer ou rapporter au total (sinon None)."""
+    numeric = [column for column in df.columns if roles.get(column) == "numeric"]
+    if not numeric:
+        return None
+    words = set(re.findall(r"[a-z]{4,}", normalize_text(question)))
+    for column in numeric:
+        if words & set(re.findall(r"[a-z]{4,}", normalize_text(humanize(column)))):
+            return column
+    # Par défaut la dernière : l'agrégat, dans la plupart des requêtes générées.
+    return numeric[-1]
+
+
+def _year_column(df, roles):
+    temporal = [column for column in df.columns if roles.get(column) == "temporal"]
+    for column in temporal:
+        if re.search(r"year|annee|date", normalize_text(humanize(column))):
+            return column
+    return None
+
+
+def _find_value(phrase, df, roles, max_cardinality=5000):
+    """(colonne, valeur) dont la valeur correspond à `phrase` (« france », « classic cars »), ou None."""
+    translated = COUNTRIES.get(phrase) or PRODUCT_LINES.get(phrase) or phrase
+    target = normalize_text(translated)
+    for column in df.columns:
+        if roles.get(column) != "categorical":
+            continue
+        values = df[column].dropna().unique()
+        if len(values) > max_cardinality:
+            continue
+        for value in values:
+            if normalize_text(str(value)) == target:
+                return column, value
+    return None
+
+
+# --- Analyse ---
+def _remainder(text):
+    return [word for word in re.findall(r"[a-z0-9]+", text) if word not in FILLER_WORDS]
+
+
+def _parse_clause(clause, df, roles, operations):
+    """
+    Opération demandée par un membre de phrase.
+
+    Returns:
+        dict | MISSING | None: L'opération, MISSING si elle porte sur une colonne absente du
+        résultat, None si le membre de phrase n'est pas compris.
+    """
+    negate = bool(NEGATION.search(clause))
+    clause = NEGATION.sub(" ", clause).strip()
+
+    if RATIO.search(clause):
+        rest = _remainder(re.sub(r"\b(total|as|du|of)\b", " ", RATIO.sub(" ", clause)))
+        column = resolve_column(" ".join(rest), df.columns) if rest else _measure(df, roles)
+        if column is None or roles.get(column) != "numeric":
+            return MISSING
+        return {"op": "ratio", "column": column}
+
+    for pattern, ascending in TOP:
+        match = pattern.search(clause)
+        if not match:
+            continue
+        n = int(match.group(1))
+        outside = clause[:match.start()] + " " + clause[match.end():]
+        per_group = PER_GROUP.search(outside)
+        by = None
+        if per_group:
+            # « top 2 par pays » : le groupe est nommé après « par », le critère éventuel avant.
+            group_words = _remainder(outside[per_group.end():])
+            by = resolve_column(" ".join(group_words), df.columns) if group_words else None
+            if by is None or roles.get(by) == "numeric":
+                return MISSING
+            outside = outside[:per_group.start()]
+        rest = _remainder(re.sub(r"\b(by|par|selon|plus|most)\b", " ", outside))
+        column = None
+        if rest:
+            column = resolve_column(" ".join(rest), df.columns)
+            if column is None:
+                return None
+            # « les 5 premiers clients » : le nom désigne les lignes, pas le critère de classement.
+            if roles.get(column) != "numeric":
+                column = None
+        if column is None and (by is not None or not any(operation["op"] == "sort" for operation in operations)):
+            column = _measure(df, roles)
+        if by is not None:
+            return {"op": "head", "n": n, "column": column, "ascending": ascending, "by": by}
+        return {"op": "head", "n": n, "column": column, "ascending": ascending}
+
+    match = SORT.match(clause)
+    if match or ASCENDING_WORDS.search(clause) or DESCENDING_WORDS.search(clause):
+        rest = match.group("rest") if match else clause
+        ascending = None
+        if ASCENDING_WORDS.search(rest):
+            ascending = True
+        elif DESCENDING_WORDS.search(rest):
+            ascending = False
+        rest = _remainder(re.sub(r"\b(par|by|ordre|order|selon)\b", " ", DESCENDING_WORDS.sub(" ", ASCENDING_WORDS.sub(" ", rest))))
+        if rest:
+            column = resolve_column(" ".join(rest), df.columns)
+            if column is None:
+                return MISSING
+        else:
+            categorical = [column for column in df.columns if roles.get(column) == "categorical"]
+            column = categorical[0] if ascending and categorical else _measure(df, roles)
+            if column is None:
+                return None
+        if ascending is None:
+            # Les mesures se lisent de la plus grande à la plus petite, les libellés dans l'ordre alphabétique.
+            ascending = roles.get(column) != "numeric"
+        return {"op": "sort", "column": column, "ascending": ascending}
+
+    match = COMPARISON.match(clause)
+    if match:
+        value = float(match.group("value").replace(" ", "").replace(",", "."))
+        value *= {"k": 1e3, "m": 1e6}.get(match.group("unit"), 1)
+        phrase = " ".join(_remainder(match.group("column")))
+        column = resolve_column(phrase, df.columns) if phrase else _measure(df, roles)
+        if column is None or roles.get(column) != "numeric":
+            return MISSING
+        return {"op": "filter", "column": column, "operator": COMPARISON_OPERATORS[match.group("operator")], "value": value}
+
+    years = YEAR.findall(clause)
+    if years and not [word for word in _remainder(YEAR.sub(" ", clause)) if word not in ("annee", "year", "an")]:
+        column = _year_column(df, roles)
+        if column is None:
+            return MISSING
+        return {"op": "filter", "column": column, "operator": "year", "value": [int(year) for year in years], "negate": negate}
+
+    match = GROUP.match(clause)
+    if match:
+        column = resolve_column(match.group("rest"), df.columns)
+        if column is None:
+            return MISSING
+        return {"op": "group", "by": column, "agg": "sum"}
+
+    phrase = " ".join(_remainder(clause))
+    if phrase:
+        found = _find_value(phrase, df, roles)
+        if found is not None:
+            column, value = found
+            return {"op": "filter", "column": column, "operator": "!=" if negate else "==", "value": value}
+    return None
+
+
+def _merge_into(merged, operation):
+    """Ajoute `operation` à `merged`, ou l'ajoute au filtre précédent s'il porte sur la même colonne."""
+    previous = merged[-1] if merged else None
+    if (previous is not None and operation["op"] == "filter" and previous["op"] == "filter"
+            and operation["column"] == previous["column"] and operation.get("negate") == previous.get("negate")):
+        if operation["operator"] == "year" and previous["operator"] == "year":
+            previous["value"] = previous["value"] + operation["value"]
+            return
+        if operation["operator"] == "==" and previous["operator"] in ("==", "in"):
+            values = previous["value"] if previous["operator"] == "in" else [previous["value"]]
+            previous.update(operator="in", value=values + [operation["value"]])
+            return
+    merged.append(operation)
+
+
+def _merge_filters(operations):
+    """
+    « juste 2003 et 2004 », « France et Espagne » : les égalités sur une même colonne s'additionnent.
+    « top 3 en 2004 » : le filtre s'applique avant de garder les premières lignes.
+    """
+    merged = []
+    for operation in operations:
+        if operation["op"] == "filter" and merged and merged[-1]["op"] == "head":
+            head = merged.pop()
+            _merge_into(merged, operation)
+            merged.append(head)
+        else:
+            _merge_into(merged, operation)
+    return merged
+
+
+def parse_followup(followup, df):
+    """
+    Opérations demandées par une question de suivi, d'après les règles locales.
+
+    Returns:
+        list | MISSING | None: Les opérations, MISSING si une colonne nécessaire manque au
+        résultat, None si la question n'est pas entièrement comprise.
+    """
+    text = normalize_text(followup).replace("'", " ").replace("’", " ").rstrip(" ?!.")
+    roles = _column_roles(df)
+    clauses = []
+    for clause in re.split(r"\s*(?:,|;|\bet\b|\band\b|\bpuis\b|\bthen\b)\s*", text):
+        # « top 5 en 2004 » : l'année est un filtre à part entière.
+        if YEAR.search(clause) and not COMPARISON.match(clause) and _remainder(YEAR.sub(" ", clause)):
+            clauses.extend([YEAR.sub(" ", clause), " ".join(YEAR.findall(clause))])
+        else:
+            clauses.append(clause)
+    operations = []
+    missing = False
+    for clause in clauses:
+        if not _remainder(clause) and "%" not in clause:
+            continue
+        operation = _parse_clause(clause, df, roles, operations)
+        if operation is None:
+            return None
+        if operation is MISSING:
+            missing = True
+            continue
+        operations.append(operation)
+    if missing:
+        return MISSING
+    return _merge_filters(operations) or None
+
+
+def looks_like_followup(followup):
+    """Question courte qui commence comme une précision (« seulement... », « et par pays »...)."""
+    text = normalize_text(followup).replace("'", " ")
+    return len(text.split()) <= MAX_FOLLOWUP_WORDS and bool(FOLLOWUP_START.match(text))
+
+
+def _describe_columns(df, roles):
+    described = []
+    for column in df.columns:
+        entry = f"{column}: {df[column].dtype}"
+        if roles.get(column) == "categorical":
+            examples = [str(value) for value in df[column].dropna().unique()[:5]]
+            entry += f" ({', '.join(examples)})"
+        described.append(entry)
+    return "; ".join(described)
+
+
+def _validate(operations, df):
+    """Opérations proposées par le LLM, vérifiées ; None si l'une d'elles est inutilisable."""
+    if not isinstance(operations, list) or not operations:
+        return None
+    for operation in operations:
+        if not isinstance(operation, dict) or operation.get("op") not in OPERATIONS:
+            return None
+        columns = [operation.get(key) for key in ("column", "by") if operation.get(key) is not None]
+        if any(column not in df.columns for column in columns):
+            return None
+        if operation["op"] == "filter" and operation.get("operator") not in OPERATORS:
+            return None
+        if operation["op"] == "head" and not (isinstance(operation.get("n"), int) and operation["n"] > 0):
+            return None
+        if operation["op"] in ("sort", "ratio", "filter") and operation.get("column") is None:
+            return None
+        if operation["op"] == "group" and operation.get("by") is None:
+            return None
+    return operations
+
+
+def ask_llm(followup, previous_question, df, groq_client):
+    """
+    Interprétation par le LLM d'une question de suivi que les règles ne comprennent pas.
+
+    Returns:
+        list | MISSING | None: Comme parse_followup ; None aussi si le LLM y voit une nouvelle question.
+    """
+    prompt = FOLLOWUP_PROMPT.format(
+        question=previous_question, followup=followup, columns=_describe_columns(df, _column_roles(df)),
+    )
+    raw = ""
+    try:
+        raw = gateway.complete(
+            groq_client,
+            purpose="followup",
+            messages=[{"role": "user", "content": prompt}],
+            temperature=0,
+            max_tokens=300,
+        )
+        match = re.search(r"\{.*\}", raw, re.DOTALL)
+        answer = json.loads(match.group(0)) if match else {}
+    except Exception as e:
+        print(f"Erreur lors de l'interprétation de la question de suivi : {e}")
+        print(f"Réponse brute de l'IA : {raw}")
+        return None
+    if answer.get("new_question"):
+        return None
+    if answer.get("needs_sql"):
+        return MISSING
+    operations = _validate(answer.get("operations"), df)
+    # Réponse inutilisable pour une question qui ressemble à une précision : nouvelle requête.
+    return operations if operations is not None else MISSING
+
+
+# --- Application ---
+def _years(series):
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series.dt.year
+    if pd.api.types.is_numeric_dtype(series):
+        return series
+    return pd.to_datetime(series.astype(str), errors="coerce").dt.year
+
+
+def _filter_mask(df, operation):
+    column, operator, value = df[operation["column"]], operation["operator"], operation["value"]
+    if operator == "year":
+        mask = _years(column).isin(value if isinstance(value, list) else [value])
+    elif operator == "in":
+        mask = column.isin(value)
+    elif operator == "==":
+        mask = column == value
+    elif operator == "!=":
+        mask = column != value
+    else:
+        numbers = pd.to_numeric(column, errors="coerce")
+        mask = {">": numbers > value, ">=": numbers >= value, "<": numbers < value, "<=": numbers <= value}[operator]
+    return ~mask if operation.get("negate") else mask
+
+
+def _group(df, operation):
+    by = operation["by"]
+    roles = _column_roles(df)
+    if operation.get("agg") == "count":
+        return df.groupby(by, observed=True, sort=False).size().reset_index(name="count")
+    measures = [column for column in df.columns if column != by and roles.get(column) == "numeric"]
+    if not measures:
+        return df.groupby(by, observed=True, sort=False).size().reset_index(name="count")
+    # Taux et moyennes se moyennent ; montants et quantités s'additionnent.
+    aggregations = {
+        column: "mean" if operation.get("agg") == "mean" or re.search(r"taux|rate|avg|moyen|average|pourcent|percent|pct|ratio", normalize_text(column)) else "sum"
+        for column in measures
+    }
+    grouped = df.groupby(by, observed=True, sort=False).agg(aggregations).reset_index()
+    return grouped.sort_values(measures[-1], ascending=False, kind="stable")
+
+
+def apply_operations(df, operations):
+    """Applique les opérations dans l'ordre ; `df` (partagé par l'historique) n'est pas modifié."""
+    result = df
+    for operation in operations:
+        op = operation["op"]
+        if op == "filter":
+            result = result[_filter_mask(result, operation)]
+        elif op == "sort":
+            result = result.sort_values(operation["column"], ascending=operation["ascending"], kind="stable", na_position="last")
+        elif op == "head":
+            if operation.get("column") is not None:
+                result = result.sort_values(
+                    operation["column"], ascending=operation.get("ascending", False), kind="stable", na_position="last",
+                )
+            if operation.get("by") is not None:
+                result = result.groupby(operation["by"], observed=True, sort=False, dropna=False).head(operation["n"])
+            else:
+                result = result.head(operation["n"])
+        elif op == "group":
+            result = _group(result, operation)
+        elif op == "ratio":
+            column = operation["column"]
+            total = pd.to_numeric(result[column], errors="coerce").sum()
+            result = result.assign(**{f"{column} (%)": (pd.to_numeric(result[column], errors="coerce") / total * 100).round(2) if total else float("nan")})
+    result = result.reset_index(drop=True)
+    result.attrs = {
+        "engine": df.attrs.get("engine"), "snapshot_at": df.attrs.get("snapshot_at"), "refined": True,
+        # Premières lignes d'un résultat incomplet : un nouveau suivi doit lui aussi repasser par SQL.
+        "limited": bool(df.attrs.get("limited") or df.attrs.get("truncated")),
+    }
+    return result
+
+
+def describe_operations(operations):
+    """Résumé lisible des opérations appliquées, une ligne par opération."""
+    lines = []
+    for operation in operations:
+        op = operation["op"]
+        if op == "filter":
+            value = operation["value"]
+            value = ", ".join(str(item) for item in value) if isinstance(value, list) else value
+            prefix = "sans " if operation.get("negate") else ""
+            if operation["operator"] == "year":
+                lines.append(f"{prefix}année de {operation['column']} : {value}")
+            else:
+                operator = {"in": "∈", "==": "="}.get(operation["operator"], operation["operator"])
+                lines.append(f"{prefix}{operation['column']} {operator} {value}")
+        elif op == "sort":
+            lines.append(f"tri par {operation['column']} ({'croissant' if operation['ascending'] else 'décroissant'})")
+        elif op == "head":
+            criterion = f" selon {operation['column']}" if operation.get("column") else ""
+            group = f" par {operation['by']}" if operation.get("by") else ""
+            lines.append(f"{operation['n']} {'dernières' if operation.get('ascending') else 'premières'} lignes{group}{criterion}")
+        elif op == "group":
+            lines.append(f"regroupement par {operation['by']}")
+        elif op == "ratio":
+            lines.append(f"{operation['column']} en pourcentage du total")
+    return lines
+
+
+def _narrows(operations, df):
+    """
+    Vrai si les opérations ne font que garder les premières lignes de `df` dans son ordre
+    actuel : seul affinage exact d'un résultat borné par un LIMIT.
+    """
+    for operation in operations:
+        if operation["op"] != "head" or operation.get("by") is not None:
+            return False
+        column = operation.get("column")
+        if column is not None:
+            values = pd.to_numeric(df[column], errors="coerce")
+            ordered = values.is_monotonic_increasing if operation.get("ascending") else values.is_monotonic_decreasing
+            if not ordered:
+                return False
+    return True
+
+
+def combined_question(previous_question, followup):
+    """Question complète à poser au générateur SQL quand la précision demande une nouvelle requête."""
+    return f"{previous_question.strip().rstrip('?')} — {followup.strip()}"
+
+
+def refine(followup, previous_question, previous_results, groq_client=None):
+    """
+    Traite `followup` comme une précision de la réponse précédente, si c'en est une.
+
+    Args:
+        followup (str): La nouvelle question.
+        previous_question (str): La question complète à laquelle répond `previous_results`.
+        previous_results (DataFrame): Le résultat précédent (non modifié).
+        groq_client: Client LLM, pour les formulations que les règles ne comprennent pas
+            (FOLLOWUP_LLM=0 pour s'en passer).
+
+    Returns:
+        Refinement: Résultat affiné localement ('local') ou question complète à traduire en
+        SQL ('sql') ; None si `followup` est une nouvelle question.
+    """
+    # Une question complète (« quels clients de France... ») n'est jamais un affinage, même si
+    # les règles locales savent en lire une partie.
+    if previous_results is None or previous_results.empty or not looks_like_followup(followup):
+        return None
+    with metrics.span("followup_parse"):
+        operations = parse_followup(followup, previous_results)
+        if operations is None:
+            if groq_client is not None and os.getenv("FOLLOWUP_LLM", "1") != "0":
+                operations = ask_llm(followup, previous_question, previous_results, groq_client)
+            else:
+                operations = MISSING
+    if operations is None:
+        return None
+    question = combined_question(previous_question, followup)
+    # Résultat précédent incomplet (SQL_MAX_ROWS, LIMIT automatique ou atteint) : filtrer,
+    # trier ou rapporter au total ses seules lignes serait faux ; garder ses premières lignes
+    # dans le même ordre reste exact.
+    incomplete = previous_results.attrs.get("truncated") or previous_results.attrs.get("limited")
+    if operations is MISSING or (incomplete and not _narrows(operations, previous_results)):
+        metrics.inc("followup_total", mode="sql")
+        return Refinement("sql", [], None, question)
+    with metrics.span("followup_apply"):
+        results = apply_operations(previous_results, operations)
+    metrics.inc("followup_total", mode="local")
+    return Refinement("local", operations, results, question)
@@ -0,0 +1,333 @@
+# history.py
+
+# Historique des réponses de chaque session : SQL, résultat et graphique de chaque question
+# restent réaffichables sans recalcul. Les artefacts (DataFrame compacté, graphique) sont
+# gardés dans un magasin partagé par le processus, sous un budget mémoire global
+# (HISTORY_MEMORY_MB) : les moins récemment consultés sont écrits sur disque
+# (HISTORY_SPILL_DIR, en Feather non compressé si pyarrow est installé) puis relus en
+# mémoire mappée à la demande.
+
+# Importations
+import atexit
+import json
+import os
+import shutil
+import tempfile
+import threading
+import uuid
+import weakref
+from collections import OrderedDict, namedtuple
+
+import pandas as pd
+
+from agent.metrics import metrics
+from agent.result_cache import estimate_size
+
+# pyarrow est facultatif : sans lui, les résultats évincés sont écrits au format pickle.
+try:
+    from pyarrow import feather
+except ImportError:
+    feather = None
+
+Artifact = namedtuple("Artifact", ["results", "chart"])
+
+
+# --- Types compacts ---
+def _compact_column(column, category_ratio):
+    kind = column.dtype.kind
+    if kind in "iu":
+        return pd.to_numeric(column, downcast="unsigned" if kind == "u" else "integer")
+    if kind == "O" and len(column) and pd.api.types.infer_dtype(column, skipna=True) == "string":
+        # Libellés répétés (pays, gammes, statuts) : une catégorie par valeur distincte.
+        if column.nunique(dropna=True) <= len(column) * category_ratio:
+            return column.astype("category")
+    return column
+
+
+def compact_dataframe(df, category_ratio=0.5):
+    """
+    Copie de `df` avec des types plus compacts : entiers réduits au plus petit type suffisant,
+    chaînes peu variées en catégories. Les flottants restent en float64 : les calculs des
+    questions de suivi (parts du total, moyennes) ne perdent pas de précision. Les valeurs
+    affichées sont inchangées ; `attrs` est conservé.
+    """
+    if df.empty:
+        return df.copy()
+    columns = [_compact_column(df.iloc[:, position], category_ratio) for position in range(df.shape[1])]
+    compact = pd.concat(columns, axis=1)
+    # Positionnel : les noms de colonnes homonymes sont conservés tels quels.
+    compact.columns = df.columns
+    compact.attrs = dict(df.attrs)
+    return compact
+
+
+def artifact_size(artifact):
+    size = estimate_size(artifact.results) if artifact.results is not None else 0
+    if isinstance(artifact.chart, (bytes, bytearray)):
+        size += len(artifact.chart)
+    elif artifact.chart is not None:
+        size += len(json.dumps(artifact.chart, default=str))
+    return size
+
+
+class HistoryStore:
+    """
+    Artefacts des réponses de toutes les sessions, sous un budget mémoire commun.
+
+    Au-delà de `max_bytes`, les artefacts les moins récemment consultés quittent la mémoire :
+    ils sont écrits une fois dans `spill_dir` puis relus à la demande. Un artefact relu
+    compte de nouveau dans le budget ; évincé à nouveau, il n'est pas réécrit.
+
+    Args:
+        max_bytes (int): Budget mémoire du processus (0 : tout est gardé sur disque).
+        spill_dir (str): Dossier d'écriture ; chaque processus y crée son propre sous-dossier
+            (nom aléatoire, accès réservé à l'utilisateur).
+    """
+
+    def __init__(self, max_bytes=256 * 1024 * 1024, spill_dir=None):
+        self.max_bytes = max_bytes
+        self.spill_root = spill_dir
+        # Créé à la première écriture.
+        self.spill_dir = None
+        self._entries = OrderedDict()
+        self._bytes = 0
+        # Évincés en cours d'écriture : encore servis depuis la mémoire.
+        self._pending = {}
+        self._spilled = {}
+        self._lock = threading.Lock()
+        self.spills = 0
+        self.reloads = 0
+
+    @classmethod
+    def from_env(cls):
+        """Crée le magasin (HISTORY_MEMORY_MB, HISTORY_SPILL_DIR)."""
+        return cls(
+            max_bytes=int(float(os.getenv("HISTORY_MEMORY_MB", "256")) * 1024 * 1024),
+            spill_dir=os.getenv("HISTORY_SPILL_DIR") or None,
+        )
+
+    # --- Accès ---
+    def put(self, key, results=None, chart=None):
+        """Enregistre le résultat (compacté) et le graphique d'une réponse."""
+        artifact = Artifact(compact_dataframe(results) if results is not None else None, chart)
+        self._insert(key, artifact)
+        return artifact
+
+    def get(self, key):
+        """Artefact de la réponse `key`, relu depuis le disque si besoin ; None s'il est perdu."""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key][0]
+            if key in self._pending:
+                return self._pending[key]
+            base = self._spilled.get(key)
+        if base is None:
+            return None
+        try:
+            artifact = self._read(base)
+        except (OSError, ValueError) as e:
+            print(f"Impossible de relire la réponse {key} de l'historique : {e}")
+            return None
+        self.reloads += 1
+        metrics.inc("history_reload_total")
+        self._insert(key, artifact)
+        return artifact
+
+    def discard(self, key):
+        """Oublie une réponse (mémoire et disque)."""
+        self.discard_all((key,))
+
+    def discard_all(self, keys):
+        for key in list(keys):
+            with self._lock:
+                if key in self._entries:
+                    self._remove(key)
+                self._pending.pop(key, None)
+                base = self._spilled.pop(key, None)
+            if base is not None:
+                self._delete(base)
+
+    def _insert(self, key, artifact):
+        size = artifact_size(artifact)
+        victims = []
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (artifact, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes and self._entries:
+                victim_key = next(iter(self._entries))
+                victim = self._entries[victim_key][0]
+                self._remove(victim_key)
+                if victim_key not in self._spilled:
+                    self._pending[victim_key] = victim
+                    victims.append((victim_key, victim))
+        # Écriture hors du verrou : les autres sessions ne l'attendent pas.
+        for victim_key, victim in victims:
+            self._spill(victim_key, victim)
+
+    def _remove(self, key):
+        _, size = self._entries.pop(key)
+        self._bytes -= size
+
+    # --- Disque ---
+    def _ensure_spill_dir(self):
+        with self._lock:
+            if self.spill_dir is None:
+                if self.spill_root:
+                    os.makedirs(self.spill_root, exist_ok=True)
+                # Nom imprévisible et droits 0700 : un autre utilisateur ne peut ni y lire les
+                # résultats ni y préparer des fichiers à l'avance.
+                self.spill_dir = tempfile.mkdtemp(prefix="sqler-history-", dir=self.spill_root)
+            return self.spill_dir
+
+    def _spill(self, key, artifact):
+        base = None
+        try:
+            base = os.path.join(self._ensure_spill_dir(), key)
+            self._write(base, artifact)
+        except (OSError, ValueError, TypeError) as e:
+            print(f"Impossible d'écrire la réponse {key} de l'historique sur disque : {e}")
+            with self._lock:
+                self._pending.pop(key, None)
+            if base is not None:
+                self._delete(base)
+            return
+        with self._lock:
+            # Réponse oubliée pendant l'écriture : le fichier ne sert plus.
+            kept = self._pending.pop(key, None) is not None
+            if kept:
+                self._spilled[key] = base
+        if not kept:
+            self._delete(base)
+            return
+        self.spills += 1
+        metrics.inc("history_spill_total")
+
+    def _write(self, base, artifact):
+        results, chart = artifact
+        meta = {"format": None, "attrs": {}, "chart": None}
+        if results is not None:
+            meta["attrs"] = results.attrs
+            columns = results.columns
+            if feather is not None and columns.is_unique and all(isinstance(name, str) for name in columns):
+                try:
+                    # Non compressé : les colonnes numériques sont relues sans copie (mémoire mappée).
+                    feather.write_feather(results.reset_index(drop=True), base + ".feather", compression="uncompressed")
+                    meta["format"] = "feather"
+                except (ValueError, TypeError):
+                    # Colonne aux types mêlés, que Arrow ne sait pas représenter.
+                    pass
+            if meta["format"] is None:
+                results.to_pickle(base + ".pkl")
+                meta["format"] = "pickle"
+        if isinstance(chart, (bytes, bytearray)):
+            with open(base + ".chart", "wb") as chart_file:
+                chart_file.write(chart)
+            meta["chart"] = "bytes"
+        elif chart is not None:
+            meta["chart"] = "vega"
+            meta["spec"] = chart
+        # Écrit en dernier : un artefact n'est lisible qu'une fois complet.
+        with open(base + ".json", "w", encoding="utf-8") as meta_file:
+            json.dump(meta, meta_file, default=str)
+
+    def _read(self, base):
+        with open(base + ".json", encoding="utf-8") as meta_file:
+            meta = json.load(meta_file)
+        results = None
+        if meta["format"] == "feather":
+            results = feather.read_table(base + ".feather", memory_map=True).to_pandas(split_blocks=True)
+        elif meta["format"] == "pickle":
+            results = pd.read_pickle(base + ".pkl")
+        if results is not None:
+            results.attrs = meta["attrs"]
+        chart = meta.get("spec")
+        if meta["chart"] == "bytes":
+            with open(base + ".chart", "rb") as chart_file:
+                chart = chart_file.read()
+        return Artifact(results, chart)
+
+    def _delete(self, base):
+        for suffix in (".json", ".feather", ".pkl", ".chart"):
+            try:
+                os.remove(base + suffix)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                print(f"Impossible de supprimer {base + suffix} : {e}")
+
+    def close(self):
+        """Supprime les fichiers écrits par ce processus."""
+        if self.spill_dir is not None:
+            shutil.rmtree(self.spill_dir, ignore_errors=True)
+
+    def stats(self):
+        """Occupation mémoire et disque du magasin."""
+        return {
+            "in_memory": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "spilled": len(self._spilled),
+            "spills": self.spills,
+            "reloads": self.reloads,
+        }
+
+
+class ConversationHistory:
+    """
+    Suite des réponses d'une session (gardée dans `st.session_state`).
+
+    Chaque tour garde la question, la requête et la position dans le résultat (`pager`) ;
+    le résultat et le graphique sont dans le magasin partagé. Au-delà de `max_turns`
+    (HISTORY_MAX_TURNS), les tours les plus anciens sont oubliés, et tous ceux de la session
+    le sont quand elle disparaît.
+    """
+
+    def __init__(self, store=None, max_turns=None):
+        self.store = store or history_store
+        self.max_turns = max_turns or int(os.getenv("HISTORY_MAX_TURNS", "20"))
+        self.turns = []
+        self.current_index = None
+        self._keys = []
+        weakref.finalize(self, self.store.discard_all, self._keys)
+
+    def add(self, question, sql, results=None, chart=None, pager=None, context=None):
+        """
+        Ajoute une réponse à l'historique et en fait la réponse affichée.
+
+        `context` est la question complète à laquelle répond le résultat, si elle diffère de
+        la question posée (question de suivi).
+        """
+        key = uuid.uuid4().hex
+        self.store.put(key, results, chart)
+        turn = {"id": key, "question": question, "context": context or question, "sql": sql, "pager": pager}
+        self.turns.append(turn)
+        self._keys.append(key)
+        while len(self.turns) > self.max_turns:
+            dropped = self.turns.pop(0)
+            self._keys.remove(dropped["id"])
+            self.store.discard(dropped["id"])
+        self.current_index = len(self.turns) - 1
+        return turn
+
+    def select(self, index):
+        if 0 <= index < len(self.turns):
+            self.current_index = index
+
+    @property
+    def current(self):
+        return self.turns[self.current_index] if self.current_index is not None else None
+
+    def artifact(self, turn):
+        """Résultat et graphique d'un tour (Artifact), ou None s'ils ont été perdus."""
+        return self.store.get(turn["id"])
+
+    def __len__(self):
+        return len(self.turns)
+
+
+# Magasin partagé par toutes les sessions du processus, vidé de ses fichiers à l'arrêt.
+history_store = HistoryStore.from_env()
+atexit.register(history_store.close)
@@ -0,0 +1,297 @@
+# llm_gateway.py
+
+# Point de passage unique des appels au LLM (Groq) : modèle configurable, délai maximal,
+# nouvelles tentatives avec attente exponentielle, limite de concurrence globale et
+# regroupement des requêtes identiques en cours (une seule requête vers Groq).
+
+# Importations
+import json
+import os
+import random
+import threading
+import time
+
+from groq import APIConnectionError, APIStatusError, APITimeoutError, Groq
+
+from agent.cache import fingerprint
+from agent.metrics import metrics
+from agent.streaming import iter_stream_text
+
+DEFAULT_MODEL = "llama-3.1-8b-instant"
+
+
+def create_groq_client():
+    """
+    Client Groq configuré par GROQ_API_KEY et, pour un serveur local ou un proxy, GROQ_BASE_URL.
+
+    Les nouvelles tentatives du SDK sont désactivées : c'est la passerelle qui les gère.
+    """
+    api_key = os.getenv("GROQ_API_KEY")
+    if not api_key:
+        raise ValueError("GROQ_API_KEY non trouvée dans les variables d'environnement.")
+    return Groq(
+        api_key=api_key,
+        base_url=os.getenv("GROQ_BASE_URL") or None,
+        timeout=float(os.getenv("LLM_TIMEOUT", "30")),
+        max_retries=0,
+    )
+
+
+def is_retryable(error):
+    """Erreur passagère : limite de débit (429), erreur serveur (5xx), réseau ou délai dépassé."""
+    if isinstance(error, (APIConnectionError, APITimeoutError)):
+        return True
+    if isinstance(error, APIStatusError):
+        return error.status_code == 429 or error.status_code >= 500
+    return False
+
+
+def _retry_after(error):
+    response = getattr(error, "response", None)
+    try:
+        return float(response.headers.get("retry-after"))
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+class _Flight:
+    """Appel en cours partagé par toutes les sessions qui envoient la même invite."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class _StreamFlight:
+    """Flux en cours : les sessions suiveuses relisent les morceaux reçus par la première."""
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._pieces = []
+        self._finished = False
+        self._error = None
+
+    def append(self, piece):
+        with self._condition:
+            self._pieces.append(piece)
+            self._condition.notify_all()
+
+    def finish(self, error=None):
+        with self._condition:
+            self._finished = True
+            self._error = error
+            self._condition.notify_all()
+
+    def follow(self):
+        index = 0
+        while True:
+            with self._condition:
+                while index >= len(self._pieces) and not self._finished:
+                    self._condition.wait()
+                if index < len(self._pieces):
+                    piece = self._pieces[index]
+                    index += 1
+                elif self._error is not None:
+                    raise self._error
+                else:
+                    return
+            yield piece
+
+
+class LLMGateway:
+    """
+    Passerelle vers l'API de complétion (compatible Groq/OpenAI).
+
+    Args:
+        model (str): Modèle utilisé (GROQ_MODEL).
+        timeout (float): Délai maximal d'une requête, en secondes (LLM_TIMEOUT).
+        max_retries (int): Nombre de nouvelles tentatives sur 429, 5xx et erreurs réseau (LLM_MAX_RETRIES).
+        backoff_base (float): Attente avant la première nouvelle tentative, doublée ensuite (LLM_BACKOFF_BASE).
+        backoff_max (float): Attente maximale entre deux tentatives (LLM_BACKOFF_MAX).
+        max_concurrency (int): Nombre maximal de requêtes simultanées vers le LLM (LLM_MAX_CONCURRENCY) ;
+            un flux occupe sa place jusqu'à son dernier morceau.
+        coalesce (bool): Regroupe les invites identiques en cours (LLM_COALESCE).
+    """
+
+    def __init__(self, model=DEFAULT_MODEL, timeout=30.0, max_retries=3, backoff_base=0.5,
+                 backoff_max=8.0, max_concurrency=4, coalesce=True):
+        self.model = model
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.coalesce = coalesce
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._lock = threading.Lock()
+        self._flights = {}
+        self.calls = 0
+        self.upstream_calls = 0
+        self.coalesced = 0
+        self.retries = 0
+        self.failures = 0
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            model=os.getenv("GROQ_MODEL", DEFAULT_MODEL),
+            timeout=float(os.getenv("LLM_TIMEOUT", "30")),
+            max_retries=int(os.getenv("LLM_MAX_RETRIES", "3")),
+            backoff_base=float(os.getenv("LLM_BACKOFF_BASE", "0.5")),
+            backoff_max=float(os.getenv("LLM_BACKOFF_MAX", "8")),
+            max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", "4")),
+            coalesce=os.getenv("LLM_COALESCE", "1") != "0",
+        )
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+    def _key(self, messages, temperature, max_tokens, stream):
+        return fingerprint(self.model, temperature, max_tokens, stream, json.dumps(messages, sort_keys=True))
+
+    def _backoff(self, attempt, error):
+        # Attente exponentielle avec gigue complète ; Retry-After est respecté s'il est fourni.
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        retry_after = _retry_after(error)
+        return max(delay, min(retry_after, self.backoff_max)) if retry_after else delay
+
+    def _create(self, client, messages, temperature, max_tokens, stream):
+        """Requête vers le LLM, avec nouvelles tentatives sur les erreurs passagères."""
+        attempt = 0
+        while True:
+            try:
+                self._count("upstream_calls")
+                return client.chat.completions.create(
+                    messages=messages,
+                    model=self.model,
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                    stream=stream,
+                    timeout=self.timeout,
+                )
+            except Exception as e:
+                if attempt >= self.max_retries or not is_retryable(e):
+                    self._count("failures")
+                    raise
+                self._count("retries")
+                time.sleep(self._backoff(attempt, e))
+                attempt += 1
+
+    def complete(self, client, messages, temperature=0, max_tokens=500, purpose="other"):
+        """
+        Envoie une invite et renvoie le texte de la réponse.
+
+        Les appels identiques (même modèle, mêmes messages et paramètres) lancés pendant
+        qu'une requête est déjà en cours attendent et partagent sa réponse.
+        `purpose` étiquette les mesures (durée `llm_call`, jetons consommés).
+        """
+        with metrics.span("llm_call", purpose=purpose):
+            return self._complete(client, messages, temperature, max_tokens, purpose)
+
+    def _complete(self, client, messages, temperature, max_tokens, purpose):
+        self._count("calls")
+        if not self.coalesce:
+            with self._slots:
+                completion = self._create(client, messages, temperature, max_tokens, False)
+            metrics.record_usage(getattr(completion, "usage", None), purpose=purpose)
+            return completion.choices[0].message.content
+
+        key = self._key(messages, temperature, max_tokens, False)
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+            else:
+                self.coalesced += 1
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            with self._slots:
+                completion = self._create(client, messages, temperature, max_tokens, False)
+            metrics.record_usage(getattr(completion, "usage", None), purpose=purpose)
+            flight.result = completion.choices[0].message.content
+            return flight.result
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.done.set()
+
+    def stream(self, client, messages, temperature=0, max_tokens=500, purpose="other"):
+        """
+        Envoie une invite en streaming et produit le texte au fur et à mesure.
+
+        Un flux identique déjà en cours est partagé : ses morceaux sont relus depuis le début.
+        Mesures : durée totale (`llm_call`) et délai jusqu'au premier morceau (`llm_first_token`).
+        """
+        started = time.perf_counter()
+        first = True
+        with metrics.span("llm_call", purpose=purpose):
+            for piece in self._stream(client, messages, temperature, max_tokens, purpose):
+                if first:
+                    metrics.observe("stage_seconds", time.perf_counter() - started, stage="llm_first_token", status="ok", purpose=purpose)
+                    first = False
+                yield piece
+
+    def _stream(self, client, messages, temperature, max_tokens, purpose):
+        def on_usage(usage):
+            metrics.record_usage(usage, purpose=purpose)
+
+        self._count("calls")
+        if not self.coalesce:
+            with self._slots:
+                yield from iter_stream_text(self._create(client, messages, temperature, max_tokens, True), on_usage)
+            return
+
+        key = self._key(messages, temperature, max_tokens, True)
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _StreamFlight()
+            else:
+                self.coalesced += 1
+        if not leader:
+            yield from flight.follow()
+            return
+
+        error = None
+        try:
+            # La place est gardée pendant toute la lecture du flux.
+            with self._slots:
+                for piece in iter_stream_text(self._create(client, messages, temperature, max_tokens, True), on_usage):
+                    flight.append(piece)
+                    yield piece
+        except GeneratorExit:
+            error = RuntimeError("Flux LLM interrompu par la session qui l'avait lancé.")
+            raise
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.finish(error)
+
+    def stats(self):
+        """Compteurs : appels reçus, requêtes réellement envoyées, regroupées, nouvelles tentatives, échecs."""
+        return {
+            "model": self.model,
+            "calls": self.calls,
+            "upstream_calls": self.upstream_calls,
+            "coalesced": self.coalesced,
+            "retries": self.retries,
+            "failures": self.failures,
+        }
+
+
+# Passerelle partagée par tout le processus (et donc par toutes les sessions Streamlit).
+gateway = LLMGateway.from_env()
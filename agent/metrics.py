@@ -0,0 +1,298 @@
+# metrics.py
+
+# Mesures en mémoire du processus : durée de chaque étape (schéma, invite, LLM, SQL,
+# DataFrame, graphique) et jetons consommés, exportables au format Prometheus ou en JSON lines.
+
+# Importations
+import atexit
+import json
+import math
+import os
+import queue
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Bornes des histogrammes de durée (secondes).
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Bornes des histogrammes de jetons.
+TOKEN_BUCKETS = (0, 100, 250, 500, 1000, 2000, 4000, 8000, 16000)
+# Histogrammes qui ne mesurent pas une durée.
+HISTOGRAM_BUCKETS = {"prompt_tokens_saved": TOKEN_BUCKETS}
+
+
+def _label_key(labels):
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _format_labels(label_key, extra=()):
+    pairs = list(label_key) + list(extra)
+    if not pairs:
+        return ""
+    escaped = [(name, value.replace("\\", "\\\\").replace('"', '\\"')) for name, value in pairs]
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+class Histogram:
+    """Histogramme cumulatif à la Prometheus, plus les dernières valeurs pour les percentiles."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS, reservoir=1024):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.recent = deque(maxlen=reservoir)
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        self.recent.append(value)
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+
+    def percentile(self, q):
+        """Percentile `q` (0-100) des dernières valeurs observées."""
+        values = sorted(self.recent)
+        if not values:
+            return 0.0
+        rank = max(0, math.ceil(q / 100 * len(values)) - 1)
+        return values[rank]
+
+
+class MetricsRegistry:
+    """
+    Registre thread-safe d'histogrammes et de compteurs étiquetés.
+
+    Args:
+        log_path (str): Fichier JSON lines où chaque mesure est ajoutée (METRICS_LOG_PATH) ;
+            None pour ne rien écrire.
+        max_queue (int): Lignes en attente d'écriture au-delà desquelles les nouvelles sont
+            abandonnées (comptées dans `dropped`) plutôt que de ralentir les mesures.
+    """
+
+    def __init__(self, log_path=None, max_queue=10000):
+        self.log_path = log_path
+        self.dropped = 0
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._writer_lock = threading.Lock()
+
+    # --- Journal ---
+    def _ensure_writer(self):
+        if self._thread is not None:
+            return
+        with self._writer_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._write_loop, name="sqler-metrics", daemon=True)
+                self._thread.start()
+
+    def _write_loop(self):
+        while True:
+            lines = [self._queue.get()]
+            # Tout ce qui est déjà en file part dans la même écriture.
+            while True:
+                try:
+                    lines.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = None in lines
+            text = "".join(line + "\n" for line in lines if line is not None)
+            if text:
+                try:
+                    with open(self.log_path, "a", encoding="utf-8") as log_file:
+                        log_file.write(text)
+                except OSError as e:
+                    print(f"Impossible d'écrire les métriques dans {self.log_path} : {e}")
+            if stop:
+                return
+
+    def _log(self, kind, name, value, labels):
+        # Écriture par le thread du journal : ni l'appelant ni le verrou du registre n'attendent le disque.
+        if not self.log_path:
+            return
+        self._ensure_writer()
+        line = json.dumps({"ts": time.time(), "kind": kind, "name": name, "value": value, "labels": labels})
+        try:
+            self._queue.put_nowait(line)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self):
+        """Écrit les mesures en attente et arrête le thread d'écriture."""
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join(timeout=5)
+        self._thread = None
+
+    def observe(self, name, value, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(HISTOGRAM_BUCKETS.get(name, LATENCY_BUCKETS))
+            histogram.observe(value)
+        self._log("histogram", name, value, labels)
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+        self._log("counter", name, amount, labels)
+
+    @contextmanager
+    def span(self, stage, **labels):
+        """Mesure la durée du bloc dans `stage_seconds{stage=...}` (erreurs comprises)."""
+        start = time.perf_counter()
+        status = "ok"
+        try:
+            yield
+        except BaseException:
+            status = "error"
+            raise
+        finally:
+            self.observe("stage_seconds", time.perf_counter() - start, stage=stage, status=status, **labels)
+
+    def record_usage(self, usage, **labels):
+        """Jetons d'une réponse du LLM (objet `usage` : prompt_tokens, completion_tokens)."""
+        if usage is None:
+            return
+        for kind in ("prompt", "completion"):
+            tokens = getattr(usage, f"{kind}_tokens", None)
+            if tokens:
+                self.inc("llm_tokens_total", tokens, kind=kind, **labels)
+
+    def summary(self):
+        """
+        Une ligne par étape : nombre, moyenne, p50 et p95 (secondes), jetons par usage du LLM,
+        valeurs des autres compteurs (`counters` : nom -> {étiquettes: valeur}) et nombre, somme
+        et moyenne des autres histogrammes (`observations` : nom -> {...}).
+        """
+        with self._lock:
+            stages = {}
+            observations = {}
+            for (name, label_key), histogram in self._histograms.items():
+                if name != "stage_seconds":
+                    row = observations.setdefault(name, {"count": 0, "sum": 0.0})
+                    row["count"] += histogram.count
+                    row["sum"] += histogram.sum
+                    row["mean"] = row["sum"] / row["count"] if row["count"] else 0.0
+                    continue
+                labels = dict(label_key)
+                stage = labels.get("stage", "")
+                # Autres étiquettes (usage du LLM, moteur de rendu...) : une ligne chacune.
+                details = [value for name, value in label_key if name not in ("stage", "status")]
+                if details:
+                    stage = f"{stage} ({', '.join(details)})"
+                row = stages.setdefault(stage, {"stage": stage, "count": 0, "errors": 0, "mean": 0.0, "p50": 0.0, "p95": 0.0})
+                if labels.get("status") == "error":
+                    row["errors"] += histogram.count
+                    continue
+                row["count"] = histogram.count
+                row["mean"] = histogram.sum / histogram.count if histogram.count else 0.0
+                row["p50"] = histogram.percentile(50)
+                row["p95"] = histogram.percentile(95)
+            tokens = {}
+            counters = {}
+            for (name, label_key), value in self._counters.items():
+                if name == "llm_tokens_total":
+                    labels = dict(label_key)
+                    tokens.setdefault(labels.get("purpose", ""), {})[labels.get("kind", "")] = value
+                else:
+                    counters.setdefault(name, {})[", ".join(value for _, value in label_key)] = value
+        return {
+            "stages": sorted(stages.values(), key=lambda row: row["stage"]),
+            "tokens": tokens,
+            "counters": counters,
+            "observations": observations,
+        }
+
+    def to_prometheus(self):
+        """Export au format texte Prometheus."""
+        lines = []
+        with self._lock:
+            histogram_names = sorted({name for name, _ in self._histograms})
+            for metric in histogram_names:
+                lines.append(f"# TYPE sqler_{metric} histogram")
+                for (name, label_key), histogram in sorted(self._histograms.items()):
+                    if name != metric:
+                        continue
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        lines.append(f"sqler_{name}_bucket{_format_labels(label_key, [('le', repr(bound))])} {count}")
+                    lines.append(f"sqler_{name}_bucket{_format_labels(label_key, [('le', '+Inf')])} {histogram.count}")
+                    lines.append(f"sqler_{name}_sum{_format_labels(label_key)} {histogram.sum}")
+                    lines.append(f"sqler_{name}_count{_format_labels(label_key)} {histogram.count}")
+            counter_names = sorted({name for name, _ in self._counters})
+            for metric in counter_names:
+                lines.append(f"# TYPE sqler_{metric} counter")
+                for (name, label_key), value in sorted(self._counters.items()):
+                    if name == metric:
+                        lines.append(f"sqler_{name}{_format_labels(label_key)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def to_json_lines(self):
+        """Export JSON lines : un objet par histogramme ou compteur."""
+        lines = []
+        with self._lock:
+            for (name, label_key), histogram in sorted(self._histograms.items()):
+                lines.append(json.dumps({
+                    "name": name, "type": "histogram", "labels": dict(label_key),
+                    "count": histogram.count, "sum": histogram.sum,
+                    "p50": histogram.percentile(50), "p95": histogram.percentile(95),
+                }))
+            for (name, label_key), value in sorted(self._counters.items()):
+                lines.append(json.dumps({"name": name, "type": "counter", "labels": dict(label_key), "value": value}))
+        return "\n".join(lines) + ("\n" if lines else "")
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+
+# Registre partagé par tout le processus, journal vidé à l'arrêt.
+metrics = MetricsRegistry(log_path=os.getenv("METRICS_LOG_PATH") or None)
+atexit.register(metrics.close)
+
+
+def start_metrics_server(port=None, registry=None):
+    """
+    Expose `/metrics` (Prometheus) et `/metrics.jsonl` sur `port` (METRICS_PORT) dans un thread.
+
+    Returns:
+        ThreadingHTTPServer: Le serveur démarré, ou None si aucun port n'est configuré.
+    """
+    port = port if port is not None else int(os.getenv("METRICS_PORT", "0"))
+    if not port:
+        return None
+    registry = registry or metrics
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            if self.path == "/metrics":
+                body, content_type = registry.to_prometheus(), "text/plain; version=0.0.4"
+            elif self.path == "/metrics.jsonl":
+                body, content_type = registry.to_json_lines(), "application/x-ndjson"
+            else:
+                self.send_error(404)
+                return
+            payload = body.encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+    server = ThreadingHTTPServer((os.getenv("METRICS_HOST", "127.0.0.1"), port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
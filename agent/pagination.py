@@ -0,0 +1,153 @@
+# pagination.py
+
+# Affichage paginé des résultats : la session ne garde que la requête et la position de
+# la page, jamais le résultat complet. Chaque page est découpée dans le résultat partagé
+# par `result_cache` s'il y est encore, sinon relue en base avec LIMIT ... OFFSET.
+
+# Importations
+import os
+
+from agent.db_pool import borrow
+from agent.sql_agent import execute_sql_dataframe, result_cache, sql_guard
+from agent.sql_guard import check_read_only, ensure_limit
+
+
+def page_size():
+    """Lignes par page (RESULTS_PAGE_SIZE, 100 par défaut)."""
+    return max(1, int(os.getenv("RESULTS_PAGE_SIZE", "100")))
+
+
+def paged_query(statement, limit, offset):
+    """La requête `statement` restreinte à une page (sous-requête dérivée)."""
+    return f"SELECT * FROM (\n{statement}\n) AS page_result\nLIMIT {int(limit)} OFFSET {int(offset)}"
+
+
+class ResultPager:
+    """
+    Position dans le résultat d'une requête, sans les données.
+
+    Args:
+        sql (str): La requête exécutée (clé du cache de résultats) ; None pour un résultat
+            calculé localement (question de suivi), qui ne peut être relu qu'avec `results`.
+        columns (list): Les colonnes du résultat.
+        known_rows (int): Lignes lues lors de l'exécution.
+        truncated (bool): Le résultat dépassait SQL_MAX_ROWS : le total réel est inconnu.
+        warnings (list): Avertissements du garde-fou, réaffichés avec chaque page.
+    """
+
+    def __init__(self, sql, columns, known_rows, truncated=False, warnings=(), engine=None, snapshot_at=None, size=None):
+        self.sql = sql
+        self.columns = list(columns)
+        self.known_rows = known_rows
+        # Résultat complet (non tronqué) : toutes ses pages peuvent venir du cache.
+        self.complete = not truncated
+        self.total = None if truncated else known_rows
+        self.warnings = list(warnings)
+        self.engine = engine
+        self.snapshot_at = snapshot_at
+        self.size = size or page_size()
+        self.page = 0
+        self.last_page_rows = None
+        # Requête telle qu'elle a été bornée par le garde-fou (même LIMIT automatique).
+        if sql is None:
+            statement, first_word = None, None
+        elif sql_guard.enabled:
+            statement, first_word = check_read_only(sql)
+        else:
+            statement = sql.strip().rstrip(";").rstrip()
+            first_word = statement.split(None, 1)[0].upper() if statement else ""
+        # SHOW, DESCRIBE... ne peuvent pas servir de sous-requête : ils sont relus en entier.
+        self.pageable = first_word in ("SELECT", "WITH")
+        if self.pageable and sql_guard.enabled:
+            statement, _ = ensure_limit(statement, sql_guard.auto_limit)
+        self.statement = statement
+
+    @classmethod
+    def from_results(cls, sql, results, size=None):
+        return cls(
+            sql, results.columns, len(results), truncated=bool(results.attrs.get("truncated")),
+            warnings=results.attrs.get("warnings", []), engine=results.attrs.get("engine"),
+            snapshot_at=results.attrs.get("snapshot_at"), size=size,
+        )
+
+    # --- Position ---
+    @property
+    def page_count(self):
+        """Nombre de pages, ou None tant que le total est inconnu."""
+        if self.total is None:
+            return None
+        return max(1, -(-self.total // self.size))
+
+    @property
+    def has_next(self):
+        if self.page_count is not None:
+            return self.page + 1 < self.page_count
+        # Total inconnu : il reste des lignes tant que les pages sont pleines.
+        return self.last_page_rows is None or self.last_page_rows == self.size
+
+    def go_to(self, page):
+        self.page = max(0, page if self.page_count is None else min(page, self.page_count - 1))
+
+    def next(self):
+        if self.has_next:
+            self.page += 1
+
+    def previous(self):
+        self.page = max(0, self.page - 1)
+
+    def row_range(self):
+        """(première, dernière) ligne de la page courante, numérotées à partir de 1."""
+        first = self.page * self.size + 1
+        rows = self.last_page_rows if self.last_page_rows is not None else self.size
+        return first, first + max(0, rows) - 1
+
+    def total_label(self):
+        if self.total is not None:
+            return f"{self.total:,}".replace(",", " ")
+        return f"plus de {self.known_rows:,}".replace(",", " ")
+
+    # --- Données ---
+    def fetch(self, connection, results=None):
+        """
+        Lignes de la page courante.
+
+        Args:
+            connection: Pool ou connexion, pour relire le cache ou la base.
+            results (DataFrame): Résultat complet encore en main (juste après l'exécution, ou
+                gardé par l'historique) : la page y est découpée sans autre accès.
+
+        Returns:
+            DataFrame: La page, ou None si elle n'a pu être lue.
+        """
+        offset = self.page * self.size
+        # Page comprise dans le résultat lu à l'exécution : découpée dans celui-ci, ou dans le cache.
+        covered = self.complete or offset + self.size <= self.known_rows
+        if not covered:
+            results = None
+        elif results is None and self.sql is None:
+            return None
+        elif results is None:
+            with borrow(connection) as conn:
+                results = result_cache.get(conn, self.sql)
+        if results is None:
+            page = execute_sql_dataframe(connection, paged_query(self.statement, self.size, offset)) if self.pageable else None
+            if page is None and covered:
+                # Sous-requête impossible (colonnes homonymes, SHOW...) : relecture complète.
+                results = execute_sql_dataframe(connection, self.sql)
+            if page is None and results is None:
+                return None
+        if results is not None:
+            page = results.iloc[offset:offset + self.size]
+        self.last_page_rows = len(page)
+        if self.total is None and len(page) < self.size and not page.attrs.get("truncated"):
+            # Dernière page atteinte : le total devient exact.
+            self.total = offset + len(page)
+        return page
+
+    def count(self, connection):
+        """Compte exactement les lignes de la requête (COUNT(*) en base, à la demande)."""
+        counted = execute_sql_dataframe(connection, f"SELECT COUNT(*) AS total FROM (\n{self.statement}\n) AS counted")
+        if counted is not None and len(counted):
+            self.total = int(counted.iloc[0, 0])
+            self.go_to(self.page)
+        return self.total
@@ -0,0 +1,148 @@
+# pipeline.py
+
+# Importations
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from contextlib import contextmanager
+
+from mysql.connector import Error
+
+from agent.db_pool import ConnectionPool, borrow
+from agent.metrics import metrics
+from agent.sql_agent import execute_sql_dataframe
+from agent.sql_utils import extract_select_columns, probe_columns
+from chart_planner import min_confidence, plan_chart, planner_stats
+from visualizer import generate_chart_config
+
+# Pool de threads partagé : les étapes d'une question s'y chevauchent (requête SQL et
+# configuration du graphique), et les sessions concurrentes se le partagent.
+_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("PIPELINE_WORKERS", "8")),
+    thread_name_prefix="sqler-pipeline",
+)
+
+
+class StageTimer:
+    """Chronomètre les étapes d'une question (début et fin relatifs au départ du chronomètre)."""
+
+    def __init__(self):
+        self._origin = time.perf_counter()
+        self._lock = threading.Lock()
+        self.spans = {}
+
+    @contextmanager
+    def span(self, name):
+        start = time.perf_counter() - self._origin
+        try:
+            yield
+        finally:
+            end = time.perf_counter() - self._origin
+            with self._lock:
+                self.spans[name] = (start, end)
+
+    def summary(self):
+        """Durée de chaque étape, somme des durées et durée réelle (chevauchements compris)."""
+        if not self.spans:
+            return {"stages": {}, "sum": 0.0, "wall": 0.0}
+        stages = {name: end - start for name, (start, end) in self.spans.items()}
+        wall = max(end for _, end in self.spans.values()) - min(start for start, _ in self.spans.values())
+        return {"stages": stages, "sum": sum(stages.values()), "wall": wall}
+
+    def to_markdown(self):
+        """Tableau Markdown des étapes, trié par heure de début."""
+        lines = ["Étape | Début (s) | Fin (s) | Durée (s)", "--- | --- | --- | ---"]
+        for name, (start, end) in sorted(self.spans.items(), key=lambda item: item[1][0]):
+            lines.append(f"{name} | {start:.2f} | {end:.2f} | {end - start:.2f}")
+        summary = self.summary()
+        lines.append(f"**total** | | | **{summary['wall']:.2f}** (somme des étapes : {summary['sum']:.2f})")
+        return "\n".join(lines)
+
+
+def execute_with_chart_config(connection, sql_query, user_question, groq_client, timer=None, handle=None, on_wait=None):
+    """
+    Exécute la requête et prépare la configuration du graphique en parallèle.
+
+    Les colonnes sont déduites des alias du SELECT ; à défaut, une sonde `LIMIT 0` les
+    récupère. Le planificateur local (chart_planner) choisit le graphique ; le LLM n'est
+    consulté, pendant l'exécution de la requête, que si sa confiance est insuffisante.
+    Le temps total est ainsi celui de l'étape la plus longue, et non leur somme.
+
+    Args:
+        handle (QueryHandle): Permet d'annuler la requête ; elle l'est aussi automatiquement
+            si l'attente est interrompue (exception levée par `on_wait`, arrêt du script...).
+        on_wait (callable): Appelée avec la durée écoulée (s) environ toutes les 250 ms
+            pendant l'exécution de la requête (affichage d'une progression, par exemple).
+
+    Returns:
+        tuple: (résultats de la requête (DataFrame ou None), configuration du graphique ou None, StageTimer)
+    """
+    timer = timer or StageTimer()
+    columns = extract_select_columns(sql_query)
+    threshold = min_confidence()
+
+    def run_query():
+        with timer.span("sql_execute"):
+            return execute_sql_dataframe(connection, sql_query, handle=handle)
+
+    def ask_llm():
+        with timer.span("chart_config_llm"):
+            chart_columns = columns
+            if chart_columns is None:
+                # Une connexion unique ne peut pas servir à deux threads à la fois.
+                if not isinstance(connection, ConnectionPool):
+                    return None
+                try:
+                    with borrow(connection) as conn:
+                        chart_columns = probe_columns(conn, sql_query)
+                except Error as e:
+                    print(f"Impossible de déterminer les colonnes de la requête : {e}")
+                    return None
+            return generate_chart_config(user_question, chart_columns, groq_client)
+
+    # Le contexte (session du journal de charge) suit la requête dans le thread du pool.
+    query_future = _executor.submit(contextvars.copy_context().run, run_query)
+    _, pre_confidence = plan_chart(user_question, columns) if columns else (None, 0.0)
+    config_future = _executor.submit(ask_llm) if pre_confidence < threshold else None
+    started = time.perf_counter()
+    try:
+        while True:
+            try:
+                results = query_future.result(timeout=0.25 if on_wait else None)
+                break
+            except FutureTimeoutError:
+                on_wait(time.perf_counter() - started)
+    except BaseException:
+        # Requête refusée ou en erreur, ou attente abandonnée : rien ne doit continuer en arrière-plan.
+        if handle is not None and not query_future.done():
+            handle.cancel()
+        if config_future is not None:
+            config_future.cancel()
+        raise
+    has_rows = results is not None and not results.empty
+
+    # Les types réels des colonnes permettent une planification plus sûre que les seuls noms.
+    chart_config, confidence = None, 0.0
+    if has_rows:
+        with timer.span("chart_plan"), metrics.span("chart_plan"):
+            chart_config, confidence = plan_chart(user_question, results.columns, results)
+    if confidence >= threshold:
+        if config_future is not None:
+            config_future.cancel()
+        planner_stats.record(used_llm=False)
+        return results, chart_config, timer
+    if not has_rows or config_future is None:
+        # Rien à tracer, ou des noms trompeurs : generate_visualization tranchera sur les données.
+        if config_future is not None:
+            config_future.cancel()
+        return results, None, timer
+
+    try:
+        chart_config = config_future.result()
+    except Exception as e:
+        print(f"Erreur lors de la configuration du graphique : {e}")
+        chart_config = None
+    planner_stats.record(used_llm=True)
+    return results, chart_config, timer
@@ -0,0 +1,225 @@
+# replay.py
+
+# Rejoue contre une base cible les requêtes capturées dans le journal de charge
+# (SQL_WORKLOAD_LOG, voir workload.py), en respectant leur cadence d'origine accélérée
+# d'un facteur donné et avec un nombre borné de requêtes simultanées. Rapporte le débit,
+# les percentiles de latence, le retard sur le planning et le taux d'erreur.
+#
+# Usage : python -m agent.replay workload.jsonl [--speedup 10] [--concurrency 8]
+#                                [--through-agent] [--output replay.json]
+#
+# La base cible est celle des variables DB_* (ou --host/--port/--user/--database).
+
+# Importations
+import argparse
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from dotenv import load_dotenv
+from mysql.connector import Error
+
+from agent.db_pool import ConnectionPool
+from agent.workload import read_workload, workload
+
+# Taille des lots lus pour vider les résultats d'une requête rejouée.
+DRAIN_BATCH = 5000
+
+
+def _percentile(values, q):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    return values[max(0, -(-q * len(values) // 100) - 1)]
+
+
+def select_entries(entries, source=None, session=None, include_cached=False, through_agent=False, limit=None):
+    """
+    Requêtes à rejouer, dans l'ordre chronologique.
+
+    En mode direct, seules les requêtes réellement envoyées à la base sont rejouées (texte
+    après le garde-fou) : les réponses du cache de résultats et les requêtes refusées sont
+    écartées. En mode `through_agent`, la requête d'origine repasse par l'agent (garde-fou et
+    cache compris) : les réponses du cache sont alors rejouées aussi, sauf exclusion explicite.
+    """
+    selected = []
+    for entry in sorted(entries, key=lambda entry: entry.get("ts", 0)):
+        if source and entry.get("source") != source:
+            continue
+        if session and entry.get("session") != session:
+            continue
+        if through_agent:
+            if entry.get("cached") and not include_cached:
+                continue
+            if not entry.get("sql"):
+                continue
+        elif entry.get("cached") or not entry.get("executed_sql"):
+            continue
+        selected.append(entry)
+    return selected[:limit] if limit else selected
+
+
+def run_direct(pool, sql):
+    """Exécute `sql` sur une connexion du pool et lit tout le résultat ; renvoie le nombre de lignes."""
+    with pool.connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute(sql)
+            if cursor.description is None:
+                return 0
+            rows = 0
+            while True:
+                batch = cursor.fetchmany(DRAIN_BATCH)
+                if not batch:
+                    return rows
+                rows += len(batch)
+        finally:
+            cursor.close()
+
+
+def run_through_agent(pool, sql):
+    # Import différé : le mode direct n'a besoin ni de pandas ni du reste de l'agent.
+    from agent.sql_agent import execute_sql_dataframe
+    results = execute_sql_dataframe(pool, sql)
+    if results is None:
+        raise Error("Échec de l'exécution de la requête.")
+    return len(results)
+
+
+def replay(pool, entries, speedup=1.0, concurrency=4, through_agent=False, on_progress=None):
+    """
+    Rejoue `entries` ; `speedup` = 0 envoie tout sans attendre (débit maximal).
+
+    Returns:
+        dict: Rapport (débit, latences, retard sur le planning, erreurs par type).
+    """
+    execute = run_through_agent if through_agent else run_direct
+    outcomes = []
+    outcomes_lock = threading.Lock()
+    origin = entries[0].get("ts", 0) if entries else 0
+    started = time.perf_counter()
+
+    def run(entry, scheduled):
+        begin = time.perf_counter()
+        outcome = {"lag": max(0.0, begin - started - scheduled), "error": None, "rows": None}
+        try:
+            outcome["rows"] = execute(pool, entry["sql"] if through_agent else entry["executed_sql"])
+        except Exception as e:
+            outcome["error"] = type(e).__name__
+        outcome["latency"] = time.perf_counter() - begin
+        outcome["recorded"] = entry.get("duration")
+        with outcomes_lock:
+            outcomes.append(outcome)
+            done = len(outcomes)
+        if on_progress:
+            on_progress(done, len(entries))
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="sqler-replay") as executor:
+        for entry in entries:
+            scheduled = (entry.get("ts", origin) - origin) / speedup if speedup else 0.0
+            delay = scheduled - (time.perf_counter() - started)
+            if delay > 0:
+                time.sleep(delay)
+            executor.submit(run, entry, scheduled)
+    wall = time.perf_counter() - started
+
+    latencies = [outcome["latency"] for outcome in outcomes if outcome["error"] is None]
+    recorded = [outcome["recorded"] for outcome in outcomes if outcome["error"] is None and outcome["recorded"] is not None]
+    errors = {}
+    for outcome in outcomes:
+        if outcome["error"]:
+            errors[outcome["error"]] = errors.get(outcome["error"], 0) + 1
+    lags = [outcome["lag"] for outcome in outcomes]
+    return {
+        "queries": len(outcomes),
+        "ok": len(latencies),
+        "errors": sum(errors.values()),
+        "error_rate": sum(errors.values()) / len(outcomes) if outcomes else 0.0,
+        "errors_by_type": errors,
+        "wall_seconds": wall,
+        "throughput_qps": len(outcomes) / wall if wall else 0.0,
+        "rows": sum(outcome["rows"] or 0 for outcome in outcomes),
+        "latency": {
+            "mean": sum(latencies) / len(latencies) if latencies else 0.0,
+            "p50": _percentile(latencies, 50),
+            "p95": _percentile(latencies, 95),
+            "p99": _percentile(latencies, 99),
+            "max": max(latencies, default=0.0),
+        },
+        # Durées mesurées lors de la capture, pour comparer avec la base cible.
+        "recorded_latency": {"p50": _percentile(recorded, 50), "p95": _percentile(recorded, 95)},
+        # Retard des requêtes sur leur heure prévue : s'il grandit, la concurrence est insuffisante.
+        "schedule_lag": {"p50": _percentile(lags, 50), "p95": _percentile(lags, 95), "max": max(lags, default=0.0)},
+    }
+
+
+def print_report(report):
+    latency, recorded, lag = report["latency"], report["recorded_latency"], report["schedule_lag"]
+    print(f"\n{report['queries']} requêtes en {report['wall_seconds']:.1f} s : {report['throughput_qps']:.1f} requêtes/s, "
+          f"{report['rows']} lignes lues")
+    print(f"Latence (ms)        : moyenne {latency['mean'] * 1000:.1f}, p50 {latency['p50'] * 1000:.1f}, "
+          f"p95 {latency['p95'] * 1000:.1f}, p99 {latency['p99'] * 1000:.1f}, max {latency['max'] * 1000:.1f}")
+    print(f"Latence capturée    : p50 {recorded['p50'] * 1000:.1f}, p95 {recorded['p95'] * 1000:.1f}")
+    print(f"Retard sur planning : p50 {lag['p50'] * 1000:.1f}, p95 {lag['p95'] * 1000:.1f}, max {lag['max'] * 1000:.1f}")
+    print(f"Erreurs             : {report['errors']} ({report['error_rate']:.1%})"
+          + "".join(f"\n  - {name} : {count}" for name, count in sorted(report["errors_by_type"].items())))
+
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Rejoue le journal de charge SQL contre une base cible.")
+    parser.add_argument("workload", help="Journal JSON lines (SQL_WORKLOAD_LOG).")
+    parser.add_argument("--speedup", type=float, default=1.0, help="Accélération de la cadence d'origine (0 = sans attente).")
+    parser.add_argument("--concurrency", type=int, default=4, help="Requêtes simultanées au maximum.")
+    parser.add_argument("--through-agent", action="store_true", help="Repasser par l'agent (garde-fou, cache de résultats).")
+    parser.add_argument("--exclude-cached", action="store_true", help="Avec --through-agent : ignorer les réponses du cache.")
+    parser.add_argument("--source", choices=("app", "cli", "batch"), help="Ne rejouer qu'une origine.")
+    parser.add_argument("--session", help="Ne rejouer qu'une session.")
+    parser.add_argument("--limit", type=int, help="Nombre maximal de requêtes rejouées.")
+    parser.add_argument("--host", default=os.getenv("DB_HOST"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("DB_PORT", "3306")))
+    parser.add_argument("--user", default=os.getenv("DB_USER"))
+    parser.add_argument("--database", default=os.getenv("DB_DATABASE"))
+    parser.add_argument("--output", help="Fichier JSON où enregistrer le rapport.")
+    args = parser.parse_args()
+
+    # Les requêtes rejouées ne doivent pas s'ajouter au journal de charge.
+    workload.enabled = False
+    entries = select_entries(
+        read_workload(args.workload), args.source, args.session,
+        include_cached=not args.exclude_cached, through_agent=args.through_agent, limit=args.limit,
+    )
+    if not entries:
+        print("Aucune requête à rejouer.")
+        return
+    span = entries[-1].get("ts", 0) - entries[0].get("ts", 0)
+    print(f"{len(entries)} requêtes capturées sur {span:.0f} s, rejouées "
+          f"{'sans attente' if not args.speedup else f'en accéléré ×{args.speedup:g}'} "
+          f"avec {args.concurrency} requêtes simultanées au maximum.")
+
+    pool = ConnectionPool(
+        pool_size=args.concurrency, host=args.host, port=args.port, user=args.user,
+        password=os.getenv("DB_PASSWORD"), database=args.database,
+    )
+    step = max(1, len(entries) // 20)
+
+    def progress(done, total):
+        if done % step == 0 or done == total:
+            print(f"  {done}/{total}")
+
+    try:
+        report = replay(pool, entries, args.speedup, args.concurrency, args.through_agent, progress)
+    finally:
+        pool.close()
+    print_report(report)
+    if args.output:
+        report["settings"] = {key: value for key, value in vars(args).items() if key != "output"}
+        with open(args.output, "w", encoding="utf-8") as output_file:
+            json.dump(report, output_file, indent=2, ensure_ascii=False)
+        print(f"Rapport enregistré dans {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,336 @@
+# replica.py
+
+# Réplique analytique locale : les tables et vues du schéma sont copiées périodiquement
+# dans des fichiers Parquet, interrogés en mémoire par DuckDB. Avec SQL_ENGINE=replica,
+# les requêtes générées y sont exécutées (après traduction des particularités MySQL) au
+# lieu de charger le serveur MySQL ; une requête que la réplique ne sait pas exécuter
+# repart automatiquement vers MySQL.
+#
+# Les résultats peuvent avoir jusqu'à REPLICA_REFRESH_SECONDS de retard sur la base. Comme
+# avec les collations MySQL habituelles, les comparaisons de chaînes ignorent la casse
+# (collation DuckDB `nocase` ; LIKE, qui ne suit pas la collation, est traduit en ILIKE).
+
+# Importations
+import json
+import os
+import re
+import shutil
+import threading
+import time
+
+from mysql.connector import Error
+
+from agent.columnar import ColumnarBuilder, iter_row_batches
+from agent.db_pool import ConnectionPool, borrow
+from agent.schema_catalog import get_schema_catalog
+
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+MANIFEST_NAME = "manifest.json"
+
+
+class ReplicaError(Exception):
+    """La réplique ne peut pas exécuter la requête : elle doit partir vers MySQL."""
+
+
+class UnsupportedSQLError(ReplicaError):
+    """Syntaxe MySQL sans équivalent traduit pour DuckDB."""
+
+
+# --- Traduction MySQL -> DuckDB ---
+# Littéraux (chaînes entre apostrophes ou guillemets) et identifiants entre backticks.
+_TOKEN_PATTERN = re.compile(r"'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.|\"\")*\"|`[^`]*`", re.DOTALL)
+_PLACEHOLDER = "\x00{}\x00"
+_PLACEHOLDER_PATTERN = re.compile(r"\x00(\d+)\x00")
+_HINT_PATTERN = re.compile(r"/\*\+.*?\*/", re.DOTALL)
+_UNSUPPORTED_PATTERN = re.compile(
+    r"\bSEPARATOR\b|\bSQL_CALC_FOUND_ROWS\b|\bSTRAIGHT_JOIN\b|\bWITH\s+ROLLUP\b|\b(?:FORCE|USE|IGNORE)\s+INDEX\b"
+    r"|\bFOR\s+UPDATE\b|\bLOCK\s+IN\s+SHARE\s+MODE\b|\bINTO\s+OUTFILE\b|\bTRUNCATE\s*\(|\bFIELD\s*\(|@|\|\|",
+    re.IGNORECASE,
+)
+# Argument de fonction simple : sans virgule, avec au plus un niveau de parenthèses.
+_ARG = r"((?:[^(),]|\([^()]*\))+?)"
+# Formats de DATE_FORMAT / STR_TO_DATE -> strftime / strptime.
+_DATE_FORMATS = {
+    "%Y": "%Y", "%y": "%y", "%m": "%m", "%c": "%-m", "%d": "%d", "%e": "%-d", "%M": "%B", "%b": "%b",
+    "%W": "%A", "%a": "%a", "%H": "%H", "%k": "%-H", "%h": "%I", "%I": "%I", "%i": "%M", "%s": "%S",
+    "%S": "%S", "%p": "%p", "%j": "%j", "%T": "%H:%M:%S", "%U": "%U", "%u": "%W", "%%": "%%",
+}
+_CASTS = {
+    r"SIGNED(?:\s+INTEGER)?": "BIGINT",
+    r"UNSIGNED(?:\s+INTEGER)?": "UBIGINT",
+    r"CHAR(?:\s*\(\s*\d+\s*\))?": "VARCHAR",
+    r"DATETIME": "TIMESTAMP",
+}
+
+
+def _literal_text(token):
+    """Contenu d'un littéral MySQL (échappements par antislash ou doublement)."""
+    quote, body = token[0], token[1:-1]
+    body = body.replace(quote * 2, quote)
+    return re.sub(r"\\(.)", lambda m: {"n": "\n", "t": "\t", "0": "\x00"}.get(m.group(1), m.group(1)), body)
+
+
+def _sql_string(text):
+    return "'" + text.replace("'", "''") + "'"
+
+
+def _date_format(mysql_format):
+    return re.sub(r"%.", lambda m: _DATE_FORMATS.get(m.group(0), m.group(0)), mysql_format)
+
+
+def translate_mysql(sql):
+    """
+    Traduit une requête SELECT MySQL en SQL DuckDB.
+
+    Raises:
+        UnsupportedSQLError: Construction MySQL non traduite (GROUP_CONCAT ... SEPARATOR,
+            variables @, index forcés...).
+    """
+    sql = _HINT_PATTERN.sub("", sql).strip().rstrip(";").strip()
+    literals = []
+
+    def stash(match):
+        token = match.group(0)
+        if token[0] == "`":
+            literals.append('"' + token[1:-1].replace('"', '""') + '"')
+        else:
+            # En MySQL, les guillemets délimitent aussi des chaînes ; en DuckDB, des identifiants.
+            literals.append(_sql_string(_literal_text(token)))
+        return _PLACEHOLDER.format(len(literals) - 1)
+
+    code = _TOKEN_PATTERN.sub(stash, sql)
+    if _UNSUPPORTED_PATTERN.search(code):
+        raise UnsupportedSQLError("Syntaxe MySQL non prise en charge par la réplique.")
+
+    def convert_format(match):
+        function = "strftime" if match.group(1).upper() == "DATE_FORMAT" else "strptime"
+        index = int(match.group(3))
+        literals[index] = _sql_string(_date_format(_literal_text(literals[index])))
+        return f"{function}({match.group(2)}, {_PLACEHOLDER.format(index)})"
+
+    code = re.sub(rf"\b(DATE_FORMAT|STR_TO_DATE)\s*\(\s*{_ARG}\s*,\s*\x00(\d+)\x00\s*\)", convert_format, code, flags=re.IGNORECASE)
+    code = re.sub(
+        rf"\b(DATE_ADD|ADDDATE|DATE_SUB|SUBDATE)\s*\(\s*{_ARG}\s*,\s*INTERVAL\s+{_ARG}\s+(\w+)\s*\)",
+        lambda m: f"({m.group(2)} {'-' if m.group(1).upper() in ('DATE_SUB', 'SUBDATE') else '+'} "
+                  f"INTERVAL ({m.group(3)}) {m.group(4)})",
+        code, flags=re.IGNORECASE,
+    )
+    code = re.sub(rf"\bDATEDIFF\s*\(\s*{_ARG}\s*,\s*{_ARG}\s*\)", r"date_diff('day', CAST(\2 AS DATE), CAST(\1 AS DATE))",
+                  code, flags=re.IGNORECASE)
+    code = re.sub(r"\bLIMIT\s+(\d+)\s*,\s*(\d+)", r"LIMIT \2 OFFSET \1", code, flags=re.IGNORECASE)
+    code = re.sub(r"\b(CURDATE|CURRENT_DATE)\s*\(\s*\)", "current_date", code, flags=re.IGNORECASE)
+    code = re.sub(r"\bDIV\b", "//", code, flags=re.IGNORECASE)
+    # LIKE est insensible à la casse avec les collations MySQL habituelles ; en DuckDB, il ne
+    # suit pas la collation par défaut.
+    code = re.sub(r"\bLIKE\b", "ILIKE", code, flags=re.IGNORECASE)
+    for mysql_type, duckdb_type in _CASTS.items():
+        code = re.sub(rf"\bAS\s+{mysql_type}(?=\s*\))", f"AS {duckdb_type}", code, flags=re.IGNORECASE)
+
+    # Un littéral n'étant restauré qu'une fois, un motif inséré plus haut ne peut pas y déteindre.
+    return _PLACEHOLDER_PATTERN.sub(lambda m: literals[int(m.group(1))], code)
+
+
+# --- Réplique ---
+class AnalyticReplica:
+    """
+    Instantané Parquet du schéma, interrogé par DuckDB dans le processus.
+
+    Args:
+        enabled (bool): Exécuter les requêtes sur la réplique (SQL_ENGINE=replica).
+        directory (str): Dossier des instantanés (REPLICA_DIR).
+        refresh_seconds (float): Âge au-delà duquel l'instantané est refait (REPLICA_REFRESH_SECONDS).
+        batch_size (int): Lignes lues par lot lors de la copie des tables.
+    """
+
+    def __init__(self, enabled=False, directory=".replica", refresh_seconds=3600.0, batch_size=50000):
+        if enabled and duckdb is None:
+            print("La réplique locale nécessite le paquet duckdb (pip install duckdb) : exécution sur MySQL.")
+            enabled = False
+        self.enabled = enabled
+        self.directory = directory
+        self.refresh_seconds = refresh_seconds
+        self.batch_size = batch_size
+        self.snapshot_at = None
+        self.tables = {}
+        self.queries = 0
+        self.fallbacks = 0
+        self.last_refresh_seconds = None
+        self._db = None
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self._loaded_manifest = False
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            enabled=os.getenv("SQL_ENGINE", "mysql").lower() == "replica",
+            directory=os.getenv("REPLICA_DIR", ".replica"),
+            refresh_seconds=float(os.getenv("REPLICA_REFRESH_SECONDS", "3600")),
+        )
+
+    @property
+    def ready(self):
+        return self._db is not None
+
+    def is_stale(self):
+        return self.snapshot_at is None or time.time() - self.snapshot_at > self.refresh_seconds
+
+    # --- Instantanés ---
+    def _read_manifest(self):
+        path = os.path.join(self.directory, MANIFEST_NAME)
+        try:
+            with open(path, encoding="utf-8") as manifest_file:
+                return json.load(manifest_file)
+        except (OSError, json.JSONDecodeError):
+            return None
+
+    def _load(self, manifest):
+        """Ouvre (ou remplace) les vues DuckDB sur les fichiers de l'instantané."""
+        with self._lock:
+            if self._db is None:
+                self._db = duckdb.connect(":memory:")
+                # `=`, IN, GROUP BY et ORDER BY insensibles à la casse, comme sur MySQL.
+                self._db.execute("SET default_collation='nocase'")
+            for table, info in manifest["tables"].items():
+                path = os.path.join(self.directory, manifest["snapshot"], info["file"]).replace("'", "''")
+                self._db.execute(f"CREATE OR REPLACE VIEW \"{table}\" AS SELECT * FROM read_parquet('{path}')")
+            self.tables = manifest["tables"]
+            self.snapshot_at = manifest["created_at"]
+
+    def refresh(self, connection):
+        """Copie toutes les tables et vues du schéma dans un nouvel instantané, puis bascule dessus."""
+        started = time.perf_counter()
+        snapshot = f"snapshot-{time.strftime('%Y%m%dT%H%M%S')}"
+        snapshot_dir = os.path.join(self.directory, snapshot)
+        os.makedirs(snapshot_dir, exist_ok=True)
+        writer = duckdb.connect(":memory:")
+        tables = {}
+        try:
+            with borrow(connection) as conn:
+                for table in list(get_schema_catalog(conn).tables):
+                    cursor = conn.cursor()
+                    cursor.execute(f"SELECT * FROM `{table}`")
+                    builder = ColumnarBuilder(cursor.description)
+                    for rows in iter_row_batches(cursor, self.batch_size):
+                        builder.add(rows)
+                    cursor.close()
+                    file_name = f"{table}.parquet"
+                    df = builder.to_dataframe()
+                    try:
+                        writer.register("snapshot_table", df)
+                        path = os.path.join(snapshot_dir, file_name).replace("'", "''")
+                        writer.execute(f"COPY snapshot_table TO '{path}' (FORMAT PARQUET)")
+                    except duckdb.Error as e:
+                        # Table absente de la réplique : les requêtes qui la lisent iront sur MySQL.
+                        print(f"Table {table} non copiée dans la réplique : {e}")
+                        continue
+                    finally:
+                        writer.unregister("snapshot_table")
+                    tables[table] = {"file": file_name, "rows": len(df)}
+        finally:
+            writer.close()
+
+        manifest = {"snapshot": snapshot, "created_at": time.time(), "tables": tables}
+        manifest_path = os.path.join(self.directory, MANIFEST_NAME)
+        with open(manifest_path + ".tmp", "w", encoding="utf-8") as manifest_file:
+            json.dump(manifest, manifest_file, indent=2)
+        os.replace(manifest_path + ".tmp", manifest_path)
+        previous = self._old_snapshots(current=snapshot)
+        self._load(manifest)
+        # L'instantané précédent est gardé : des requêtes en cours peuvent encore le lire.
+        for name in previous[:-1]:
+            shutil.rmtree(os.path.join(self.directory, name), ignore_errors=True)
+        self.last_refresh_seconds = time.perf_counter() - started
+        return manifest
+
+    def _old_snapshots(self, current):
+        """Instantanés antérieurs à `current`, du plus ancien au plus récent."""
+        return sorted(name for name in os.listdir(self.directory) if name.startswith("snapshot-") and name != current)
+
+    def _refresh_in_background(self, connection):
+        try:
+            self.refresh(connection)
+        except (Error, duckdb.Error, OSError) as e:
+            print(f"Échec du rafraîchissement de la réplique : {e}")
+        finally:
+            self._refreshing = False
+
+    def ensure_fresh(self, connection):
+        """
+        Charge l'instantané existant, puis lance un rafraîchissement s'il est trop ancien.
+
+        Avec un pool, la copie se fait en arrière-plan (les requêtes vont sur MySQL tant
+        qu'aucun instantané n'existe) ; avec une connexion unique, elle se fait sur place.
+        """
+        if not self.enabled:
+            return
+        if not self._loaded_manifest:
+            self._loaded_manifest = True
+            manifest = self._read_manifest()
+            if manifest:
+                self._load(manifest)
+        if not self.is_stale():
+            return
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        if isinstance(connection, ConnectionPool):
+            threading.Thread(target=self._refresh_in_background, args=(connection,), name="sqler-replica", daemon=True).start()
+        else:
+            self._refresh_in_background(connection)
+
+    # --- Exécution ---
+    def execute(self, statement, max_rows):
+        """
+        Exécute une requête MySQL (déjà vérifiée par le garde-fou) sur l'instantané.
+
+        Returns:
+            DataFrame: Au plus `max_rows` lignes ; `attrs["truncated"]` si le résultat était plus long.
+
+        Raises:
+            ReplicaError: Réplique indisponible, syntaxe non traduite ou erreur DuckDB.
+        """
+        if not self.ready:
+            raise ReplicaError("Aucun instantané disponible.")
+        self.queries += 1
+        try:
+            translated = translate_mysql(statement)
+            # Un curseur par requête : la connexion DuckDB est partagée entre les threads.
+            cursor = self._db.cursor()
+            try:
+                cursor.execute(f"SELECT * FROM ({translated}) AS replica_result LIMIT {max_rows + 1}")
+                results = cursor.fetch_df()
+            finally:
+                cursor.close()
+        except UnsupportedSQLError:
+            self.fallbacks += 1
+            raise
+        except duckdb.Error as e:
+            self.fallbacks += 1
+            raise ReplicaError(f"Erreur DuckDB : {e}") from e
+        truncated = len(results) > max_rows
+        if truncated:
+            results = results.iloc[:max_rows]
+        results.attrs["truncated"] = truncated
+        results.attrs["engine"] = "replica"
+        results.attrs["snapshot_at"] = self.snapshot_at
+        return results
+
+    def stats(self):
+        return {
+            "enabled": self.enabled,
+            "snapshot_at": self.snapshot_at,
+            "tables": len(self.tables),
+            "queries": self.queries,
+            "fallbacks": self.fallbacks,
+            "last_refresh_seconds": self.last_refresh_seconds,
+        }
+
+
+# Réplique partagée par le processus (inactive sauf SQL_ENGINE=replica).
+replica = AnalyticReplica.from_env()
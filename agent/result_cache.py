@@ -0,0 +1,236 @@
+# result_cache.py
+
+# Importations
+import os
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+from mysql.connector import Error
+
+from agent.metrics import metrics
+from agent.sql_guard import strip_comments
+
+# Noms de tables après FROM / JOIN (avec ou sans backticks, avec ou sans préfixe de base).
+_TABLE_PATTERN = re.compile(r"\b(?:FROM|JOIN)\s+`?(?:\w+`?\.`?)?(\w+)`?", re.IGNORECASE)
+# Liste de tables d'un FROM implicite : FROM a, b WHERE ...
+_FROM_LIST_PATTERN = re.compile(
+    r"\bFROM\s+([^()]*?)(?=\b(?:WHERE|GROUP|ORDER|LIMIT|HAVING|JOIN|INNER|LEFT|RIGHT|CROSS)\b|\)|;|$)",
+    re.IGNORECASE,
+)
+# Chaînes et identifiants délimités, dont le contenu ne doit pas être normalisé.
+_QUOTED_PATTERN = re.compile(r"'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.|\"\")*\"|`[^`]*`", re.DOTALL)
+
+
+def normalize_sql(sql):
+    """Normalise le texte SQL (commentaires, espaces, point-virgule final) pour la clé de cache."""
+    text = strip_comments(sql)
+    # Espaces réduits hors des littéraux : 'a  b' et 'a b' restent deux requêtes différentes.
+    parts, position = [], 0
+    for match in _QUOTED_PATTERN.finditer(text):
+        parts.append(re.sub(r"\s+", " ", text[position:match.start()]))
+        parts.append(match.group(0))
+        position = match.end()
+    parts.append(re.sub(r"\s+", " ", text[position:]))
+    return "".join(parts).strip().rstrip(";").strip()
+
+
+def extract_tables(sql):
+    """Renvoie l'ensemble (en minuscules) des tables référencées par une requête."""
+    tables = {name.lower() for name in _TABLE_PATTERN.findall(sql)}
+    for from_list in _FROM_LIST_PATTERN.findall(sql):
+        for item in from_list.split(",")[1:]:
+            match = re.match(r"\s*`?(\w+)`?", item)
+            if match:
+                tables.add(match.group(1).lower())
+    return tables
+
+
+def estimate_size(results):
+    """Estimation (en octets) de l'empreinte mémoire d'un résultat."""
+    if hasattr(results, "memory_usage"):
+        return int(results.memory_usage(deep=True).sum())
+    size = sys.getsizeof(results)
+    for row in results:
+        size += sys.getsizeof(row)
+        values = row.values() if isinstance(row, dict) else row
+        size += sum(sys.getsizeof(value) for value in values)
+    return size
+
+
+class ResultCache:
+    """
+    Cache des résultats de requêtes SQL, invalidé table par table.
+
+    Chaque entrée mémorise les tables qu'elle lit et leur version au moment de l'exécution
+    (`information_schema.TABLES.UPDATE_TIME` + compteur local) ; une vue compte pour les
+    tables qu'elle lit. Dès qu'une de ces tables change, l'entrée est ignorée. La mémoire
+    totale est plafonnée avec éviction LRU.
+
+    Les résultats renvoyés sont partagés : ils ne doivent pas être modifiés par l'appelant.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, ttl=300.0, check_interval=5.0):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.check_interval = check_interval
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._update_times = {}
+        self._view_tables = {}
+        self._counters = {}
+        self._checked_at = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @classmethod
+    def from_env(cls):
+        """Crée le cache (RESULT_CACHE_MAX_MB, RESULT_CACHE_TTL, RESULT_CACHE_CHECK_INTERVAL)."""
+        return cls(
+            max_bytes=int(float(os.getenv("RESULT_CACHE_MAX_MB", "64")) * 1024 * 1024),
+            ttl=float(os.getenv("RESULT_CACHE_TTL", "300")),
+            check_interval=float(os.getenv("RESULT_CACHE_CHECK_INTERVAL", "5")),
+        )
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+
+    # --- Versions des tables ---
+    def refresh_versions(self, connection, force=False):
+        """Relit UPDATE_TIME de toutes les tables (au plus une fois par `check_interval`)."""
+        now = time.monotonic()
+        if not force and now - self._checked_at < self.check_interval:
+            return
+        try:
+            cursor = connection.cursor()
+            try:
+                # MySQL 8 garde UPDATE_TIME en cache (24 h par défaut) : lecture directe.
+                cursor.execute("SET SESSION information_schema_stats_expiry = 0")
+            except Error:
+                # Variable inconnue (MySQL 5.7, MariaDB) : UPDATE_TIME n'y est pas mis en cache.
+                pass
+            cursor.execute(
+                "SELECT TABLE_NAME, UPDATE_TIME FROM information_schema.TABLES "
+                "WHERE TABLE_SCHEMA = DATABASE()"
+            )
+            update_times = {str(name).lower(): update_time for name, update_time in cursor.fetchall()}
+            view_tables = self._read_view_tables(cursor)
+            cursor.close()
+        except Error as e:
+            print(f"Impossible de lire les versions des tables : {e}")
+            return
+        self._update_times = update_times
+        self._view_tables = view_tables
+        self._checked_at = now
+
+    @staticmethod
+    def _read_view_tables(cursor):
+        """Tables lues directement par chaque vue du schéma."""
+        view_tables = {}
+        try:
+            cursor.execute(
+                "SELECT VIEW_NAME, TABLE_NAME FROM information_schema.VIEW_TABLE_USAGE "
+                "WHERE VIEW_SCHEMA = DATABASE()"
+            )
+            for view, table in cursor.fetchall():
+                view_tables.setdefault(str(view).lower(), set()).add(str(table).lower())
+        except Error:
+            # VIEW_TABLE_USAGE n'existe qu'à partir de MySQL 8.0.13 : tables lues dans la définition.
+            cursor.execute("SELECT TABLE_NAME, VIEW_DEFINITION FROM information_schema.VIEWS WHERE TABLE_SCHEMA = DATABASE()")
+            for view, definition in cursor.fetchall():
+                view_tables[str(view).lower()] = extract_tables(definition or "")
+        return view_tables
+
+    def _base_tables(self, tables):
+        """`tables`, avec pour chaque vue (même imbriquée) les tables qu'elle lit."""
+        resolved, pending = set(), list(tables)
+        while pending:
+            table = pending.pop()
+            if table in resolved:
+                continue
+            resolved.add(table)
+            pending.extend(self._view_tables.get(table, ()))
+        return resolved
+
+    def bump_table_version(self, table_name):
+        """Invalide explicitement les résultats qui lisent `table_name`."""
+        with self._lock:
+            key = table_name.lower()
+            self._counters[key] = self._counters.get(key, 0) + 1
+
+    def _versions(self, tables):
+        return tuple(
+            (table, self._update_times.get(table), self._counters.get(table, 0))
+            for table in sorted(tables)
+        )
+
+    # --- Accès au cache ---
+    def get(self, connection, query):
+        """Renvoie le résultat en cache de `query` s'il est encore valide, sinon None."""
+        if not self.enabled:
+            return None
+        self.refresh_versions(connection)
+        key = normalize_sql(query)
+        results = None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                outcome = "miss"
+            elif entry[3] < time.time() or entry[1] != self._versions(t for t, _, _ in entry[1]):
+                self._remove(key)
+                self.invalidations += 1
+                self.misses += 1
+                outcome = "invalidated"
+            else:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                outcome = "hit"
+                results = entry[0]
+        metrics.inc("result_cache_lookups_total", result=outcome)
+        return results
+
+    def put(self, query, results):
+        """Met en cache le résultat d'une requête de lecture."""
+        if not self.enabled or results is None:
+            return
+        if not re.match(r"\s*(SELECT|WITH)\b", query, re.IGNORECASE):
+            return
+        size = estimate_size(results)
+        # Un résultat trop gros viderait le cache pour une seule entrée.
+        if size > self.max_bytes // 4:
+            return
+        key = normalize_sql(query)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            versions = self._versions(self._base_tables(extract_tables(query)))
+            self._entries[key] = (results, versions, size, time.time() + self.ttl)
+            self._bytes += size
+            while self._bytes > self.max_bytes and self._entries:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key):
+        _, _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """Compteurs et occupation mémoire du cache (lectures publiées dans `result_cache_lookups_total`)."""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+            }
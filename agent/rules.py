@@ -0,0 +1,143 @@
+# rules.py
+
+# Importations
+import re
+import unicodedata
+from collections import namedtuple
+
+AgentRule = namedtuple("AgentRule", ["number", "text", "triggers", "always"])
+
+# Règles envoyées avec chaque question : forme (sortie SQL seule, noms plutôt qu'identifiants,
+# alias, LIMIT 10 par défaut, mise en forme) et validité des agrégats (pas d'agrégat imbriqué,
+# GROUP BY complet), qu'aucun mot de la question ne permet de prévoir.
+ALWAYS_ON = {1, 8, 10, 11, 29, 32, 36}
+
+# Déclencheurs par numéro de règle : expressions régulières appliquées à la question
+# normalisée (minuscules, sans accents). Une règle est retenue dès qu'un motif correspond.
+RULE_TRIGGERS = {
+    2: [r"chiffre d.?affaire", r"\bca\b", r"turnover", r"revenue", r"\bsales?\b", r"\bventes?\b"],
+    3: [r"\bprix\b", r"\bprice", r"chiffre d.?affaire", r"\bca\b", r"turnover", r"revenue", r"\bsales?\b", r"\bventes?\b", r"marge", r"margin"],
+    4: [r"prix d.?achat", r"buy ?price", r"\bachat", r"marge", r"margin", r"purchase"],
+    5: [r"paiement", r"payment", r"\bpaye", r"\bpaid\b"],
+    6: [r"employe", r"employee", r"commercia", r"vendeur", r"sales ?rep", r"responsable"],
+    7: [r"duree", r"delai", r"payment (delay|time|duration)", r"days? to pay"],
+    9: [r"\b(turnover|revenue|sales|customers?|employees?|products?|orders?|payments?|price|quantity|stock|product line|office|sales rep)\b"],
+    12: [r"meilleur(s)? client", r"best customer", r"top (\d+ )?(clients?|customers?)", r"clients? les plus"],
+    13: [r"marge en valeur", r"marge brute", r"gross margin", r"\bmarge\b", r"\bmargin\b"],
+    14: [r"pourcentage de marge", r"taux de marge", r"margin (rate|percentage|ratio)", r"% de marge"],
+    15: [r"marge", r"margin"],
+    16: [r"ecoulement", r"sell.?through"],
+    17: [r"rotation", r"stock turnover", r"inventory turnover"],
+    18: [r"valeur (du|de) stock", r"stock value", r"inventory value", r"prix d.?achat"],
+    19: [r"recouvrement", r"recovery", r"collection rate", r"impaye", r"unpaid"],
+    20: [r"marge", r"margin", r"valeur (du|de) stock", r"stock value"],
+    21: [r"(valeur (du|de) stock|stock value).*(moyen|average|avg)", r"prix de vente moyen", r"average (selling|sale) price"],
+    22: [r"(valeur (du|de) stock|stock value).*(max)", r"prix de vente max", r"max(imum)? (selling|sale) price"],
+    23: [r"(valeur (du|de) stock|stock value).*(min)", r"prix de vente min", r"min(imum)? (selling|sale) price"],
+    24: [r"bureau", r"office"],
+    25: [r"bureau", r"office"],
+    26: [r"\bnombre\b", r"combien", r"\bcount\b", r"how many", r"compte", r"number of"],
+    27: [r"montant moyen", r"average order", r"panier moyen", r"commande moyenne", r"mean order"],
+    28: [r"manager", r"dirigeant", r"chef", r"\bboss", r"reports? ?to"],
+    29: [r"moyen", r"average", r"\bavg\b", r"\bmean\b"],
+    30: [r"\bville", r"\bcit(y|ies)\b"],
+    31: [r"limite de credit", r"credit ?limit", r"plafond"],
+    32: [r"\bpar\b", r"\bby\b", r"\bper\b", r"chaque", r"\beach\b", r"limite de credit", r"credit ?limit"],
+    33: [r"impaye", r"unpaid", r"solde", r"outstanding", r"balance"],
+    34: [r"marge moyenne", r"average margin", r"mean margin"],
+    35: [r"(quantite|quantity|quantities).*(bureau|office)", r"(bureau|office).*(quantite|quantity|quantities)", r"total des commandes par bureau"],
+}
+
+# Tables qu'une règle impose (jointures, sources obligatoires) ou interdit : l'élagage du
+# schéma (schema_index) doit laisser les premières dans le prompt et peut retirer les secondes.
+_OFFICE_CHAIN = {"offices", "employees", "customers", "orders", "orderdetails"}
+RULE_TABLES = {
+    2: {"orders", "orderdetails"},
+    3: {"orderdetails"},
+    4: {"products"},
+    5: {"orders", "payments"},
+    6: {"employees", "customers"},
+    7: {"orders", "payments"},
+    12: {"commande_client", "customers"},
+    13: {"orderdetails", "products"},
+    14: {"orderdetails", "products"},
+    16: {"ecoulement_stock"},
+    17: {"rotation_stock"},
+    18: {"value_stock_quantity"},
+    19: {"recouvrement", "customers"},
+    21: {"orderdetails", "products"},
+    22: {"orderdetails", "products"},
+    23: {"orderdetails", "products"},
+    24: _OFFICE_CHAIN,
+    25: _OFFICE_CHAIN - {"orderdetails"},
+    27: {"orders", "orderdetails", "customers"},
+    28: {"employees"},
+    30: {"orders", "customers"},
+    31: {"customers", "orders", "orderdetails"},
+    33: {"customers", "orders", "orderdetails", "payments"},
+    34: {"marge_produit"},
+    35: _OFFICE_CHAIN,
+}
+RULE_EXCLUDED_TABLES = {
+    21: {"value_stock_quantity"},
+    22: {"value_stock_quantity"},
+    23: {"value_stock_quantity"},
+}
+
+_RULE_START = re.compile(r"^(\d+)\.\s+", re.MULTILINE)
+
+
+def normalize_text(text):
+    """Minuscules, sans accents, espaces simples."""
+    text = "".join(c for c in unicodedata.normalize("NFKD", text) if not unicodedata.combining(c))
+    return re.sub(r"\s+", " ", text.lower()).strip()
+
+
+def parse_rules(rules_text):
+    """
+    Découpe le bloc de règles numérotées en entrées structurées.
+
+    Returns:
+        tuple: (en-tête du bloc, liste de `AgentRule` dans l'ordre d'origine).
+    """
+    starts = list(_RULE_START.finditer(rules_text))
+    header = rules_text[:starts[0].start()] if starts else rules_text
+    rules = []
+    for position, match in enumerate(starts):
+        end = starts[position + 1].start() if position + 1 < len(starts) else len(rules_text)
+        number = int(match.group(1))
+        triggers = [re.compile(pattern) for pattern in RULE_TRIGGERS.get(number, [])]
+        rules.append(AgentRule(number, rules_text[match.start():end], triggers, number in ALWAYS_ON))
+    return header, rules
+
+
+class RuleMatcher:
+    """Sélectionne, pour une question, les règles toujours actives et celles qu'elle déclenche."""
+
+    def __init__(self, rules_text):
+        self.header, self.rules = parse_rules(rules_text)
+
+    def match(self, user_question):
+        """Liste des règles applicables à la question, dans l'ordre d'origine."""
+        question = normalize_text(user_question)
+        return [
+            rule for rule in self.rules
+            if rule.always or any(pattern.search(question) for pattern in rule.triggers)
+        ]
+
+    def tables(self, user_question):
+        """
+        Tables imposées et tables interdites par les règles que déclenche la question.
+
+        Returns:
+            tuple: (ensemble des tables requises, ensemble des tables exclues)
+        """
+        required, excluded = set(), set()
+        for rule in self.match(user_question):
+            required |= RULE_TABLES.get(rule.number, set())
+            excluded |= RULE_EXCLUDED_TABLES.get(rule.number, set())
+        return required - excluded, excluded
+
+    def render(self, user_question):
+        """Bloc de règles à injecter dans le prompt pour cette question."""
+        return self.header + "".join(rule.text for rule in self.match(user_question))
@@ -0,0 +1,154 @@
+# schema_catalog.py
+
+# Importations
+import os
+import threading
+import time
+import zlib
+from collections import namedtuple
+
+from agent.db_pool import borrow
+
+Column = namedtuple("Column", ["name", "type", "key", "nullable"])
+ForeignKey = namedtuple("ForeignKey", ["table", "column", "ref_table", "ref_column"])
+
+# Une seule requête : colonnes, clés et clés étrangères de toutes les tables et vues.
+CATALOG_QUERY = """
+SELECT c.TABLE_NAME, c.COLUMN_NAME, c.COLUMN_TYPE, c.COLUMN_KEY, c.IS_NULLABLE,
+       k.REFERENCED_TABLE_NAME, k.REFERENCED_COLUMN_NAME
+FROM information_schema.COLUMNS AS c
+LEFT JOIN information_schema.KEY_COLUMN_USAGE AS k
+    ON k.TABLE_SCHEMA = c.TABLE_SCHEMA
+   AND k.TABLE_NAME = c.TABLE_NAME
+   AND k.COLUMN_NAME = c.COLUMN_NAME
+   AND k.REFERENCED_TABLE_NAME IS NOT NULL
+WHERE c.TABLE_SCHEMA = DATABASE()
+ORDER BY c.TABLE_NAME, c.ORDINAL_POSITION
+"""
+
+# Empreinte peu coûteuse du schéma : change dès qu'une colonne est ajoutée, supprimée ou modifiée.
+FINGERPRINT_QUERY = """
+SELECT COUNT(*), COALESCE(SUM(CRC32(CONCAT_WS('|', TABLE_NAME, COLUMN_NAME, COLUMN_TYPE, COLUMN_KEY))), 0)
+FROM information_schema.COLUMNS
+WHERE TABLE_SCHEMA = DATABASE()
+"""
+
+
+def _text(value):
+    if isinstance(value, (bytes, bytearray)):
+        return value.decode("utf-8")
+    return value
+
+
+class SchemaCatalog:
+    """
+    Catalogue structuré du schéma : tables, colonnes, clés et clés étrangères.
+
+    Attributes:
+        tables (dict): nom de table -> liste de `Column`, dans l'ordre des colonnes.
+        foreign_keys (list): liste de `ForeignKey`.
+        fingerprint (str): empreinte du schéma au moment du chargement.
+    """
+
+    def __init__(self, tables, foreign_keys, fingerprint):
+        self.tables = tables
+        self.foreign_keys = foreign_keys
+        self.fingerprint = fingerprint
+        self._prompt = None
+
+    @classmethod
+    def load(cls, connection):
+        """Charge le catalogue en un seul aller-retour vers `information_schema`."""
+        cursor = connection.cursor()
+        cursor.execute(CATALOG_QUERY)
+        rows = cursor.fetchall()
+        cursor.close()
+
+        tables = {}
+        foreign_keys = []
+        checksum = 0
+        for table, column, column_type, key, nullable, ref_table, ref_column in rows:
+            table, column, column_type, key = _text(table), _text(column), _text(column_type), _text(key) or ""
+            columns = tables.setdefault(table, [])
+            # Une colonne référençant plusieurs tables apparaît sur plusieurs lignes.
+            if not columns or columns[-1].name != column:
+                columns.append(Column(column, column_type, key, _text(nullable) == "YES"))
+                # Même calcul que FINGERPRINT_QUERY, pour comparer sans relire le catalogue.
+                checksum += zlib.crc32("|".join((table, column, column_type, key)).encode("utf-8"))
+            if ref_table:
+                foreign_keys.append(ForeignKey(table, column, _text(ref_table), _text(ref_column)))
+        column_count = sum(len(columns) for columns in tables.values())
+        return cls(tables, foreign_keys, f"{column_count}-{checksum}")
+
+    def columns(self, table_name):
+        return self.tables.get(table_name, [])
+
+    def to_prompt(self, table_names=None):
+        """Représentation texte du schéma pour le prompt (toutes les tables par défaut)."""
+        if table_names is None and self._prompt is not None:
+            return self._prompt
+        schema_string = ""
+        for table_name, columns in self.tables.items():
+            if table_names is not None and table_name not in table_names:
+                continue
+            schema_string += f"Table: {table_name}\n"
+            for column in columns:
+                schema_string += f"  - {column.name} ({column.type})\n"
+            schema_string += "\n"
+        if table_names is None:
+            self._prompt = schema_string
+        return schema_string
+
+
+def _fingerprint_from_row(row):
+    count, checksum = row
+    return f"{int(count)}-{int(checksum)}"
+
+
+def read_fingerprint(connection):
+    """Lit l'empreinte courante du schéma (une requête d'agrégat sur information_schema)."""
+    cursor = connection.cursor()
+    cursor.execute(FINGERPRINT_QUERY)
+    fingerprint = _fingerprint_from_row(cursor.fetchone())
+    cursor.close()
+    return fingerprint
+
+
+# --- Catalogue partagé par le processus ---
+_catalog = None
+_checked_at = 0.0
+_catalog_lock = threading.Lock()
+
+
+def get_schema_catalog(connection, check_interval=None):
+    """
+    Renvoie le catalogue partagé, en le rechargeant seulement si le schéma a changé.
+
+    Tant que le dernier contrôle date de moins de `check_interval` secondes
+    (SCHEMA_CHECK_INTERVAL, 300 s par défaut), aucune requête n'est émise.
+    `connection` peut être une connexion ou un pool.
+    """
+    global _catalog, _checked_at
+    if check_interval is None:
+        check_interval = float(os.getenv("SCHEMA_CHECK_INTERVAL", "300"))
+
+    with _catalog_lock:
+        if _catalog is not None and time.monotonic() - _checked_at < check_interval:
+            return _catalog
+        with borrow(connection) as conn:
+            if _catalog is None or read_fingerprint(conn) != _catalog.fingerprint:
+                _catalog = SchemaCatalog.load(conn)
+        _checked_at = time.monotonic()
+        return _catalog
+
+
+def get_cached_catalog():
+    """Catalogue déjà chargé (sans requête), ou None."""
+    return _catalog
+
+
+def invalidate_catalog():
+    """Force le rechargement du catalogue au prochain appel."""
+    global _checked_at
+    _checked_at = 0.0
+
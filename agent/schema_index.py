@@ -0,0 +1,311 @@
+# schema_index.py
+
+# Importations
+import math
+import os
+import re
+import threading
+import unicodedata
+from collections import defaultdict, deque
+
+from agent.cache import fingerprint
+from agent.metrics import metrics
+from agent.schema_catalog import get_cached_catalog
+
+# Mots vides français/anglais ignorés par l'index.
+STOPWORDS = {
+    "le", "la", "les", "un", "une", "des", "du", "de", "d", "l", "et", "ou", "en", "par", "pour", "sur",
+    "avec", "dans", "au", "aux", "est", "sont", "quel", "quels", "quelle", "quelles", "qui", "que", "quoi",
+    "combien", "nos", "notre", "leur", "leurs", "ce", "ces", "cette", "plus", "moins", "tous", "toutes",
+    "the", "a", "an", "of", "and", "or", "in", "by", "for", "on", "with", "to", "what", "which", "who",
+    "how", "many", "much", "is", "are", "our", "their", "all", "each", "per", "top", "most", "best",
+    "table", "tables", "colonne", "colonnes", "utiliser", "cle", "key", "vue", "question", "questions",
+}
+
+# Correspondances de vocabulaire métier (question) -> termes présents dans le schéma.
+SYNONYMS = {
+    "client": ["customer"],
+    "clients": ["customer"],
+    "commande": ["order"],
+    "commandes": ["order"],
+    "produit": ["product"],
+    "produits": ["product"],
+    "employe": ["employee"],
+    "employes": ["employee"],
+    "vendeur": ["employee", "salesrep"],
+    "commercial": ["employee", "salesrep"],
+    "bureau": ["office"],
+    "bureaux": ["office"],
+    "agence": ["office"],
+    "paiement": ["payment"],
+    "paiements": ["payment"],
+    "gamme": ["productline"],
+    "gammes": ["productline"],
+    "ligne": ["productline"],
+    "chiffre": ["chiffre", "affaire", "priceeach", "quantityordered"],
+    "ca": ["chiffre", "affaire"],
+    "turnover": ["chiffre", "affaire", "priceeach", "quantityordered"],
+    "revenue": ["chiffre", "affaire", "priceeach", "quantityordered"],
+    "sales": ["chiffre", "affaire", "priceeach", "quantityordered"],
+    "vente": ["chiffre", "affaire", "quantityordered"],
+    "ventes": ["chiffre", "affaire", "quantityordered"],
+    "pays": ["country"],
+    "ville": ["city"],
+    "prix": ["priceeach", "buyprice"],
+    "quantite": ["quantityordered", "quantityinstock"],
+    "marge": ["marge", "buyprice", "priceeach"],
+    "margin": ["marge", "buyprice", "priceeach"],
+    "impaye": ["recouvrement", "payment"],
+    "impayes": ["recouvrement", "payment"],
+    "manager": ["reportsto", "employee"],
+    "managers": ["reportsto", "employee"],
+    "annee": ["orderdate"],
+    "mois": ["orderdate"],
+    "year": ["orderdate"],
+    "month": ["orderdate"],
+}
+
+
+def _strip_accents(text):
+    return "".join(c for c in unicodedata.normalize("NFKD", text) if not unicodedata.combining(c))
+
+
+def tokenize(text):
+    """Découpe un texte (ou un identifiant camelCase/snake_case) en termes normalisés."""
+    text = re.sub(r"([a-z])([A-Z])", r"\1 \2", text)
+    words = re.findall(r"[a-z0-9]+", _strip_accents(text).lower())
+    return [word for word in words if word not in STOPWORDS and len(word) > 1]
+
+
+def _stem(word):
+    if len(word) > 4 and word[-1] in "sx":
+        word = word[:-1]
+    return word[:8]
+
+
+def expand_terms(text, synonyms=False):
+    """Termes normalisés d'un texte et ses bigrammes, enrichis des synonymes métier si demandé."""
+    terms = []
+    words = tokenize(text)
+    for word in words:
+        terms.append(_stem(word))
+        if synonyms:
+            terms.extend(_stem(synonym) for synonym in SYNONYMS.get(word, []))
+    # Bigrammes : distinguent « taux de rotation » de « rotation » seule, etc.
+    terms.extend(_stem(a) + "_" + _stem(b) for a, b in zip(words, words[1:]))
+    return terms
+
+
+def estimate_tokens(text):
+    """Estimation grossière du nombre de tokens d'un texte (≈ 4 caractères par token)."""
+    return max(1, len(text) // 4) if text else 0
+
+
+def parse_schema_string(db_schema):
+    """Reconstitue {table: [(colonne, type), ...]} à partir de la sortie de get_database_schema."""
+    tables = {}
+    current = None
+    for line in db_schema.splitlines():
+        if line.startswith("Table: "):
+            current = line[len("Table: "):].strip()
+            tables[current] = []
+        elif current and line.strip().startswith("- "):
+            match = re.match(r"\s*-\s+(\S+)\s+\((.*)\)\s*$", line)
+            if match:
+                tables[current].append((match.group(1), match.group(2)))
+    return tables
+
+
+class SchemaIndex:
+    """
+    Index inversé (termes et bigrammes) sur les noms de tables, de colonnes et la documentation.
+
+    `select_tables` classe les tables par pertinence pour une question, puis complète
+    la sélection avec les tables intermédiaires nécessaires aux jointures (graphe des clés).
+    """
+
+    # Poids d'un terme selon l'endroit où il apparaît.
+    TABLE_WEIGHT = 3.0
+    COLUMN_WEIGHT = 2.0
+    DOC_WEIGHT = 1.0
+
+    def __init__(self, tables, documentation, foreign_keys=()):
+        self.tables = tables
+        self.documentation = documentation
+        self._postings = defaultdict(dict)
+        self._graph = defaultdict(set)
+
+        for table_name, columns in tables.items():
+            self._add(table_name, expand_terms(table_name), self.TABLE_WEIGHT)
+            self._add(table_name, [_stem(table_name.lower())], self.TABLE_WEIGHT)
+            for column_name, _ in columns:
+                self._add(table_name, [_stem(t) for t in tokenize(column_name)], self.COLUMN_WEIGHT)
+                self._add(table_name, [_stem(column_name.lower())], self.COLUMN_WEIGHT)
+            doc = documentation.get(table_name, "")
+            self._add(table_name, expand_terms(doc), self.DOC_WEIGHT)
+
+        table_count = max(1, len(tables))
+        self._idf = {
+            term: math.log(1 + table_count / len(postings)) for term, postings in self._postings.items()
+        }
+        self._build_graph(foreign_keys)
+
+    def _add(self, table_name, terms, weight):
+        for term in terms:
+            postings = self._postings[term]
+            postings[table_name] = max(postings.get(table_name, 0.0), weight)
+
+    def _build_graph(self, foreign_keys):
+        for fk in foreign_keys:
+            if fk.table in self.tables and fk.ref_table in self.tables:
+                self._link(fk.table, fk.ref_table)
+        # Tables dérivées sans clés étrangères : relier via la documentation ...
+        lowered = {name.lower(): name for name in self.tables}
+        for table_name, doc in self.documentation.items():
+            if table_name not in self.tables:
+                continue
+            for word in re.findall(r"\w+", doc.lower()):
+                other = lowered.get(word)
+                if other and other != table_name:
+                    self._link(table_name, other)
+        # ... et via les colonnes d'identifiant partagées (customerNumber, productCode, ...).
+        owners = defaultdict(set)
+        for table_name, columns in self.tables.items():
+            for column_name, _ in columns:
+                if re.search(r"(Number|(?<!postal)Code)$", column_name):
+                    owners[column_name.lower()].add(table_name)
+        for tables in owners.values():
+            if len(tables) <= 4:
+                for a in tables:
+                    for b in tables:
+                        if a != b:
+                            self._link(a, b)
+
+    def _link(self, a, b):
+        self._graph[a].add(b)
+        self._graph[b].add(a)
+
+    def score(self, question):
+        """Score de pertinence de chaque table pour une question."""
+        scores = defaultdict(float)
+        for term in expand_terms(question, synonyms=True):
+            for table_name, weight in self._postings.get(term, {}).items():
+                scores[table_name] += weight * self._idf[term]
+        return dict(scores)
+
+    def _path(self, start, goal, excluded=()):
+        previous = {start: None}
+        queue = deque([start])
+        while queue:
+            node = queue.popleft()
+            if node == goal:
+                path = []
+                while node is not None:
+                    path.append(node)
+                    node = previous[node]
+                return path
+            for neighbour in sorted(self._graph[node]):
+                if neighbour not in previous and neighbour not in excluded:
+                    previous[neighbour] = node
+                    queue.append(neighbour)
+        return [start, goal]
+
+    def select_tables(self, question, max_tables=4, min_ratio=0.35, required=(), excluded=()):
+        """
+        Tables nécessaires pour répondre à `question`, ou None si rien ne correspond.
+
+        Args:
+            max_tables (int): Nombre maximal de tables retenues par score (avant ajout des jointures).
+            min_ratio (float): Score minimal relatif au meilleur score pour retenir une table.
+            required (set): Tables imposées par les règles déclenchées, toujours retenues.
+            excluded (set): Tables interdites par ces règles, jamais retenues.
+        """
+        # Une table imposée absente du schéma : impossible d'élaguer sans risque.
+        if any(table_name not in self.tables for table_name in required):
+            return None
+        scores = self.score(question)
+        ranked = sorted(
+            ((name, value) for name, value in scores.items() if name not in excluded),
+            key=lambda item: item[1], reverse=True,
+        )
+        best = ranked[0][1] if ranked else 0.0
+        selected = [name for name, value in ranked[:max_tables] if value >= best * min_ratio]
+        selected += sorted(table_name for table_name in required if table_name not in selected)
+        if not selected:
+            return None
+        # Ajoute les tables intermédiaires des chemins de jointure vers la table principale.
+        expanded = list(selected)
+        for table_name in selected[1:]:
+            for step in self._path(selected[0], table_name, excluded):
+                if step not in expanded:
+                    expanded.append(step)
+        return expanded
+
+    def render(self, table_names, foreign_keys=()):
+        """Section de schéma compacte (une ligne par table) et documentation des tables retenues."""
+        lines = []
+        for table_name in table_names:
+            columns = ", ".join(f"{name} {col_type}" for name, col_type in self.tables[table_name])
+            lines.append(f"{table_name}({columns})")
+        for fk in foreign_keys:
+            if fk.table in table_names and fk.ref_table in table_names:
+                lines.append(f"FK: {fk.table}.{fk.column} -> {fk.ref_table}.{fk.ref_column}")
+        docs = "\n".join(
+            f"Table '{name}': {self.documentation[name]}" for name in table_names if name in self.documentation
+        )
+        return "\n".join(lines), docs
+
+
+_index_cache = {}
+_index_lock = threading.Lock()
+
+
+def get_schema_index(db_schema, documentation):
+    """Index du schéma, construit une fois par version du schéma et de la documentation."""
+    key = fingerprint(db_schema, sorted(documentation.items()))
+    with _index_lock:
+        index = _index_cache.get(key)
+        if index is None:
+            catalog = get_cached_catalog()
+            foreign_keys = catalog.foreign_keys if catalog is not None else ()
+            index = SchemaIndex(parse_schema_string(db_schema), documentation, foreign_keys)
+            _index_cache.clear()
+            _index_cache[key] = index
+        return index
+
+
+def build_schema_context(user_question, db_schema, documentation, required=(), excluded=()):
+    """
+    Sections « schéma » et « documentation » du prompt, réduites aux tables utiles.
+
+    Les tables `required` (imposées par les règles déclenchées, voir RuleMatcher.tables) sont
+    toujours gardées, les tables `excluded` retirées. Revient au schéma complet si l'élagage
+    est désactivé (SCHEMA_PRUNING=0), si aucune table ne correspond à la question ou si une
+    table imposée manque au schéma. Les tokens économisés sont mesurés dans
+    l'histogramme `prompt_tokens_saved`.
+
+    Returns:
+        tuple: (schema_text, docs_text, tables) — `tables` vaut None sans élagage.
+    """
+    full_docs = "\n".join(f"Table '{name}': {doc}" for name, doc in documentation.items())
+    full_tokens = estimate_tokens(db_schema) + estimate_tokens(full_docs)
+
+    tables = None
+    schema_text, docs_text = db_schema, full_docs
+    if os.getenv("SCHEMA_PRUNING", "1") != "0":
+        index = get_schema_index(db_schema, documentation)
+        tables = index.select_tables(
+            user_question, max_tables=int(os.getenv("SCHEMA_PRUNING_MAX_TABLES", "4")),
+            required=required, excluded=excluded,
+        )
+        if tables:
+            catalog = get_cached_catalog()
+            schema_text, docs_text = index.render(tables, catalog.foreign_keys if catalog else ())
+        else:
+            tables = None
+
+    metrics.observe(
+        "prompt_tokens_saved", full_tokens - estimate_tokens(schema_text) - estimate_tokens(docs_text),
+        pruned="yes" if tables else "no",
+    )
+    return schema_text, docs_text, tables
@@ -2,11 +2,29 @@
 
 # Importations
 import os
+import json
 import mysql.connector
 import re
+import time
+import uuid
+import pandas as pd
 from dotenv import load_dotenv
 from mysql.connector import Error
-from groq import Groq
+
+from agent.cache import SQLQueryCache, fingerprint
+from agent.columnar import ColumnarBuilder, iter_row_batches
+from agent.db_pool import borrow, create_pool_from_env
+from agent.llm_gateway import create_groq_client, gateway
+from agent.metrics import metrics
+from agent.replica import ReplicaError, replica
+from agent.result_cache import ResultCache
+from agent.rules import RuleMatcher
+from agent.schema_catalog import get_schema_catalog
+from agent.schema_index import build_schema_context
+from agent.sql_guard import ER_QUERY_INTERRUPTED, ER_QUERY_TIMEOUT, QueryCancelledError, QueryGuardError, SQLGuard, reaches_limit
+from agent.streaming import FenceStripper
+from agent.templates import match_template
+from agent.workload import set_session, workload
 
 # Import de la fonction de visualisation depuis le module visualizer.py
 from visualizer import generate_visualization
@@ -157,6 +175,20 @@ Règles strictes pour la génération de requêtes :
     ```
 """
 
+# --- Cache des requêtes générées, partagé par toutes les sessions du processus. ---
+# La version des règles fait partie de la clé : modifier agent_rules ou table_documentation
+# invalide automatiquement les requêtes déjà mises en cache.
+RULES_VERSION = fingerprint(agent_rules, json.dumps(table_documentation, sort_keys=True))
+# Règles structurées : seules les règles toujours actives et celles déclenchées par la question
+# sont envoyées (SQL_RULES_MODE=full pour revenir au bloc complet).
+rule_matcher = RuleMatcher(agent_rules)
+sql_query_cache = SQLQueryCache.from_env()
+# Cache des résultats, invalidé dès qu'une table lue par la requête est modifiée.
+result_cache = ResultCache.from_env()
+
+# Contrôles avant exécution (lecture seule, LIMIT, EXPLAIN, MAX_EXECUTION_TIME).
+sql_guard = SQLGuard.from_env()
+
 # --- Configuration de la base de données ---
 def get_db_connection():
     """Crée et renvoie un objet de connexion à la base de données."""
@@ -178,64 +210,73 @@ def get_db_connection():
         print(f"Erreur lors de la connexion à MySQL: {e}")
         return None
 
+def get_db_pool():
+    """Crée et renvoie le pool de connexions partagé (taille via DB_POOL_SIZE)."""
+    if not os.getenv("DB_DATABASE"):
+        print("Erreur: La variable d'environnement DB_DATABASE n'est pas définie.")
+        return None
+
+    pool = create_pool_from_env()
+    try:
+        # Ouvre une première connexion pour signaler tout de suite une configuration invalide.
+        with pool.connection():
+            pass
+    except Error as e:
+        print(f"Erreur lors de la connexion à MySQL: {e}")
+        return None
+    return pool
+
 # --- Configuration de l'agent LLM (Groq) ---
 def setup_groq_client():
-    """Initialise et renvoie le client Groq."""
-    api_key = os.getenv("GROQ_API_KEY")
-    if not api_key:
-        raise ValueError("GROQ_API_KEY non trouvée dans les variables d'environnement.")
-    return Groq(api_key=api_key)
+    """Initialise et renvoie le client Groq (GROQ_API_KEY, GROQ_BASE_URL ; voir llm_gateway)."""
+    return create_groq_client()
 
 # --- Fonction pour récupérer le schéma de la base de données ---
 def get_database_schema(connection):
     """
     Récupère le schéma des tables et colonnes de la base de données.
+    `connection` peut être une connexion ou un pool de connexions.
+    Le catalogue est partagé par le processus : il n'est relu que si le schéma a changé.
     """
-    schema_string = ""
     try:
-        cursor = connection.cursor()
-        cursor.execute("SHOW TABLES")
-        tables = [table[0] for table in cursor.fetchall()]
-
-        for table_name in tables:
-            schema_string += f"Table: {table_name}\n"
-            cursor.execute(f"SHOW COLUMNS FROM `{table_name}`")
-            columns = cursor.fetchall()
-            for column in columns:
-                schema_string += f"  - {column[0]} ({column[1]})\n"
-            schema_string += "\n"
-
-        cursor.close()
+        with metrics.span("schema_load"):
+            return get_schema_catalog(connection).to_prompt()
     except Error as e:
         print(f"Erreur lors de la récupération du schéma: {e}")
         return ""
 
-    return schema_string
-
 
 # --- Logique de l'agent ---
-def generate_sql_query(user_question, db_schema, groq_client):
-    """
-    Génère une requête SQL à partir d'une question utilisateur et du schéma de la BDD.
+def build_sql_prompt(user_question, db_schema, rules_mode=None):
     """
-    # Crée une chaîne de caractères à partir de la documentation des tables
-    table_docs_str = "\n".join([
-        f"Table '{table_name}': {doc}" for table_name, doc in table_documentation.items()
-    ])
+    Construit le prompt système de génération SQL.
 
-    system_prompt = f"""
+    Args:
+        rules_mode (str): 'retrieval' (règles pertinentes seulement) ou 'full' (les 36 règles).
+            Par défaut, la variable d'environnement SQL_RULES_MODE ('retrieval').
+    """
+    rules_mode = rules_mode or os.getenv("SQL_RULES_MODE", "retrieval")
+    # Ne garde que les tables (et leur documentation) utiles à la question, dont celles
+    # qu'imposent les règles déclenchées.
+    required_tables, excluded_tables = rule_matcher.tables(user_question)
+    schema_str, table_docs_str, _ = build_schema_context(
+        user_question, db_schema, table_documentation, required_tables, excluded_tables,
+    )
+    rules_str = agent_rules if rules_mode == "full" else rule_matcher.render(user_question)
+
+    return f"""
     Your task is to act as an expert MySQL query generator.
     Your output MUST BE the raw, executable MySQL query ONLY. I repeat: ONLY the SQL query.
     DO NOT include any text, explanations, comments, or markdown formatting.
     
     Database Schema:
-    {db_schema}
+    {schema_str}
 
     Table Documentation:
     {table_docs_str}
 
     Strict Rules for Query Generation:
-    {agent_rules}
+    {rules_str}
 
     Example of the expected output format:
     ---
@@ -247,21 +288,62 @@ def generate_sql_query(user_question, db_schema, groq_client):
     Question: {user_question}
     SQL Query:
     """
-    
+
+
+def _lookup_sql_query(user_question, db_schema, rules_mode, use_cache, use_templates):
+    """
+    Cherche une requête sans appeler le LLM (modèle local, puis cache).
+
+    Returns:
+        tuple: (requête trouvée ou None, clé de cache à utiliser pour la réponse du LLM)
+    """
+    if use_templates and os.getenv("SQL_TEMPLATES", "1") != "0":
+        template_name, template_query = match_template(user_question)
+        # Part du chemin rapide : `sql_template_total{template="none"}` pour les questions envoyées au LLM.
+        metrics.inc("sql_template_total", template=template_name or "none")
+        if template_query:
+            return template_query, None
+
+    cache_key = SQLQueryCache.make_key(user_question, fingerprint(db_schema), RULES_VERSION + rules_mode)
+    if use_cache:
+        cached_query = sql_query_cache.get(cache_key)
+        if cached_query is not None:
+            return cached_query, cache_key
+    return None, cache_key
+
+
+def generate_sql_query(user_question, db_schema, groq_client, rules_mode=None, use_cache=True, use_templates=True):
+    """
+    Génère une requête SQL à partir d'une question utilisateur et du schéma de la BDD.
+    Les intentions connues (écoulement, rotation, managers...) sont traduites localement
+    par un modèle de requête, sans appel au LLM ; les questions déjà posées (même schéma,
+    mêmes règles) sont servies depuis le cache.
+    """
+    rules_mode = rules_mode or os.getenv("SQL_RULES_MODE", "retrieval")
+    known_query, cache_key = _lookup_sql_query(user_question, db_schema, rules_mode, use_cache, use_templates)
+    if known_query is not None:
+        return known_query
+
+    with metrics.span("prompt_build"):
+        system_prompt = build_sql_prompt(user_question, db_schema, rules_mode)
+
     try:
-        chat_completion = groq_client.chat.completions.create(
+        raw_query = gateway.complete(
+            groq_client,
+            purpose="sql",
             messages=[
                 {"role": "system", "content": system_prompt},
             ],
-            model="llama-3.1-8b-instant",
             temperature=0,
             max_tokens=500
         )
         # Récupération de la réponse brute
-        raw_query = chat_completion.choices[0].message.content.strip()
+        raw_query = raw_query.strip()
 
         # Nettoyage de la requête pour supprimer le formatage indésirable
         cleaned_query = re.sub(r'```sql|```', '', raw_query).strip()
+        if cleaned_query:
+            sql_query_cache.put(cache_key, cleaned_query)
         return cleaned_query
 
     except Exception as e:
@@ -269,36 +351,215 @@ def generate_sql_query(user_question, db_schema, groq_client):
         return None
 
 
-def execute_sql_query(connection, query):
-    """Exécute une requête SQL et renvoie les résultats."""
-    results = None
+def generate_sql_query_stream(user_question, db_schema, groq_client, rules_mode=None, use_cache=True, use_templates=True):
+    """
+    Variante en streaming de `generate_sql_query` : produit le texte SQL au fur et à mesure.
+
+    Les balises Markdown sont retirées à la volée. Une requête issue d'un modèle local
+    ou du cache est produite en un seul morceau. En cas d'erreur, le générateur s'arrête.
+
+    Yields:
+        str: Morceaux successifs de la requête SQL.
+    """
+    rules_mode = rules_mode or os.getenv("SQL_RULES_MODE", "retrieval")
+    known_query, cache_key = _lookup_sql_query(user_question, db_schema, rules_mode, use_cache, use_templates)
+    if known_query is not None:
+        yield known_query
+        return
+
+    with metrics.span("prompt_build"):
+        system_prompt = build_sql_prompt(user_question, db_schema, rules_mode)
+    stripper = FenceStripper()
+    raw_query = ""
     try:
-        cursor = connection.cursor(dictionary=True)
-        cursor.execute(query)
-        results = cursor.fetchall()
-        cursor.close()
-    except Error as e:
-        print(f"Erreur lors de l'exécution de la requête: {e}")
-    
+        stream = gateway.stream(
+            groq_client,
+            purpose="sql",
+            messages=[
+                {"role": "system", "content": system_prompt},
+            ],
+            temperature=0,
+            max_tokens=500
+        )
+        for content in stream:
+            raw_query += content
+            text = stripper.feed(content)
+            if text:
+                yield text
+        text = stripper.flush()
+        if text:
+            yield text
+
+    except Exception as e:
+        print(f"Erreur lors de la génération de la requête SQL: {e}")
+        return
+
+    cleaned_query = re.sub(r'```sql|```', '', raw_query).strip()
+    if cleaned_query:
+        sql_query_cache.put(cache_key, cleaned_query)
+
+
+def execute_sql_dataframe(connection, query, max_rows=None, batch_size=None, on_batch=None, handle=None):
+    """
+    Exécute une requête SQL et renvoie les résultats sous forme de DataFrame (connexion ou pool).
+
+    Les lignes sont lues par lots (`fetchmany`) et converties au fil de l'eau en colonnes
+    typées, sans dictionnaire intermédiaire par ligne. Le même DataFrame sert au tableau
+    des résultats et au graphique ; il est partagé via `result_cache` et ne doit pas être
+    modifié par l'appelant.
+
+    Args:
+        max_rows (int): Nombre maximal de lignes lues (SQL_MAX_ROWS) ; au-delà, le DataFrame
+            porte `df.attrs["truncated"] = True`.
+        batch_size (int): Taille des lots (SQL_FETCH_BATCH).
+        on_batch (callable): Appelée avec (colonnes, lignes) à chaque lot reçu, par exemple
+            pour afficher les lignes sans attendre la fin de la requête.
+        handle (QueryHandle): Permet d'annuler la requête depuis un autre thread.
+
+    La requête passe d'abord par `sql_guard` (lecture seule, LIMIT, EXPLAIN,
+    MAX_EXECUTION_TIME) ; ses avertissements sont dans `df.attrs["warnings"]`, et
+    `df.attrs["limited"]` indique qu'un LIMIT (automatique, ou atteint) a pu écarter des lignes. Chaque appel
+    est ajouté au journal de charge (`workload`, SQL_WORKLOAD_LOG). Avec SQL_ENGINE=replica,
+    la requête s'exécute sur la réplique locale (`df.attrs["engine"] == "replica"`).
+
+    Returns:
+        DataFrame: Les résultats, ou None en cas d'erreur.
+
+    Raises:
+        QueryRejectedError: Requête refusée par le garde-fou.
+        QueryCancelledError: Requête annulée ou interrompue après SQL_MAX_EXECUTION_MS.
+    """
+    max_rows = max_rows or int(os.getenv("SQL_MAX_ROWS", "200000"))
+    batch_size = batch_size or int(os.getenv("SQL_FETCH_BATCH", "5000"))
+    with workload.capture(query) as captured:
+        try:
+            # Réplique locale (SQL_ENGINE=replica) ; MySQL si elle ne sait pas exécuter la requête.
+            # Avant tout emprunt : une requête servie par la réplique ne sollicite pas MySQL (ni
+            # connexion du pool, ni versions des tables pour le cache de résultats), et le
+            # rafraîchissement en arrière-plan dispose de toutes les connexions libres.
+            replica.ensure_fresh(connection)
+            if replica.ready:
+                replica_results = _execute_on_replica(query, max_rows, captured)
+                if replica_results is not None:
+                    if on_batch:
+                        on_batch(list(replica_results.columns), list(replica_results.itertuples(index=False, name=None)))
+                    # Pas de mise en cache : le cache n'est invalidé que par les écritures sur
+                    # MySQL, et servirait ce résultat (déjà en retard) après les rafraîchissements.
+                    captured["rows"] = len(replica_results)
+                    return replica_results
+            with borrow(connection) as conn:
+                cached_results = result_cache.get(conn, query)
+                if cached_results is not None:
+                    captured.update(cached=True, rows=len(cached_results))
+                    if on_batch:
+                        on_batch(list(cached_results.columns), list(cached_results.itertuples(index=False, name=None)))
+                    return cached_results
+                with metrics.span("sql_guard"):
+                    guarded_query, warnings, limited = sql_guard.prepare(conn, query)
+                captured["executed_sql"] = guarded_query
+                if handle:
+                    handle.attach(conn)
+                try:
+                    with metrics.span("sql_execute"):
+                        cursor = conn.cursor()
+                        cursor.execute(guarded_query)
+                        if cursor.description is None:
+                            # Requête sans jeu de résultats.
+                            cursor.close()
+                            captured["rows"] = 0
+                            return pd.DataFrame()
+                        builder = ColumnarBuilder(cursor.description)
+                        truncated = False
+                        # Une ligne de plus que la limite : pour savoir si le résultat est tronqué.
+                        for rows in iter_row_batches(cursor, batch_size, max_rows + 1):
+                            if builder.row_count + len(rows) > max_rows:
+                                rows = rows[:max_rows - builder.row_count]
+                                truncated = True
+                            builder.add(rows)
+                            if on_batch and rows:
+                                on_batch(builder.columns, rows)
+                        if truncated:
+                            # Les lignes non lues doivent être consommées avant de rendre la connexion.
+                            conn.consume_results()
+                        cursor.close()
+                except Error as e:
+                    if e.errno == ER_QUERY_TIMEOUT:
+                        raise QueryCancelledError(
+                            f"Requête interrompue : durée maximale d'exécution dépassée ({sql_guard.max_execution_ms} ms)."
+                        ) from e
+                    if e.errno == ER_QUERY_INTERRUPTED:
+                        raise QueryCancelledError("Requête annulée.") from e
+                    raise
+                finally:
+                    if handle:
+                        handle.detach()
+            started = time.perf_counter()
+            results = builder.to_dataframe()
+            # Conversion des lots (pendant la lecture) et assemblage final du DataFrame.
+            metrics.observe("stage_seconds", builder.build_seconds + time.perf_counter() - started, stage="dataframe_build", status="ok")
+            results.attrs["truncated"] = truncated
+            results.attrs["warnings"] = warnings
+            results.attrs["limited"] = limited or reaches_limit(guarded_query, len(results))
+            result_cache.put(query, results)
+            captured["rows"] = len(results)
+            return results
+        except Error as e:
+            captured.update(status="error", error=f"{type(e).__name__} {e.errno}")
+            print(f"Erreur lors de l'exécution de la requête: {e}")
+            return None
+
+
+def _execute_on_replica(query, max_rows, captured):
+    """Exécute la requête sur la réplique ; None si elle doit repartir vers MySQL."""
+    with metrics.span("sql_guard"):
+        guarded_query, warnings, limited = sql_guard.prepare(None, query, explain=False)
+    try:
+        with metrics.span("sql_execute", engine="replica"):
+            results = replica.execute(guarded_query, max_rows)
+    except ReplicaError as e:
+        metrics.inc("replica_fallback_total", reason=type(e).__name__)
+        print(f"Requête exécutée sur MySQL ({e})")
+        return None
+    captured.update(engine="replica", executed_sql=guarded_query)
+    results.attrs["warnings"] = warnings
+    results.attrs["limited"] = limited or reaches_limit(guarded_query, len(results))
     return results
 
 
+def execute_sql_query(connection, query):
+    """
+    Exécute une requête SQL et renvoie les résultats (connexion ou pool).
+    Variante de `execute_sql_dataframe` sous forme de liste de dictionnaires.
+    """
+    results = execute_sql_dataframe(connection, query)
+    return None if results is None else results.to_dict("records")
+
+
+def markdown_header(column_names):
+    """En-tête d'un tableau Markdown."""
+    return "\n".join([" | ".join(map(str, column_names)), " | ".join(["---"] * len(column_names))])
+
+
+def markdown_rows(rows):
+    """Lignes (tuples) d'un tableau Markdown."""
+    return "\n".join(" | ".join(str(value) for value in row) for row in rows)
+
+
 def format_results_markdown(results):
     """
-    Formate les résultats d'une requête SQL en un tableau Markdown.
+    Formate les résultats d'une requête SQL (DataFrame ou liste de dictionnaires) en un tableau Markdown.
     """
-    if not results:
+    if results is None or len(results) == 0:
         return "**Aucun résultat trouvé.**"
-    
-    column_names = list(results[0].keys())
-    header = " | ".join(column_names)
-    divider = " | ".join(["---"] * len(column_names))
-    
-    table_rows = [header, divider]
-    for row in results:
-        table_rows.append(" | ".join([str(row[col]) for col in column_names]))
-    
-    return "\n".join(table_rows)
+
+    if isinstance(results, pd.DataFrame):
+        column_names = list(results.columns)
+        rows = results.itertuples(index=False, name=None)
+    else:
+        column_names = list(results[0].keys())
+        rows = ([row[col] for col in column_names] for row in results)
+
+    return markdown_header(column_names) + "\n" + markdown_rows(rows)
 
 def generate_example_questions(db_schema, groq_client):
     """
@@ -322,17 +583,18 @@ def generate_example_questions(db_schema, groq_client):
     """
     
     try:
-        chat_completion = groq_client.chat.completions.create(
+        generated_text = gateway.complete(
+            groq_client,
             messages=[
                 {"role": "system", "content": system_prompt},
             ],
-            model="llama-3.1-8b-instant",
             temperature=0.8,
+            purpose="examples",
             max_tokens=500
         )
         
         # Le résultat est une chaîne de caractères, nous la divisons en une liste de questions
-        generated_text = chat_completion.choices[0].message.content.strip()
+        generated_text = generated_text.strip()
         questions = [q.strip() for q in generated_text.split('\n') if q.strip()]
         return questions
         
@@ -361,17 +623,18 @@ def translate_questions(questions_list, target_language, groq_client):
     """
     
     try:
-        chat_completion = groq_client.chat.completions.create(
+        generated_text = gateway.complete(
+            groq_client,
             messages=[
                 {"role": "system", "content": system_prompt},
             ],
-            model="llama-3.1-8b-instant",
             temperature=0.2,
+            purpose="translate",
             max_tokens=500
         )
         
         # Le résultat est une chaîne de caractères, nous la divisons en une liste de questions
-        generated_text = chat_completion.choices[0].message.content.strip()
+        generated_text = generated_text.strip()
         translated_questions = [q.strip() for q in generated_text.split('\n') if q.strip()]
         return translated_questions
         
@@ -396,6 +659,8 @@ def main():
         return
     
     groq_client = setup_groq_client()
+    # Requêtes de cette exécution regroupées sous une même session dans le journal de charge.
+    set_session(uuid.uuid4().hex[:12], "cli")
 
     # 2. Récupération du schéma de la BDD
     db_schema = get_database_schema(connection)
@@ -416,18 +681,36 @@ def main():
         if sql_query:
             print(f"\nRequête SQL générée :\n```sql\n{sql_query}\n```")
             
-            # 5. Exécution de la requête
-            query_results = execute_sql_query(connection, sql_query)
-            
-            # 6. Affichage des résultats en Markdown
-            if query_results:
-                markdown_output = format_results_markdown(query_results)
-                print("\nRésultats de la base de données :\n")
-                print(markdown_output)
+            # 5. Exécution de la requête, 6. affichage des lignes en Markdown au fil des lots
+            header_printed = False
+
+            def print_batch(column_names, rows):
+                nonlocal header_printed
+                if not header_printed:
+                    print("\nRésultats de la base de données :\n")
+                    print(markdown_header(column_names))
+                    header_printed = True
+                print(markdown_rows(rows))
+
+            try:
+                query_results = execute_sql_dataframe(connection, sql_query, on_batch=print_batch)
+            except QueryGuardError as e:
+                print(f"\n{e}")
+                continue
+            if query_results is not None:
+                for warning in query_results.attrs.get("warnings", []):
+                    print(f"\nAttention : {warning}")
+
+            if query_results is not None and not query_results.empty:
+                if query_results.attrs.get("truncated"):
+                    print(f"\n(Résultats limités aux {len(query_results)} premières lignes.)")
 
                 # 7. Appel du module de visualisation
-                chart_path = generate_visualization(user_question, query_results, groq_client)
-                if chart_path:
+                chart_image = generate_visualization(user_question, query_results, groq_client, backend="matplotlib")
+                if chart_image:
+                    chart_path = "chart.png"
+                    with open(chart_path, "wb") as chart_file:
+                        chart_file.write(chart_image)
                     print(f"\nUn graphique a été créé pour ces résultats. Fichier : {chart_path}")
                 else:
                     print("\nImpossible de créer un graphique avec ces données.")
@@ -0,0 +1,288 @@
+# sql_guard.py
+
+# Garde-fou avant exécution : le SQL produit par le LLM est contrôlé (lecture seule),
+# borné (LIMIT, MAX_EXECUTION_TIME) et estimé (EXPLAIN) avant d'atteindre la base.
+
+# Importations
+import os
+import re
+import threading
+
+from agent.sql_utils import _top_level_keyword, split_top_level
+
+READ_ONLY_KEYWORDS = ("SELECT", "WITH", "SHOW", "DESCRIBE", "DESC", "EXPLAIN")
+# Un WITH peut précéder une écriture (WITH ... DELETE FROM ...) : ces mots-clés sont
+# refusés au niveau principal, sauf en appel de fonction (REPLACE(...), INSERT(...)).
+WRITE_KEYWORDS = ("INSERT", "UPDATE", "DELETE", "REPLACE")
+AGGREGATE_CALL = re.compile(
+    r"\b(SUM|COUNT|AVG|MIN|MAX|GROUP_CONCAT|JSON_ARRAYAGG|JSON_OBJECTAGG|STDDEV(_POP|_SAMP)?|STD|VAR_POP|VAR_SAMP|VARIANCE|BIT_AND|BIT_OR|BIT_XOR)\s*\(",
+    re.IGNORECASE,
+)
+FORBIDDEN_CLAUSES = re.compile(r"\bINTO\s+(OUTFILE|DUMPFILE|@)|\bFOR\s+(UPDATE|SHARE)\b|\bLOCK\s+IN\s+SHARE\s+MODE\b", re.IGNORECASE)
+
+# Codes d'erreur MySQL d'une requête interrompue : KILL QUERY et MAX_EXECUTION_TIME.
+ER_QUERY_INTERRUPTED = 1317
+ER_QUERY_TIMEOUT = 3024
+
+
+class QueryGuardError(Exception):
+    """Requête refusée ou interrompue par le garde-fou ; le message peut être affiché tel quel."""
+
+
+class QueryRejectedError(QueryGuardError):
+    """Requête refusée avant exécution."""
+
+
+class QueryCancelledError(QueryGuardError):
+    """Requête interrompue pendant son exécution (annulation ou délai dépassé)."""
+
+
+def strip_comments(sql):
+    """
+    Retire les commentaires (--, #, /* */) hors chaînes littérales ; les indications
+    d'optimiseur /*+ ... */ sont conservées.
+    """
+    result, quote, index = [], None, 0
+    while index < len(sql):
+        char = sql[index]
+        if quote:
+            result.append(char)
+            if char == "\\" and quote != "`" and index + 1 < len(sql):
+                result.append(sql[index + 1])
+                index += 2
+                continue
+            if char == quote:
+                quote = None
+        elif char in ("'", '"', "`"):
+            quote = char
+            result.append(char)
+        elif char == "#" or (sql.startswith("--", index) and (index + 2 == len(sql) or sql[index + 2].isspace())):
+            end = sql.find("\n", index)
+            index = len(sql) if end < 0 else end
+            continue
+        elif sql.startswith("/*", index) and not sql.startswith("/*+", index):
+            end = sql.find("*/", index + 2)
+            result.append(" ")
+            index = len(sql) if end < 0 else end + 2
+            continue
+        else:
+            result.append(char)
+        index += 1
+    return "".join(result).strip()
+
+
+def statements(sql):
+    """Instructions SQL non vides (séparées par des « ; » hors chaînes)."""
+    return [part.strip() for part in split_top_level(sql, ";") if part.strip()]
+
+
+def _has_statement_keyword(statement, keyword):
+    position = _top_level_keyword(statement, keyword)
+    while position >= 0:
+        if not statement[position + len(keyword):].lstrip().startswith("("):
+            return True
+        position = _top_level_keyword(statement, keyword, position + len(keyword))
+    return False
+
+
+def check_read_only(sql):
+    """
+    Lève QueryRejectedError si `sql` n'est pas une unique instruction de lecture.
+
+    Returns:
+        tuple: (instruction à exécuter, sans « ; » final ; premier mot-clé en majuscules)
+    """
+    parts = statements(strip_comments(sql))
+    if len(parts) != 1:
+        raise QueryRejectedError("Une seule instruction SQL est autorisée par question.")
+    statement = parts[0]
+    first_word = statement.split(None, 1)[0].upper()
+    if first_word not in READ_ONLY_KEYWORDS:
+        raise QueryRejectedError(f"Seules les requêtes de lecture sont autorisées (instruction « {first_word} »).")
+    for keyword in WRITE_KEYWORDS:
+        if _has_statement_keyword(statement, keyword):
+            raise QueryRejectedError(f"Seules les requêtes de lecture sont autorisées (mot-clé « {keyword} »).")
+    if FORBIDDEN_CLAUSES.search(statement):
+        raise QueryRejectedError("Les clauses d'écriture ou de verrouillage (INTO OUTFILE, FOR UPDATE...) sont interdites.")
+    # Le texte exécuté est celui qui a été contrôlé : un commentaire final ne peut ni garder le
+    # « ; » ni recevoir le LIMIT ajouté ensuite.
+    return statement, first_word
+
+
+def is_single_row_aggregate(statement):
+    """SELECT principal sans GROUP BY ni UNION dont toutes les colonnes sont des agrégats (une seule ligne)."""
+    select_at = _top_level_keyword(statement, "SELECT")
+    if select_at < 0 or _top_level_keyword(statement, "GROUP") >= 0 or _top_level_keyword(statement, "UNION") >= 0:
+        return False
+    from_at = _top_level_keyword(statement, "FROM", select_at)
+    select_list = statement[select_at + len("SELECT"):from_at if from_at >= 0 else len(statement)]
+    select_list = re.sub(r"/\*.*?\*/", " ", select_list, flags=re.DOTALL)
+    items = [item for item in split_top_level(select_list) if item.strip()]
+    return bool(items) and all(
+        AGGREGATE_CALL.search(item) and not re.search(r"\bOVER\b", item, re.IGNORECASE) for item in items
+    )
+
+
+def ensure_limit(statement, limit):
+    """Ajoute `LIMIT limit` à un SELECT qui n'a pas de LIMIT au niveau principal."""
+    if not limit or _top_level_keyword(statement, "LIMIT") >= 0:
+        return statement, False
+    return f"{statement}\nLIMIT {int(limit)}", True
+
+
+def reaches_limit(statement, row_count):
+    """
+    Vrai si le LIMIT principal de la requête a pu écarter des lignes : `row_count` atteint
+    la limite, ou un OFFSET saute les premières lignes.
+    """
+    position = _top_level_keyword(statement, "LIMIT")
+    if position < 0:
+        return False
+    match = re.match(r"LIMIT\s+(\d+)(?:\s*,\s*(\d+)|\s+OFFSET\s+(\d+))?", statement[position:], re.IGNORECASE)
+    if not match:
+        # LIMIT paramétré ou calculé : la limite n'est pas connue.
+        return True
+    if match.group(2) is not None:
+        offset, count = int(match.group(1)), int(match.group(2))
+    else:
+        offset, count = int(match.group(3) or 0), int(match.group(1))
+    return offset > 0 or row_count >= count
+
+
+def add_execution_time_hint(statement, milliseconds):
+    """Ajoute l'indication d'optimiseur MAX_EXECUTION_TIME au SELECT principal."""
+    if not milliseconds or "MAX_EXECUTION_TIME" in statement.upper():
+        return statement
+    # Pour un WITH, le SELECT principal est le premier hors parenthèses.
+    position = _top_level_keyword(statement, "SELECT")
+    if position < 0:
+        return statement
+    position += len("SELECT")
+    return f"{statement[:position]} /*+ MAX_EXECUTION_TIME({int(milliseconds)}) */{statement[position:]}"
+
+
+def estimate_rows(connection, statement):
+    """
+    Nombre de lignes examinées estimé par EXPLAIN.
+
+    Pour chaque bloc SELECT, les estimations des tables jointes se multiplient (boucles
+    imbriquées) : une jointure sans prédicat apparaît comme un produit cartésien.
+    """
+    cursor = connection.cursor()
+    cursor.execute(f"EXPLAIN {statement}")
+    columns = [description[0] for description in cursor.description]
+    rows = cursor.fetchall()
+    cursor.close()
+    select_id, estimate = columns.index("id"), columns.index("rows")
+    per_block = {}
+    for row in rows:
+        per_block[row[select_id]] = per_block.get(row[select_id], 1) * int(row[estimate] or 1)
+    return sum(per_block.values())
+
+
+class SQLGuard:
+    """
+    Contrôle et borne une requête avant son exécution.
+
+    Args:
+        enabled (bool): Active le garde-fou (SQL_GUARD).
+        auto_limit (int): LIMIT ajouté aux SELECT qui n'en ont pas (SQL_AUTO_LIMIT, 0 = aucun).
+        max_execution_ms (int): Durée maximale d'exécution côté serveur (SQL_MAX_EXECUTION_MS).
+        warn_rows (int): Estimation EXPLAIN au-delà de laquelle un avertissement est émis.
+        max_rows (int): Estimation EXPLAIN au-delà de laquelle la requête est refusée.
+    """
+
+    def __init__(self, enabled=True, auto_limit=1000, max_execution_ms=30000, warn_rows=500_000, max_rows=20_000_000):
+        self.enabled = enabled
+        self.auto_limit = auto_limit
+        self.max_execution_ms = max_execution_ms
+        self.warn_rows = warn_rows
+        self.max_rows = max_rows
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            enabled=os.getenv("SQL_GUARD", "1") != "0",
+            auto_limit=int(os.getenv("SQL_AUTO_LIMIT", "1000")),
+            max_execution_ms=int(os.getenv("SQL_MAX_EXECUTION_MS", "30000")),
+            warn_rows=int(os.getenv("SQL_GUARD_WARN_ROWS", "500000")),
+            max_rows=int(os.getenv("SQL_GUARD_MAX_ROWS", "20000000")),
+        )
+
+    def prepare(self, connection, query, explain=True):
+        """
+        Vérifie la requête et renvoie la version à exécuter.
+
+        Sans `explain` (requête exécutée ailleurs que sur MySQL, voir replica), l'estimation
+        EXPLAIN est omise et `connection` n'est pas utilisée.
+
+        Returns:
+            tuple: (requête bornée, liste d'avertissements, `limited` : vrai si le LIMIT
+            automatique a été ajouté et peut écarter des lignes)
+
+        Raises:
+            QueryRejectedError: Requête d'écriture, multiple, ou trop coûteuse selon EXPLAIN.
+        """
+        if not self.enabled:
+            return query, [], False
+        statement, first_word = check_read_only(query)
+        warnings = []
+        if first_word not in ("SELECT", "WITH"):
+            return statement, warnings, False
+
+        statement, limited = ensure_limit(statement, self.auto_limit)
+        # Un agrégat sans GROUP BY ne renvoie qu'une ligne : le LIMIT ajouté ne change rien.
+        limited = limited and not is_single_row_aggregate(statement)
+        if limited:
+            warnings.append(f"La requête n'avait pas de LIMIT : résultats limités à {self.auto_limit} lignes.")
+
+        if explain and (self.warn_rows or self.max_rows):
+            rows = estimate_rows(connection, statement)
+            if self.max_rows and rows > self.max_rows:
+                raise QueryRejectedError(
+                    f"Requête refusée : environ {rows:,} lignes à examiner selon EXPLAIN "
+                    f"(limite {self.max_rows:,}). Une condition de jointure manque peut-être."
+                )
+            if self.warn_rows and rows > self.warn_rows:
+                warnings.append(f"Requête coûteuse : environ {rows:,} lignes à examiner selon EXPLAIN.")
+
+        return add_execution_time_hint(statement, self.max_execution_ms), warnings, limited
+
+
+class QueryHandle:
+    """
+    Permet d'annuler depuis un autre thread la requête en cours d'une question.
+
+    La fonction d'exécution y enregistre l'identifiant de sa connexion MySQL ; `cancel`
+    envoie alors un KILL QUERY via le pool.
+    """
+
+    def __init__(self, pool=None):
+        self.pool = pool
+        self.cancelled = False
+        self._connection_id = None
+        self._lock = threading.Lock()
+
+    def attach(self, connection):
+        with self._lock:
+            self._connection_id = connection.connection_id
+            cancelled = self.cancelled
+        if cancelled:
+            raise QueryCancelledError("Requête annulée.")
+
+    def detach(self):
+        # Même verrou que `cancel` : la connexion ne retourne au pool (et à une autre session)
+        # qu'une fois un KILL QUERY en cours terminé.
+        with self._lock:
+            self._connection_id = None
+
+    def cancel(self):
+        """Interrompt la requête en cours (sans effet si aucune requête n'est en cours)."""
+        with self._lock:
+            self.cancelled = True
+            connection_id = self._connection_id
+            if connection_id is not None and self.pool is not None and hasattr(self.pool, "kill_query"):
+                try:
+                    self.pool.kill_query(connection_id)
+                except Exception as e:
+                    print(f"Impossible d'annuler la requête : {e}")
@@ -0,0 +1,104 @@
+# sql_utils.py
+
+# Importations
+import re
+
+_IDENTIFIER = r"`[^`]+`|\w+"
+
+
+def split_top_level(text, separator=","):
+    """Découpe `text` sur `separator` en ignorant les parenthèses et les chaînes littérales."""
+    parts, depth, quote, current = [], 0, None, []
+    for char in text:
+        if quote:
+            if char == quote:
+                quote = None
+        elif char in ("'", '"', "`"):
+            quote = char
+        elif char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        elif char == separator and depth == 0:
+            parts.append("".join(current))
+            current = []
+            continue
+        current.append(char)
+    parts.append("".join(current))
+    return parts
+
+
+def _top_level_keyword(sql, keyword, start=0):
+    """Position du mot-clé `keyword` au niveau 0 de parenthèses (hors chaînes), ou -1."""
+    depth, quote = 0, None
+    pattern = re.compile(rf"\b{keyword}\b", re.IGNORECASE)
+    index = start
+    while index < len(sql):
+        char = sql[index]
+        if quote:
+            if char == quote:
+                quote = None
+        elif char in ("'", '"', "`"):
+            quote = char
+        elif char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        elif depth == 0 and pattern.match(sql, index) and (index == 0 or not (sql[index - 1].isalnum() or sql[index - 1] == "_")):
+            return index
+        index += 1
+    return -1
+
+
+def _unquote(name):
+    return name[1:-1] if name.startswith("`") and name.endswith("`") else name
+
+
+def extract_select_columns(sql):
+    """
+    Noms des colonnes produites par la requête, déduits des alias du SELECT principal.
+
+    Returns:
+        list: Les noms de colonnes, ou None si la liste ne peut pas être déduite
+        (ex. `SELECT *`), auquel cas il faut interroger la base (voir `probe_columns`).
+    """
+    select_at = _top_level_keyword(sql, "SELECT")
+    if select_at < 0:
+        return None
+    from_at = _top_level_keyword(sql, "FROM", select_at)
+    select_list = sql[select_at + len("SELECT"):from_at if from_at >= 0 else len(sql)]
+    select_list = re.sub(r"/\*.*?\*/", " ", select_list, flags=re.DOTALL)
+    select_list = re.sub(r"^\s*(DISTINCT|ALL|SQL_NO_CACHE)\b", "", select_list, flags=re.IGNORECASE)
+
+    columns = []
+    for item in split_top_level(select_list):
+        item = item.strip().rstrip(";").strip()
+        if not item or item.endswith("*"):
+            return None
+        alias = re.search(rf"\bAS\s+({_IDENTIFIER}|'[^']+'|\"[^\"]+\")\s*$", item, re.IGNORECASE)
+        if alias:
+            columns.append(alias.group(1).strip("'\"`"))
+            continue
+        # Colonne simple, éventuellement préfixée : t.col, `t`.`col`
+        plain = re.fullmatch(rf"(?:(?:{_IDENTIFIER})\.)?({_IDENTIFIER})", item)
+        if plain:
+            columns.append(_unquote(plain.group(1)))
+            continue
+        # Alias implicite : expression suivie d'un identifiant (« SUM(x) total »)
+        implicit = re.search(rf"\)\s+({_IDENTIFIER})\s*$", item)
+        if implicit:
+            columns.append(_unquote(implicit.group(1)))
+            continue
+        # Expression sans alias : MySQL nomme la colonne d'après le texte de l'expression.
+        columns.append(item)
+    return columns
+
+
+def probe_columns(connection, sql):
+    """Noms des colonnes obtenus via une sonde `LIMIT 0` (aucune ligne n'est lue)."""
+    cursor = connection.cursor()
+    cursor.execute(f"SELECT * FROM ({sql.strip().rstrip(';')}) AS _probe LIMIT 0")
+    cursor.fetchall()
+    columns = [description[0] for description in cursor.description]
+    cursor.close()
+    return columns
@@ -0,0 +1,77 @@
+# streaming.py
+
+# Importations
+import re
+
+FENCE = "```"
+FENCE_LANGUAGE = "sql"
+
+
+class FenceStripper:
+    """
+    Retire les balises Markdown (```sql et ```) d'un texte reçu morceau par morceau.
+
+    Équivalent incrémental de `re.sub(r'```sql|```', '', texte).strip()` pour le début
+    du texte : les quelques caractères qui pourraient appartenir à une balise encore
+    incomplète sont retenus jusqu'au morceau suivant.
+    """
+
+    def __init__(self):
+        self._pending = ""
+        self._started = False
+
+    def _emit(self, text):
+        if not self._started:
+            text = text.lstrip()
+            self._started = bool(text)
+        return text
+
+    def feed(self, chunk):
+        """Ajoute un morceau et renvoie le texte nettoyé qui peut déjà être affiché."""
+        text = self._pending + chunk
+        self._pending = ""
+        output = []
+        while True:
+            position = text.find(FENCE)
+            if position < 0:
+                break
+            output.append(text[:position])
+            rest = text[position + len(FENCE):]
+            if len(rest) < len(FENCE_LANGUAGE) and FENCE_LANGUAGE.startswith(rest):
+                # « ```s » : impossible de savoir encore s'il s'agit de « ```sql ».
+                self._pending = FENCE + rest
+                return self._emit("".join(output))
+            if rest.startswith(FENCE_LANGUAGE):
+                rest = rest[len(FENCE_LANGUAGE):]
+            text = rest
+        # Un ou deux accents graves en fin de morceau peuvent commencer une balise.
+        held = len(text) - len(text.rstrip("`"))
+        if held:
+            self._pending = text[-held:]
+            text = text[:-held]
+        output.append(text)
+        return self._emit("".join(output))
+
+    def flush(self):
+        """Texte restant en fin de flux."""
+        text, self._pending = self._pending, ""
+        return self._emit(re.sub(r"```sql|```", "", text))
+
+
+def iter_stream_text(stream, on_usage=None):
+    """
+    Extrait le texte des morceaux d'une réponse en streaming (API compatible OpenAI/Groq).
+
+    `on_usage` reçoit le décompte de jetons s'il est fourni par le flux (dernier morceau :
+    `usage`, ou `x_groq.usage` chez Groq).
+    """
+    for chunk in stream:
+        if on_usage is not None:
+            usage = getattr(chunk, "usage", None) or getattr(getattr(chunk, "x_groq", None), "usage", None)
+            if usage is not None:
+                on_usage(usage)
+        if not chunk.choices:
+            continue
+        content = chunk.choices[0].delta.content
+        if content:
+            yield content
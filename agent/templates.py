@@ -0,0 +1,282 @@
+# templates.py
+
+# Importations
+import re
+from collections import namedtuple
+
+from agent.rules import normalize_text
+
+# Valeurs autorisées pour les paramètres : la requête n'est jamais construite avec le texte
+# brut de l'utilisateur, seulement avec ces littéraux connus de la base Classicmodels.
+COUNTRIES = {
+    "france": "France", "usa": "USA", "etats unis": "USA", "etats-unis": "USA", "united states": "USA",
+    "allemagne": "Germany", "germany": "Germany", "espagne": "Spain", "spain": "Spain",
+    "australie": "Australia", "australia": "Australia", "royaume uni": "UK", "royaume-uni": "UK", "uk": "UK",
+    "italie": "Italy", "italy": "Italy", "japon": "Japan", "japan": "Japan", "canada": "Canada",
+    "suisse": "Switzerland", "switzerland": "Switzerland", "belgique": "Belgium", "belgium": "Belgium",
+    "norvege": "Norway", "norway": "Norway", "suede": "Sweden", "sweden": "Sweden",
+    "danemark": "Denmark", "denmark": "Denmark", "finlande": "Finland", "finland": "Finland",
+    "autriche": "Austria", "austria": "Austria", "irlande": "Ireland", "ireland": "Ireland",
+    "singapour": "Singapore", "singapore": "Singapore", "nouvelle zelande": "New Zealand",
+    "nouvelle-zelande": "New Zealand", "new zealand": "New Zealand", "philippines": "Philippines",
+    "hong kong": "Hong Kong",
+}
+
+PRODUCT_LINES = {
+    "classic cars": "Classic Cars", "voitures classiques": "Classic Cars",
+    "vintage cars": "Vintage Cars", "voitures anciennes": "Vintage Cars", "voitures vintage": "Vintage Cars",
+    "motorcycles": "Motorcycles", "motos": "Motorcycles", "planes": "Planes", "avions": "Planes",
+    "ships": "Ships", "bateaux": "Ships", "navires": "Ships", "trains": "Trains",
+    "trucks and buses": "Trucks and Buses", "camions et bus": "Trucks and Buses", "camions": "Trucks and Buses",
+}
+
+# Mots sans incidence sur l'intention : tout autre mot restant après reconnaissance
+# de l'intention et des paramètres fait retomber sur le LLM.
+FILLER_WORDS = {
+    "le", "la", "les", "l", "un", "une", "des", "du", "de", "d", "et", "en", "par", "pour", "sur", "au", "aux",
+    "dans", "est", "sont", "quel", "quels", "quelle", "quelles", "qui", "que", "nos", "notre", "mes", "ma",
+    "donne", "donnez", "moi", "affiche", "afficher", "liste", "lister", "montre", "montrer", "calcule", "calculer",
+    "the", "a", "an", "of", "in", "for", "by", "what", "which", "who", "is", "are", "our", "show", "list",
+    "me", "give", "top", "premiers", "first", "total", "tous", "toutes", "all", "s", "y", "il", "t",
+    "avec", "with", "ont", "have", "has",
+}
+
+ASCENDING_PATTERN = re.compile(r"\b(moins|plus faibles?|plus bas|lowest|worst|bottom|least|pires?)\b")
+
+# `params` : paramètres que le modèle sait appliquer ; une question qui en précise un autre
+# (pays, année, gamme...) part vers le LLM plutôt que de recevoir une réponse non filtrée.
+Template = namedtuple("Template", ["name", "pattern", "vocabulary", "params", "build"])
+
+# Borne des requêtes de liste sans « top N » (quelques gammes, quelques managers) : le
+# garde-fou n'a pas à ajouter son LIMIT automatique ni à en avertir.
+LISTING_LIMIT = 100
+
+
+def _where(conditions):
+    return "WHERE\n    " + "\n    AND ".join(conditions) + "\n" if conditions else ""
+
+
+def _limit(params, default=10):
+    return f"LIMIT {params.get('top_n') or default};"
+
+
+def _order(params):
+    return "ASC" if params.get("ascending") else "DESC"
+
+
+def _ecoulement(params):
+    return (
+        "SELECT\n    productName,\n    taux_ecoulement_stock\n"
+        "FROM\n    ecoulement_stock\n"
+        f"ORDER BY\n    taux_ecoulement_stock {_order(params)}\n{_limit(params)}"
+    )
+
+
+def _rotation(params):
+    return (
+        "SELECT\n    p.productName,\n    rs.rotation\n"
+        "FROM\n    rotation_stock AS rs\n"
+        "JOIN\n    products AS p ON p.productCode = rs.productCode\n"
+        f"ORDER BY\n    rs.rotation {_order(params)}\n{_limit(params)}"
+    )
+
+
+def _managers(params):
+    return (
+        "SELECT\n    firstName,\n    lastName,\n    jobTitle\n"
+        "FROM\n    employees\n"
+        "WHERE\n    reportsTo IS NULL\n"
+        f"LIMIT {LISTING_LIMIT};"
+    )
+
+
+def _stock_value_purchase(params):
+    return (
+        "SELECT\n    vs.productLine,\n    SUM(vs.valeur_stock) AS valeur_stock\n"
+        "FROM\n    value_stock_quantity AS vs\n"
+        + _where([f"vs.productLine = '{params['product_line']}'"] if params.get("product_line") else [])
+        + "GROUP BY\n    vs.productLine\n"
+        f"ORDER BY\n    valeur_stock DESC\nLIMIT {LISTING_LIMIT};"
+    )
+
+
+def _stock_value_selling(aggregate):
+    alias = {"AVG": "average_price", "MAX": "max_price", "MIN": "min_price"}[aggregate]
+
+    def build(params):
+        return (
+            f"SELECT\n    p.productLine,\n    SUM(t1.{alias} * p.quantityInStock) AS valeur_stock\n"
+            f"FROM\n    (SELECT od.productCode, {aggregate}(od.priceEach) AS {alias}\n"
+            "     FROM orderdetails AS od\n     GROUP BY od.productCode) AS t1\n"
+            "JOIN\n    products AS p ON p.productCode = t1.productCode\n"
+            + _where([f"p.productLine = '{params['product_line']}'"] if params.get("product_line") else [])
+            + "GROUP BY\n    p.productLine\n"
+            f"ORDER BY\n    valeur_stock DESC\nLIMIT {LISTING_LIMIT};"
+        )
+    return build
+
+
+def _recouvrement(params):
+    conditions = [f"c.country = '{params['country']}'"] if params.get("country") else []
+    return (
+        "SELECT\n    c.customerName,\n    r.Taux_recouvrement\n"
+        "FROM\n    recouvrement AS r\n"
+        "JOIN\n    customers AS c ON c.customerNumber = r.customerNumber\n"
+        + _where(conditions)
+        + f"ORDER BY\n    r.Taux_recouvrement {_order(params)}\n{_limit(params)}"
+    )
+
+
+def _best_customers(params):
+    conditions = [f"c.country = '{params['country']}'"] if params.get("country") else []
+    return (
+        "SELECT\n    c.customerName,\n    c.country,\n    cc.chiffre_affaire_client\n"
+        "FROM\n    commande_client AS cc\n"
+        "JOIN\n    customers AS c ON c.customerNumber = cc.customerNumber\n"
+        + _where(conditions)
+        + f"ORDER BY\n    cc.chiffre_affaire_client {_order(params)}\n{_limit(params)}"
+    )
+
+
+def _turnover(params):
+    conditions = [f"YEAR(o.orderDate) = {params['year']}"] if params.get("year") else []
+    return (
+        "SELECT\n    SUM(od.quantityOrdered * od.priceEach) AS chiffre_affaire\n"
+        "FROM\n    orders AS o\n"
+        "JOIN\n    orderdetails AS od ON o.orderNumber = od.orderNumber\n"
+        + _where(conditions)
+        + "LIMIT 1;"
+    )
+
+
+def _top_products(params):
+    joins = "JOIN\n    products AS p ON p.productCode = od.productCode\n"
+    conditions = []
+    if params.get("year"):
+        joins += "JOIN\n    orders AS o ON o.orderNumber = od.orderNumber\n"
+        conditions.append(f"YEAR(o.orderDate) = {params['year']}")
+    if params.get("product_line"):
+        conditions.append(f"p.productLine = '{params['product_line']}'")
+    return (
+        "SELECT\n    p.productName,\n    SUM(od.quantityOrdered) AS quantite_vendue\n"
+        "FROM\n    orderdetails AS od\n"
+        + joins + _where(conditions)
+        + "GROUP BY\n    p.productName\n"
+        f"ORDER BY\n    quantite_vendue {_order(params)}\n{_limit(params)}"
+    )
+
+
+def _average_margin(params):
+    return (
+        "SELECT\n    productLine,\n    AVG(revenu_brut) AS marge_moyenne\n"
+        "FROM\n    marge_produit\n"
+        "GROUP BY\n    productLine\n"
+        f"ORDER BY\n    marge_moyenne DESC\nLIMIT {LISTING_LIMIT};"
+    )
+
+
+# Les requêtes de valeur du stock et de marge moyenne sont déjà regroupées par gamme.
+_PER_PRODUCT_LINE = {"ligne", "lignes", "produit", "produits", "gamme", "gammes", "product", "products", "line", "lines", "productline"}
+_STOCK_VALUE = r"valeur (du |de |de la )?stock|stock value|inventory value"
+
+# Ordre important : les intentions les plus spécifiques d'abord.
+TEMPLATES = [
+    Template("stock_value_avg_price", re.compile(rf"({_STOCK_VALUE}).*(prix de vente moyen|average (selling |sale )?price)"),
+             {"valeur", "stock", "prix", "vente", "moyen", "value", "average", "selling", "sale", "price", "inventory", "at", "au"} | _PER_PRODUCT_LINE,
+             {"product_line"}, _stock_value_selling("AVG")),
+    Template("stock_value_max_price", re.compile(rf"({_STOCK_VALUE}).*(prix de vente max(imal|imum)?|max(imum)? (selling |sale )?price)"),
+             {"valeur", "stock", "prix", "vente", "maximal", "maximum", "max", "value", "selling", "sale", "price", "inventory", "at", "au"} | _PER_PRODUCT_LINE,
+             {"product_line"}, _stock_value_selling("MAX")),
+    Template("stock_value_min_price", re.compile(rf"({_STOCK_VALUE}).*(prix de vente min(imal|imum)?|min(imum)? (selling |sale )?price)"),
+             {"valeur", "stock", "prix", "vente", "minimal", "minimum", "min", "value", "selling", "sale", "price", "inventory", "at", "au"} | _PER_PRODUCT_LINE,
+             {"product_line"}, _stock_value_selling("MIN")),
+    Template("stock_value_purchase_price", re.compile(rf"({_STOCK_VALUE}).*(prix d.?achat|purchase price|buy ?price)"),
+             {"valeur", "stock", "prix", "achat", "value", "purchase", "buy", "buyprice", "price", "inventory", "at", "au"} | _PER_PRODUCT_LINE,
+             {"product_line"}, _stock_value_purchase),
+    Template("ecoulement_stock", re.compile(r"(taux d.?)?ecoulement|sell.?through"),
+             {"taux", "ecoulement", "stock", "sell", "through", "rate", "produits", "meilleur", "meilleurs", "plus", "eleve", "highest"},
+             {"top_n", "ascending"}, _ecoulement),
+    Template("rotation_stock", re.compile(r"(taux de )?rotation"),
+             {"taux", "rotation", "stock", "rate", "produits", "meilleur", "meilleurs", "plus", "eleve", "highest"},
+             {"top_n", "ascending"}, _rotation),
+    Template("managers", re.compile(r"\bmanagers?\b"),
+             {"managers", "manager", "sont", "les", "who", "are", "the", "entreprise", "company"},
+             set(), _managers),
+    Template("recouvrement", re.compile(r"(taux de )?recouvrement|recovery rate|collection rate"),
+             {"taux", "recouvrement", "recovery", "collection", "rate", "client", "clients", "customer", "customers", "par", "per", "plus", "faible", "faibles", "bas"},
+             {"country", "top_n", "ascending"}, _recouvrement),
+    Template("average_margin_per_line", re.compile(r"marge moyenne|average margin"),
+             {"marge", "moyenne", "average", "margin", "per", "chaque"} | _PER_PRODUCT_LINE,
+             set(), _average_margin),
+    Template("best_customers", re.compile(r"meilleurs? clients?|best customers?|top (\d+ )?(clients?|customers?)"),
+             {"meilleurs", "meilleur", "clients", "client", "best", "customers", "customer", "plus", "rentables", "ca"},
+             {"country", "top_n", "ascending"}, _best_customers),
+    Template("top_products", re.compile(r"produits? (les )?plus vendus?|(best|top)[- ]selling products?|top (\d+ )?(produits|products)"),
+             {"produits", "produit", "plus", "vendus", "vendu", "best", "selling", "top", "products", "sold", "most"},
+             {"year", "product_line", "top_n", "ascending"}, _top_products),
+    Template("turnover", re.compile(r"chiffre d.?affaires?|\bca\b|turnover|revenue"),
+             {"chiffre", "affaire", "affaires", "ca", "turnover", "revenue", "total", "global"},
+             {"year"}, _turnover),
+]
+
+
+def _extract(pattern_map, question):
+    for phrase in sorted(pattern_map, key=len, reverse=True):
+        match = re.search(rf"\b{re.escape(phrase)}\b", question)
+        if match:
+            return pattern_map[phrase], question[:match.start()] + " " + question[match.end():]
+    return None, question
+
+
+def extract_parameters(question):
+    """
+    Paramètres reconnus dans une question normalisée.
+
+    Returns:
+        tuple: (dictionnaire des paramètres, question privée des passages reconnus)
+    """
+    params = {}
+    params["country"], question = _extract(COUNTRIES, question)
+    params["product_line"], question = _extract(PRODUCT_LINES, question)
+    if params["product_line"]:
+        question = re.sub(r"\b(gamme|ligne de produits?|product line)\b", " ", question)
+    year = re.search(r"\b(19|20)\d{2}\b", question)
+    if year:
+        params["year"] = int(year.group(0))
+        question = question.replace(year.group(0), " ")
+    top_n = re.search(r"\b(\d{1,3})\b", question)
+    if top_n:
+        params["top_n"] = int(top_n.group(1))
+        question = question.replace(top_n.group(0), " ", 1)
+    ascending = ASCENDING_PATTERN.search(question)
+    if ascending:
+        params["ascending"] = True
+        question = question[:ascending.start()] + " " + question[ascending.end():]
+    return params, question
+
+
+def match_template(user_question):
+    """
+    Cherche une intention connue et renvoie (nom du modèle, requête SQL), ou (None, None).
+
+    Une intention n'est retenue que si tous les mots de la question sont expliqués
+    (intention, paramètres ou mots vides) et si le modèle applique tous les paramètres
+    reconnus ; sinon la question part vers le LLM.
+    """
+    question = normalize_text(user_question).replace("'", " ").replace("’", " ")
+    params, remainder = extract_parameters(question)
+    # « Top 0 » : aucune ligne demandée, ce que LIMIT 10 par défaut trahirait.
+    if params.get("top_n") == 0:
+        return None, None
+    extracted = {name for name, value in params.items() if value is not None}
+    remainder_words = set(re.findall(r"[a-z0-9]+", remainder))
+    for template in TEMPLATES:
+        if not template.pattern.search(question):
+            continue
+        if remainder_words - FILLER_WORDS - template.vocabulary:
+            continue
+        if extracted - template.params:
+            # Filtre demandé que ce modèle ignorerait (« chiffre d'affaires en France »).
+            return None, None
+        return template.name, template.build(params)
+    return None, None
@@ -0,0 +1,154 @@
+# workload.py
+
+# Capture de la charge SQL réelle : chaque requête exécutée par l'agent (application,
+# CLI, batch) est ajoutée à un journal JSON lines (SQL_WORKLOAD_LOG) avec l'heure, la
+# session, la durée et le nombre de lignes. L'écriture se fait dans un thread dédié :
+# la requête ne paie qu'une mise en file. Le journal peut ensuite être rejoué contre
+# une base cible avec agent/replay.py.
+
+# Importations
+import atexit
+import contextvars
+import json
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+# Session courante (identifiant, origine) : posée par l'application, la CLI ou le batch, et
+# propagée aux threads du pipeline avec le contexte (contextvars.copy_context).
+_session = contextvars.ContextVar("workload_session", default=(None, None))
+
+
+def set_session(session_id, source):
+    """Associe les requêtes suivantes du contexte courant à la session `session_id`."""
+    return _session.set((session_id, source))
+
+
+@contextmanager
+def workload_session(session_id, source):
+    token = set_session(session_id, source)
+    try:
+        yield
+    finally:
+        _session.reset(token)
+
+
+def current_session():
+    return _session.get()
+
+
+class WorkloadRecorder:
+    """
+    Journal append-only des requêtes exécutées.
+
+    Args:
+        path (str): Fichier JSON lines ; None pour ne rien enregistrer.
+        max_queue (int): Entrées en attente d'écriture au-delà desquelles les nouvelles sont
+            abandonnées (comptées dans `dropped`) plutôt que de ralentir les requêtes.
+    """
+
+    def __init__(self, path=None, max_queue=10000):
+        self.path = path
+        self.enabled = bool(path)
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            path=os.getenv("SQL_WORKLOAD_LOG") or None,
+            max_queue=int(os.getenv("SQL_WORKLOAD_QUEUE", "10000")),
+        )
+
+    def _ensure_writer(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._write_loop, name="sqler-workload", daemon=True)
+                self._thread.start()
+
+    def _write_loop(self):
+        while True:
+            entries = [self._queue.get()]
+            # Tout ce qui est déjà en file part dans la même écriture.
+            while True:
+                try:
+                    entries.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = None in entries
+            lines = "".join(json.dumps(entry, ensure_ascii=False, default=str) + "\n" for entry in entries if entry is not None)
+            if lines:
+                try:
+                    with open(self.path, "a", encoding="utf-8") as log_file:
+                        log_file.write(lines)
+                except OSError as e:
+                    print(f"Impossible d'écrire le journal des requêtes dans {self.path} : {e}")
+            if stop:
+                return
+
+    def record(self, entry):
+        """Met une entrée en file d'écriture (ne bloque jamais)."""
+        if not self.enabled:
+            return
+        self._ensure_writer()
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            self.dropped += 1
+
+    @contextmanager
+    def capture(self, sql):
+        """
+        Enregistre la requête exécutée dans le bloc, avec sa durée.
+
+        Le bloc complète l'entrée produite : `rows`, `cached` (servie par le cache de
+        résultats), `engine` ('mysql' ou 'replica'), `executed_sql` (texte MySQL après le
+        garde-fou) et `status`.
+        Une exception donne le statut 'error' et son type.
+        """
+        entry = {"status": "ok", "rows": None, "cached": False, "engine": "mysql", "executed_sql": None, "error": None}
+        if not self.enabled:
+            yield entry
+            return
+        session_id, source = current_session()
+        entry.update(ts=time.time(), session=session_id, source=source, sql=sql)
+        start = time.perf_counter()
+        try:
+            yield entry
+        except BaseException as e:
+            entry.update(status="error", error=type(e).__name__)
+            raise
+        finally:
+            entry["duration"] = time.perf_counter() - start
+            self.record(entry)
+
+    def close(self):
+        """Écrit les entrées en attente et arrête le thread d'écriture."""
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join(timeout=5)
+        self._thread = None
+
+
+def read_workload(path):
+    """Entrées du journal, dans l'ordre ; une ligne tronquée par un arrêt brutal est ignorée."""
+    entries = []
+    with open(path, encoding="utf-8") as log_file:
+        for line in log_file:
+            try:
+                entries.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    return entries
+
+
+# Journal partagé par le processus, vidé à l'arrêt.
+workload = WorkloadRecorder.from_env()
+atexit.register(workload.close)
@@ -1,6 +1,8 @@
+import time
+import uuid
+
 import streamlit as st
 import pandas as pd
-import os
 from dotenv import load_dotenv
 import streamlit.components.v1 as components
 
@@ -11,13 +13,21 @@ st.markdown(
 )
 # Fonctions de l'agent SQL
 from agent.sql_agent import (
-    get_db_connection,
+    get_db_pool,
     setup_groq_client,
     get_database_schema,
-    generate_sql_query,
-    execute_sql_query,
+    generate_sql_query_stream,
     generate_visualization
 )
+from visualizer import CHART_BACKENDS, chart_backend
+from agent.followup import describe_operations, refine
+from agent.history import ConversationHistory, history_store
+from agent.pagination import ResultPager
+from agent.pipeline import StageTimer, execute_with_chart_config
+from agent.sql_guard import QueryGuardError, QueryHandle
+from agent.metrics import metrics, start_metrics_server
+from agent.workload import set_session
+from chart_workers import RenderQueueFullError, RenderTimeoutError, get_render_pool
 
 # --- CSS ---
 # --- CSS ---
@@ -77,18 +87,80 @@ load_dotenv()
 
 @st.cache_resource
 def init_connections():
-    return get_db_connection(), setup_groq_client()
+    # Le pool est partagé par toutes les sessions ; chaque requête y emprunte sa propre connexion.
+    return get_db_pool(), setup_groq_client()
+
+@st.cache_resource
+def init_metrics_server():
+    # Point /metrics pour Prometheus, si METRICS_PORT est défini.
+    return start_metrics_server()
+
+@st.cache_resource
+def init_render_pool():
+    # Processus de rendu démarrés dès le lancement : le premier graphique n'attend pas les imports.
+    return get_render_pool()
 
 def init_state():
-    if "connection" not in st.session_state or "groq_client" not in st.session_state:
-        st.session_state.connection, st.session_state.groq_client = init_connections()
+    if "db_pool" not in st.session_state or "groq_client" not in st.session_state:
+        st.session_state.db_pool, st.session_state.groq_client = init_connections()
+    init_render_pool()
+    init_metrics_server()
     if "db_schema" not in st.session_state:
-        st.session_state.db_schema = get_database_schema(st.session_state.connection)
-    if "sql" not in st.session_state: st.session_state.sql = ""
-    if "results" not in st.session_state: st.session_state.results = None
-    if "chart" not in st.session_state: st.session_state.chart = None
+        st.session_state.db_schema = get_database_schema(st.session_state.db_pool)
+    # Réponses de la session : SQL et position dans le résultat ; lignes et graphiques sont dans le
+    # magasin partagé par le processus, sous un budget mémoire commun.
+    if "history" not in st.session_state: st.session_state.history = ConversationHistory()
     if "last_question" not in st.session_state: st.session_state.last_question = None
     if "page" not in st.session_state: st.session_state.page = "agent"
+    if "followup_enabled" not in st.session_state: st.session_state.followup_enabled = True
+    if "chart_backend" not in st.session_state: st.session_state.chart_backend = chart_backend()
+    if "session_id" not in st.session_state: st.session_state.session_id = uuid.uuid4().hex[:12]
+    # Les requêtes de ce passage du script sont attribuées à la session dans le journal de charge.
+    set_session(st.session_state.session_id, "app")
+
+def render_results(pager, results=None):
+    """Tableau paginé : seule la page affichée est envoyée au navigateur."""
+    for warning in pager.warnings:
+        st.warning(warning)
+    page = pager.fetch(st.session_state.db_pool, results)
+    if page is None:
+        st.error("Impossible de lire cette page de résultats.")
+        return
+    st.dataframe(page, use_container_width=True, hide_index=True)
+    first, last = pager.row_range()
+    page_label = f"page {pager.page + 1}" + (f" / {pager.page_count}" if pager.page_count else "")
+    st.caption(f"Lignes {first}–{last} sur {pager.total_label()} ({page_label})")
+    nav_previous, nav_next, nav_count = st.columns([1, 1, 2])
+    nav_previous.button("◀ Précédente", key="page_previous", on_click=pager.previous, disabled=pager.page == 0)
+    nav_next.button("Suivante ▶", key="page_next", on_click=pager.next, disabled=not pager.has_next)
+    if pager.total is None:
+        nav_count.button("Compter toutes les lignes", key="page_count", on_click=pager.count, args=(st.session_state.db_pool,))
+    if pager.engine == "replica":
+        snapshot_time = time.strftime("%d/%m %H:%M", time.localtime(pager.snapshot_at))
+        st.caption(f"Réponse calculée sur la réplique locale (instantané du {snapshot_time}).")
+
+def render_history(history, placeholder):
+    """Questions de la session, de la plus récente à la plus ancienne ; un clic réaffiche la réponse."""
+    if not len(history):
+        return
+    with placeholder.container():
+        st.markdown("**Historique**")
+        for index in reversed(range(len(history))):
+            turn = history.turns[index]
+            label = turn["question"] if len(turn["question"]) <= 60 else turn["question"][:57] + "..."
+            st.button(
+                ("▸ " if index == history.current_index else "") + label, key=f"history_{turn['id']}",
+                on_click=history.select, args=(index,), use_container_width=True,
+            )
+
+def show_chart(chart_image, placeholder):
+    if isinstance(chart_image, dict):
+        # Spécification Vega-Lite : dessin, infobulles et zoom dans le navigateur.
+        placeholder.vega_lite_chart(chart_image, use_container_width=True)
+    elif chart_image:
+        placeholder.image(chart_image, use_container_width=True)
+    else:
+        placeholder.info("Aucun graphique disponible")
 
 init_state()
 st.set_page_config(page_title="THE SQLer", layout="wide")
@@ -122,6 +194,46 @@ with col_right:
         unsafe_allow_html=True
     )
 
+# --- Réglages ---
+with st.sidebar:
+    st.radio(
+        "Rendu des graphiques",
+        CHART_BACKENDS,
+        format_func=lambda backend: {"matplotlib": "Image (serveur)", "vega": "Interactif (navigateur)"}[backend],
+        key="chart_backend",
+    )
+    st.toggle("Affiner localement les questions de suivi", key="followup_enabled")
+    # Rempli en fin de script, pour inclure la réponse qui vient d'être calculée.
+    history_placeholder = st.empty()
+    with st.expander("Métriques (processus)"):
+        summary = metrics.summary()
+        if summary["stages"]:
+            st.dataframe(
+                pd.DataFrame(summary["stages"]).set_index("stage").round(3),
+                use_container_width=True,
+            )
+        else:
+            st.caption("Aucune mesure pour l'instant.")
+        store = history_store.stats()
+        st.caption(f"Historique : {store['in_memory']} réponses en mémoire ({store['bytes'] / 2**20:.1f} / "
+                   f"{store['max_bytes'] / 2**20:.0f} Mo), {store['spilled']} sur disque")
+        templates = summary["counters"].get("sql_template_total", {})
+        if templates:
+            fast_path = sum(count for name, count in templates.items() if name != "none")
+            st.caption(f"Modèles locaux : {fast_path} requêtes sur {sum(templates.values())} sans appel au LLM")
+        for counter, label in (("sql_cache_lookups_total", "Cache SQL"), ("result_cache_lookups_total", "Cache de résultats")):
+            lookups = summary["counters"].get(counter, {})
+            if lookups:
+                hits = sum(count for outcome, count in lookups.items() if outcome in ("hit", "disk_hit"))
+                st.caption(f"{label} : {hits} succès sur {sum(lookups.values())} lectures")
+        saved = summary["observations"].get("prompt_tokens_saved")
+        if saved:
+            st.caption(f"Élagage du schéma : {saved['mean']:.0f} jetons économisés par question en moyenne")
+        for purpose, tokens in summary["tokens"].items():
+            st.caption(f"Jetons LLM ({purpose}) : {tokens.get('prompt', 0)} en entrée, {tokens.get('completion', 0)} en sortie")
+        st.download_button("Export Prometheus", metrics.to_prometheus(), file_name="metrics.prom", mime="text/plain")
+        st.download_button("Export JSON lines", metrics.to_json_lines(), file_name="metrics.jsonl", mime="application/x-ndjson")
+
 # --- Pages ---
 if st.session_state.page == "agent":
     st.title("THE SQLer - Agent IA Expert en SQL")
@@ -149,29 +261,103 @@ if st.session_state.page == "agent":
     chart_content_placeholder = st.empty()
 
     user_question = st.chat_input("Posez votre question ici...")
+    answered = False
     if user_question:
         if user_question != st.session_state.last_question:
-            st.session_state.last_question = user_question
-            sql_query = generate_sql_query(user_question, st.session_state.db_schema, st.session_state.groq_client)
-            st.session_state.sql = sql_query
-            sql_content_placeholder.code(sql_query, language="sql")
-            results = execute_sql_query(st.session_state.connection, sql_query)
-            st.session_state.results = results
-            if results:
-                df = pd.DataFrame(results)
-                results_content_placeholder.dataframe(df, use_container_width=True)
+            timer = StageTimer()
+            history = st.session_state.history
+            # Question de suivi (« seulement le top 5 », « trie par pays »...) : affinée sur le
+            # résultat précédent, sans nouvelle requête, quand il contient ce qu'il faut.
+            refinement = None
+            turn = history.current
+            if st.session_state.followup_enabled and turn is not None and turn["pager"] is not None:
+                artifact = history.artifact(turn)
+                if artifact is not None:
+                    with timer.span("followup"):
+                        refinement = refine(user_question, turn["context"], artifact.results, st.session_state.groq_client)
+            if refinement is not None and refinement.mode == "local":
+                question = refinement.question
+                sql_query = None
+                sql_text = "\n".join(
+                    [turn["sql"], "", "-- Affiné localement à partir du résultat précédent :"]
+                    + [f"--   {line}" for line in describe_operations(refinement.operations)]
+                )
+                sql_content_placeholder.code(sql_text, language="sql")
+                results, chart_config = refinement.results, None
+            else:
+                # Nouvelle question, ou précision qui demande des colonnes absentes du résultat
+                # précédent : la requête est générée pour la question complète.
+                question = refinement.question if refinement is not None else user_question
+                # Affichage progressif : la requête apparaît dès les premiers tokens du LLM.
+                sql_query = ""
+                with timer.span("sql_generate"):
+                    for sql_piece in generate_sql_query_stream(question, st.session_state.db_schema, st.session_state.groq_client):
+                        sql_query += sql_piece
+                        sql_content_placeholder.code(sql_query, language="sql")
+                sql_query = sql_query.strip()
+                sql_text = sql_query
+                if not sql_query:
+                    sql_content_placeholder.error("Impossible de générer la requête SQL.")
+                    st.stop()
+                # La configuration du graphique est demandée au LLM pendant l'exécution de la requête.
+                # Un clic sur « Annuler » relance le script : l'attente est interrompue au prochain
+                # affichage de la progression et la requête est arrêtée côté serveur (KILL QUERY).
+                handle = QueryHandle(st.session_state.db_pool)
+                with results_content_placeholder.container():
+                    progress_placeholder = st.empty()
+                    st.button("Annuler la requête", key="cancel_query")
+                try:
+                    results, chart_config, timer = execute_with_chart_config(
+                        st.session_state.db_pool, sql_query, question, st.session_state.groq_client, timer,
+                        handle=handle,
+                        on_wait=lambda elapsed: progress_placeholder.caption(f"Exécution de la requête... {elapsed:.0f} s"),
+                    )
+                except QueryGuardError as e:
+                    results_content_placeholder.error(str(e))
+                    st.stop()
+            pager = None
+            chart_image = None
+            if results is not None and not results.empty:
+                # Le même DataFrame sert à la première page, au graphique puis, compacté, à l'historique.
+                pager = ResultPager.from_results(sql_query, results)
+                with results_content_placeholder.container():
+                    render_results(pager, results)
+            elif sql_query is None:
+                results_content_placeholder.warning("Aucune ligne du résultat précédent ne correspond à cette précision.")
             else:
                 results_content_placeholder.warning("La requête est valide mais n'a retourné aucun résultat.")
             with st.spinner("Génération du graphique..."):
                 try:
-                    chart_path = generate_visualization(user_question, results, st.session_state.groq_client)
-                    st.session_state.chart = chart_path
-                    if chart_path and os.path.exists(chart_path):
-                        chart_content_placeholder.image(chart_path, use_container_width=True)
-                    else:
-                        chart_content_placeholder.info("Aucun graphique disponible")
+                    with timer.span("chart_render"):
+                        chart_image = generate_visualization(question, results, st.session_state.groq_client, chart_config=chart_config, backend=st.session_state.chart_backend)
+                    show_chart(chart_image, chart_content_placeholder)
+                except (RenderTimeoutError, RenderQueueFullError) as e:
+                    chart_content_placeholder.warning(str(e))
                 except Exception as e:
                     chart_content_placeholder.error(f"Impossible de générer le graphique : {e}")
+            with st.expander("Temps par étape"):
+                st.markdown(timer.to_markdown())
+            history.add(
+                user_question, sql_text, results if pager is not None else None, chart_image, pager, context=question,
+            )
+            # Retenue seulement une fois la réponse obtenue : après un refus, une annulation ou une
+            # interruption (st.stop), la même question peut être reposée.
+            st.session_state.last_question = user_question
+            answered = True
+
+    turn = st.session_state.history.current
+    if not answered and turn is not None:
+        # Nouvel affichage (changement de page, réponse choisie dans l'historique...) : la réponse
+        # est réaffichée depuis l'historique, sans nouvelle requête ni nouveau graphique.
+        artifact = st.session_state.history.artifact(turn)
+        sql_content_placeholder.code(turn["sql"], language="sql")
+        if turn["pager"] is not None:
+            with results_content_placeholder.container():
+                render_results(turn["pager"], artifact.results if artifact else None)
+        else:
+            results_content_placeholder.warning("La requête est valide mais n'a retourné aucun résultat.")
+        show_chart(artifact.chart if artifact else None, chart_content_placeholder)
+    render_history(st.session_state.history, history_placeholder)
 
 elif st.session_state.page == "info_base":
     st.title("Schéma relationnel - Base Classicmodels")
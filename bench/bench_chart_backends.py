@@ -0,0 +1,76 @@
+# bench_chart_backends.py
+#
+# Compare le temps CPU serveur par graphique : rendu matplotlib (image PNG) contre
+# spécification Vega-Lite (dessin dans le navigateur), pour des résultats de tailles croissantes.
+# La préparation des données (chart_data.prepare_chart_data) est comptée dans les deux cas.
+#
+# Usage : python -m bench.bench_chart_backends [--rows 20 1000 100000] [--repeat 5]
+
+# Importations
+import argparse
+import json
+import statistics
+import time
+
+import numpy as np
+import pandas as pd
+
+from chart_data import prepare_chart_data
+from chart_vega import build_vega_spec
+from visualizer import render_chart
+
+
+def make_results(chart_type, rows, seed=0):
+    """Résultats synthétiques dans la forme des requêtes Classicmodels."""
+    rng = np.random.default_rng(seed)
+    amounts = rng.gamma(2.0, 1500.0, rows).round(2)
+    if chart_type == "line":
+        dates = pd.Timestamp("2003-01-06") + pd.to_timedelta(rng.integers(0, 880, rows), unit="D")
+        df = pd.DataFrame({"orderDate": dates.sort_values(), "chiffre_affaire": amounts})
+        config = {"x_column": "orderDate", "y_column": "chiffre_affaire"}
+    else:
+        df = pd.DataFrame({"customerName": [f"Client {i}" for i in range(rows)], "chiffre_affaire": amounts})
+        config = {"x_column": "customerName", "y_column": "chiffre_affaire"}
+    config.update(chart_type=chart_type, title="Benchmark", x_label=config["x_column"], y_label="Chiffre d'affaires")
+    return df, config
+
+
+def cpu_time(function, repeat):
+    """Temps CPU du processus (médiane sur `repeat` essais) et dernier résultat."""
+    samples = []
+    for _ in range(repeat):
+        start = time.process_time()
+        output = function()
+        samples.append(time.process_time() - start)
+    return statistics.median(samples), output
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Temps CPU serveur par graphique : matplotlib vs Vega-Lite.")
+    parser.add_argument("--rows", type=int, nargs="+", default=[20, 1000, 100000], help="Tailles de résultat.")
+    parser.add_argument("--repeat", type=int, default=5, help="Nombre d'essais par mesure.")
+    args = parser.parse_args()
+
+    print(f"{'type':<6} {'lignes':>8} | {'matplotlib (ms)':>15} {'PNG (Ko)':>9} | {'vega (ms)':>10} {'spec (Ko)':>10}")
+    for chart_type in ("bar", "line", "pie"):
+        for rows in args.rows:
+            df, config = make_results(chart_type, rows)
+
+            def with_matplotlib():
+                data, chart_config = prepare_chart_data(df, config)
+                return render_chart(data, chart_config, "png")
+
+            def with_vega():
+                data, chart_config = prepare_chart_data(df, config)
+                return json.dumps(build_vega_spec(data, chart_config))
+
+            mpl_time, image = cpu_time(with_matplotlib, args.repeat)
+            vega_time, spec = cpu_time(with_vega, args.repeat)
+            print(
+                f"{chart_type:<6} {rows:>8} | {mpl_time * 1000:>15.1f} {len(image) / 1024:>9.1f} | "
+                f"{vega_time * 1000:>10.1f} {len(spec) / 1024:>10.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
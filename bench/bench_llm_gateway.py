@@ -0,0 +1,75 @@
+# bench_llm_gateway.py
+#
+# Exerce la passerelle LLM contre le serveur Groq factice : N sessions envoient la même
+# question en même temps, avec une proportion de réponses 429/503. Affiche le nombre de
+# requêtes réellement reçues par le serveur (regroupement), les nouvelles tentatives et
+# les échecs, avec et sans regroupement.
+#
+# Usage : python -m bench.bench_llm_gateway [--sessions 20] [--fail-rate 0.2] [--stream]
+
+# Importations
+import argparse
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from groq import Groq
+
+from agent.llm_gateway import LLMGateway
+from bench.fake_groq_server import FakeGroqServer
+
+MESSAGES = [{"role": "system", "content": "Chiffre d'affaires par client, classé"}]
+
+
+def run(server, coalesce, sessions, stream):
+    client = Groq(api_key="test", base_url=server.base_url, max_retries=0)
+    gateway = LLMGateway(max_retries=5, backoff_base=0.05, backoff_max=0.5, max_concurrency=4, coalesce=coalesce)
+    server.requests = server.failures = 0
+
+    def ask(_):
+        start = time.perf_counter()
+        try:
+            if stream:
+                text = "".join(gateway.stream(client, MESSAGES))
+            else:
+                text = gateway.complete(client, MESSAGES)
+            return time.perf_counter() - start, bool(text)
+        except Exception:
+            return time.perf_counter() - start, False
+
+    with ThreadPoolExecutor(max_workers=sessions) as pool:
+        outcomes = list(pool.map(ask, range(sessions)))
+    latencies = sorted(latency for latency, _ in outcomes)
+    return {
+        "ok": sum(ok for _, ok in outcomes),
+        "server_requests": server.requests,
+        "server_failures": server.failures,
+        "p50": statistics.median(latencies),
+        "max": latencies[-1],
+        **gateway.stats(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Passerelle LLM contre un serveur Groq factice.")
+    parser.add_argument("--sessions", type=int, default=20, help="Nombre de sessions simultanées.")
+    parser.add_argument("--fail-rate", type=float, default=0.2, help="Proportion de réponses 429/503.")
+    parser.add_argument("--latency", type=float, default=0.3, help="Latence simulée du serveur (s).")
+    parser.add_argument("--stream", action="store_true", help="Appels en streaming.")
+    args = parser.parse_args()
+
+    server = FakeGroqServer(reply="```sql\nSELECT 1;\n```", latency=args.latency, fail_rate=args.fail_rate, seed=1)
+    server.start()
+    for coalesce in (False, True):
+        result = run(server, coalesce, args.sessions, args.stream)
+        print(
+            f"regroupement={'oui' if coalesce else 'non'} : {result['ok']}/{args.sessions} réponses, "
+            f"{result['server_requests']} requêtes reçues ({result['server_failures']} en erreur), "
+            f"{result['coalesced']} regroupées, {result['retries']} nouvelles tentatives, "
+            f"p50 {result['p50']:.2f} s, max {result['max']:.2f} s"
+        )
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
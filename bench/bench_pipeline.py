@@ -0,0 +1,210 @@
+# bench_pipeline.py
+#
+# Benchmark hors ligne du pipeline complet : schéma -> génération SQL -> exécution ->
+# graphique, sur une copie locale de Classicmodels (bench/classicmodels_fixture.py, SQLite,
+# facteur d'échelle 1×/10×/100×) avec un client Groq factice qui rejoue des complétions
+# enregistrées (bench/recorded_completions.json). Affiche p50/p95 par étape et enregistre
+# le résultat en JSON (avec le commit courant) pour comparer d'un commit à l'autre.
+#
+# Usage : python -m bench.bench_pipeline [--scale 10] [--repeat 5] [--output bench.json]
+#                                        [--baseline ancien.json] [--warm] [--backend vega]
+
+# Importations
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+
+# Réglages appliqués avant l'import de l'agent (lus au chargement des modules) :
+# - SQLite n'a pas l'EXPLAIN de MySQL : l'estimation du garde-fou est désactivée ;
+# - caches de résultats et de graphiques vides par défaut (mesure à froid, voir --warm) ;
+# - rendu dans le processus, pour mesurer le graphique et non l'aller-retour vers un worker ;
+# - contrôle de l'empreinte du schéma à chaque question.
+if "--warm" not in sys.argv:
+    os.environ.setdefault("RESULT_CACHE_MAX_MB", "0")
+    os.environ.setdefault("CHART_CACHE_SIZE", "0")
+os.environ.setdefault("SQL_GUARD_WARN_ROWS", "0")
+os.environ.setdefault("SQL_GUARD_MAX_ROWS", "0")
+os.environ.setdefault("CHART_WORKERS", "0")
+os.environ.setdefault("SCHEMA_CHECK_INTERVAL", "0")
+
+from agent.metrics import metrics
+from agent.sql_agent import execute_sql_dataframe, generate_sql_query, get_database_schema
+from bench import classicmodels_fixture
+from bench.fake_groq import FakeGroqClient
+from visualizer import generate_visualization
+
+COMPLETIONS_PATH = os.path.join(os.path.dirname(__file__), "recorded_completions.json")
+STAGES = ("schema", "sql_generation", "sql_execute", "visualization", "total")
+
+
+def load_completions(path=COMPLETIONS_PATH):
+    with open(path, encoding="utf-8") as completions_file:
+        return json.load(completions_file)
+
+
+def replay(completions):
+    """Réponse enregistrée pour l'invite reçue : SQL ou configuration du graphique, selon l'invite."""
+    by_question = {completion["question"]: completion for completion in completions}
+
+    def reply(messages):
+        prompt = messages[-1]["content"]
+        match = re.search(r"User Question: (.+)", prompt)
+        kind = "chart"
+        if not match:
+            match = re.search(r"Question: (.+?)\n\s*SQL Query:\s*$", prompt)
+            kind = "sql"
+        completion = by_question.get(match.group(1).strip()) if match else None
+        if completion is None:
+            raise KeyError(f"Aucune complétion enregistrée pour l'invite : {prompt[-200:]!r}")
+        return completion[kind]
+
+    return reply
+
+
+def percentile(values, q):
+    """Percentile `q` (0-100), au rang le plus proche comme dans agent.metrics."""
+    values = sorted(values)
+    if not values:
+        return 0.0
+    return values[max(0, -(-q * len(values) // 100) - 1)]
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_question(connection, client, question, backend, use_templates):
+    """Une question de bout en bout ; renvoie la durée de chaque étape (secondes) et le nombre de lignes."""
+    timings = {}
+    start = time.perf_counter()
+
+    stage_start = time.perf_counter()
+    db_schema = get_database_schema(connection)
+    timings["schema"] = time.perf_counter() - stage_start
+
+    stage_start = time.perf_counter()
+    sql_query = generate_sql_query(question, db_schema, client, use_cache=False, use_templates=use_templates)
+    timings["sql_generation"] = time.perf_counter() - stage_start
+    if not sql_query:
+        raise RuntimeError(f"Aucune requête générée pour : {question}")
+
+    # Même lecture que l'application (DataFrame) ; execute_sql_query n'en est qu'une conversion.
+    stage_start = time.perf_counter()
+    results = execute_sql_dataframe(connection, sql_query)
+    timings["sql_execute"] = time.perf_counter() - stage_start
+    if results is None:
+        raise RuntimeError(f"Échec de la requête pour : {question}\n{sql_query}")
+
+    stage_start = time.perf_counter()
+    chart = generate_visualization(question, results, client, backend=backend)
+    timings["visualization"] = time.perf_counter() - stage_start
+
+    timings["total"] = time.perf_counter() - start
+    return timings, len(results), chart is not None
+
+
+def summarize(samples):
+    return {
+        stage: {
+            "count": len(values),
+            "mean": sum(values) / len(values) if values else 0.0,
+            "p50": percentile(values, 50),
+            "p95": percentile(values, 95),
+        }
+        for stage, values in samples.items()
+    }
+
+
+def print_report(stages, baseline=None):
+    header = f"{'étape':<16} {'n':>4} {'moyenne (ms)':>13} {'p50 (ms)':>10} {'p95 (ms)':>10}"
+    print(header + (f" {'p95 réf. (ms)':>14} {'écart':>8}" if baseline else ""))
+    for stage in STAGES:
+        row = stages[stage]
+        line = f"{stage:<16} {row['count']:>4} {row['mean'] * 1000:>13.1f} {row['p50'] * 1000:>10.1f} {row['p95'] * 1000:>10.1f}"
+        reference = (baseline or {}).get("stages", {}).get(stage)
+        if reference:
+            change = (row["p95"] / reference["p95"] - 1) * 100 if reference["p95"] else 0.0
+            line += f" {reference['p95'] * 1000:>14.1f} {change:>+7.0f}%"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark hors ligne du pipeline question -> SQL -> graphique.")
+    parser.add_argument("--scale", type=int, default=1, help="Facteur d'échelle de la base (1, 10, 100...).")
+    parser.add_argument("--repeat", type=int, default=5, help="Passages mesurés sur l'ensemble des questions.")
+    parser.add_argument("--warmup", type=int, default=1, help="Passages préalables non mesurés.")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="Latence simulée de chaque appel au LLM (s).")
+    parser.add_argument("--backend", choices=("matplotlib", "vega"), default="matplotlib")
+    parser.add_argument("--templates", action="store_true", help="Autoriser les modèles de requêtes locaux.")
+    parser.add_argument("--warm", action="store_true", help="Garder les caches de résultats et de graphiques.")
+    parser.add_argument("--completions", default=COMPLETIONS_PATH, help="Complétions enregistrées (JSON).")
+    parser.add_argument("--output", help="Fichier JSON où enregistrer les résultats.")
+    parser.add_argument("--baseline", help="Résultats JSON d'un commit précédent, pour comparer les p95.")
+    parser.add_argument("--rebuild", action="store_true", help="Regénérer la base locale.")
+    args = parser.parse_args()
+
+    build_start = time.perf_counter()
+    connection = classicmodels_fixture.connect(args.scale, rebuild=args.rebuild)
+    print(f"Base Classicmodels ×{args.scale} prête en {time.perf_counter() - build_start:.1f} s")
+
+    completions = load_completions(args.completions)
+    client = FakeGroqClient(replay(completions), first_token_delay=args.llm_latency, chunk_delay=0)
+    samples = {stage: [] for stage in STAGES}
+    row_counts = {}
+    for iteration in range(args.warmup + args.repeat):
+        if iteration == args.warmup:
+            metrics.reset()
+        for completion in completions:
+            question = completion["question"]
+            timings, row_counts[question], _ = run_question(
+                connection, client, question, args.backend, args.templates
+            )
+            if iteration >= args.warmup:
+                for stage, seconds in timings.items():
+                    samples[stage].append(seconds)
+    connection.close()
+
+    stages = summarize(samples)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as baseline_file:
+            baseline = json.load(baseline_file)
+    print_report(stages, baseline)
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "scale": args.scale,
+        "settings": {
+            "repeat": args.repeat,
+            "warmup": args.warmup,
+            "llm_latency": args.llm_latency,
+            "backend": args.backend,
+            "templates": args.templates,
+            "warm": args.warm,
+            "python": sys.version.split()[0],
+        },
+        "rows": row_counts,
+        "stages": stages,
+        # Détail mesuré par l'agent lui-même (invite, garde-fou, appels au LLM, rendu...).
+        "metrics": metrics.summary(),
+        "llm_calls": client.calls,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output_file:
+            json.dump(report, output_file, indent=2, ensure_ascii=False)
+        print(f"Résultats enregistrés dans {args.output}")
+
+
+if __name__ == "__main__":
+    main()
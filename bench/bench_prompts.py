@@ -0,0 +1,82 @@
+# bench_prompts.py
+#
+# Compare le prompt complet (36 règles) et le prompt avec sélection des règles :
+# taille estimée en tokens et, avec --live, latence de bout en bout de generate_sql_query.
+#
+# Usage : python -m bench.bench_prompts [--live] [--repeat 3] [--questions fichier.txt]
+
+# Importations
+import argparse
+import statistics
+import time
+
+from agent.schema_index import estimate_tokens
+from agent.sql_agent import (
+    build_sql_prompt,
+    generate_sql_query,
+    get_database_schema,
+    get_db_connection,
+    setup_groq_client,
+)
+
+DEFAULT_QUESTIONS = [
+    "Quel est le chiffre d'affaire en 2004 ?",
+    "Qui sont nos meilleurs clients ?",
+    "Quel est le taux d'écoulement du stock ?",
+    "Quel est le taux de rotation du stock ?",
+    "Qui sont les managers ?",
+    "Nombre total de commandes par bureau",
+    "Quelle est la marge brute par gamme de produits ?",
+    "Quel est le taux de recouvrement par client ?",
+    "What is the average order amount per customer?",
+    "Valeur du stock au prix de vente moyen par ligne de produit",
+]
+
+MODES = ("full", "retrieval")
+
+
+def load_questions(path):
+    if not path:
+        return DEFAULT_QUESTIONS
+    with open(path, encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark du prompt SQL : règles complètes vs sélection.")
+    parser.add_argument("--questions", help="Fichier texte, une question par ligne.")
+    parser.add_argument("--live", action="store_true", help="Mesure aussi la latence réelle via Groq.")
+    parser.add_argument("--repeat", type=int, default=3, help="Nombre d'appels par question et par mode (--live).")
+    args = parser.parse_args()
+
+    questions = load_questions(args.questions)
+    connection = get_db_connection()
+    db_schema = get_database_schema(connection) if connection else ""
+
+    print(f"{'mode':<10} {'tokens moyens':>14} {'min':>6} {'max':>6}")
+    for mode in MODES:
+        tokens = [estimate_tokens(build_sql_prompt(q, db_schema, rules_mode=mode)) for q in questions]
+        print(f"{mode:<10} {statistics.mean(tokens):>14.0f} {min(tokens):>6} {max(tokens):>6}")
+
+    if not args.live:
+        return
+
+    groq_client = setup_groq_client()
+    print(f"\n{'mode':<10} {'p50 (s)':>8} {'p95 (s)':>8}")
+    for mode in MODES:
+        latencies = []
+        for question in questions:
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                generate_sql_query(question, db_schema, groq_client, rules_mode=mode, use_cache=False, use_templates=False)
+                latencies.append(time.perf_counter() - start)
+        latencies.sort()
+        p95 = latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))]
+        print(f"{mode:<10} {statistics.median(latencies):>8.2f} {p95:>8.2f}")
+
+    if connection:
+        connection.close()
+
+
+if __name__ == "__main__":
+    main()
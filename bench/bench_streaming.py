@@ -0,0 +1,65 @@
+# bench_streaming.py
+#
+# Mesure le temps jusqu'au premier token (latence perçue) et le temps total de génération SQL,
+# en streaming et sans streaming, avec un client Groq factice local.
+#
+# Usage : python -m bench.bench_streaming [--first-token 0.3] [--chunk-delay 0.01] [--repeat 5]
+
+# Importations
+import argparse
+import statistics
+import time
+
+from bench.fake_groq import FakeGroqClient
+from agent.sql_agent import generate_sql_query, generate_sql_query_stream
+
+SAMPLE_REPLY = """```sql
+SELECT
+    c.customerName,
+    SUM(od.quantityOrdered * od.priceEach) AS chiffre_affaire
+FROM
+    customers AS c
+JOIN
+    orders AS o ON o.customerNumber = c.customerNumber
+JOIN
+    orderdetails AS od ON od.orderNumber = o.orderNumber
+GROUP BY
+    c.customerName
+ORDER BY
+    chiffre_affaire DESC
+LIMIT 10;
+```"""
+
+QUESTION = "Chiffre d'affaires par client, classé"
+SCHEMA = "Table: customers\n  - customerName (varchar(50))\n\n"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Temps jusqu'au premier token : streaming vs réponse complète.")
+    parser.add_argument("--first-token", type=float, default=0.3, help="Délai simulé avant le premier token (s).")
+    parser.add_argument("--chunk-delay", type=float, default=0.01, help="Délai simulé entre deux morceaux (s).")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    client = FakeGroqClient(SAMPLE_REPLY, first_token_delay=args.first_token, chunk_delay=args.chunk_delay)
+    blocking, first_token, streaming_total = [], [], []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        generate_sql_query(QUESTION, SCHEMA, client, use_cache=False, use_templates=False)
+        blocking.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        first = None
+        for _piece in generate_sql_query_stream(QUESTION, SCHEMA, client, use_cache=False, use_templates=False):
+            if first is None:
+                first = time.perf_counter() - start
+        first_token.append(first)
+        streaming_total.append(time.perf_counter() - start)
+
+    print(f"Sans streaming, requête affichée après : {statistics.median(blocking) * 1000:8.1f} ms")
+    print(f"Streaming, premier token affiché après : {statistics.median(first_token) * 1000:8.1f} ms")
+    print(f"Streaming, requête complète après     : {statistics.median(streaming_total) * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
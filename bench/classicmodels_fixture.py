@@ -0,0 +1,424 @@
+# classicmodels_fixture.py
+#
+# Copie locale et déterministe de la base Classicmodels dans SQLite, agrandie d'un facteur
+# d'échelle (1×, 10×, 100× clients, commandes, lignes de commande et paiements), et une
+# connexion SQLite qui imite la partie de mysql-connector utilisée par l'agent :
+# curseurs, types de colonnes, information_schema, fonctions MySQL courantes.
+#
+# Usage : python -m bench.classicmodels_fixture --scale 10   (crée ou réutilise le fichier)
+
+# Importations
+import argparse
+import datetime
+import itertools
+import os
+import random
+import re
+import sqlite3
+import tempfile
+import zlib
+
+from mysql.connector import FieldType
+
+DATABASE_NAME = "classicmodels"
+
+# Tables : (colonne, type MySQL affiché dans le schéma, type SQLite, clé, référence)
+TABLES = {
+    "offices": [
+        ("officeCode", "varchar(10)", "TEXT", "PRI", None),
+        ("city", "varchar(50)", "TEXT", "", None),
+        ("country", "varchar(50)", "TEXT", "", None),
+        ("territory", "varchar(10)", "TEXT", "", None),
+    ],
+    "employees": [
+        ("employeeNumber", "int", "INTEGER", "PRI", None),
+        ("lastName", "varchar(50)", "TEXT", "", None),
+        ("firstName", "varchar(50)", "TEXT", "", None),
+        ("email", "varchar(100)", "TEXT", "", None),
+        ("officeCode", "varchar(10)", "TEXT", "MUL", ("offices", "officeCode")),
+        ("reportsTo", "int", "INTEGER", "MUL", ("employees", "employeeNumber")),
+        ("jobTitle", "varchar(50)", "TEXT", "", None),
+    ],
+    "productlines": [
+        ("productLine", "varchar(50)", "TEXT", "PRI", None),
+        ("textDescription", "varchar(4000)", "TEXT", "", None),
+    ],
+    "products": [
+        ("productCode", "varchar(15)", "TEXT", "PRI", None),
+        ("productName", "varchar(70)", "TEXT", "", None),
+        ("productLine", "varchar(50)", "TEXT", "MUL", ("productlines", "productLine")),
+        ("productScale", "varchar(10)", "TEXT", "", None),
+        ("productVendor", "varchar(50)", "TEXT", "", None),
+        ("quantityInStock", "smallint", "INTEGER", "", None),
+        ("buyPrice", "decimal(10,2)", "REAL", "", None),
+        ("MSRP", "decimal(10,2)", "REAL", "", None),
+    ],
+    "customers": [
+        ("customerNumber", "int", "INTEGER", "PRI", None),
+        ("customerName", "varchar(50)", "TEXT", "", None),
+        ("city", "varchar(50)", "TEXT", "", None),
+        ("state", "varchar(50)", "TEXT", "", None),
+        ("postalCode", "varchar(15)", "TEXT", "", None),
+        ("country", "varchar(50)", "TEXT", "", None),
+        ("salesRepEmployeeNumber", "int", "INTEGER", "MUL", ("employees", "employeeNumber")),
+        ("creditLimit", "decimal(10,2)", "REAL", "", None),
+    ],
+    "orders": [
+        ("orderNumber", "int", "INTEGER", "PRI", None),
+        ("orderDate", "date", "TEXT", "", None),
+        ("requiredDate", "date", "TEXT", "", None),
+        ("shippedDate", "date", "TEXT", "", None),
+        ("status", "varchar(15)", "TEXT", "", None),
+        ("comments", "text", "TEXT", "", None),
+        ("customerNumber", "int", "INTEGER", "MUL", ("customers", "customerNumber")),
+    ],
+    "orderdetails": [
+        ("orderNumber", "int", "INTEGER", "PRI", ("orders", "orderNumber")),
+        ("productCode", "varchar(15)", "TEXT", "PRI", ("products", "productCode")),
+        ("quantityOrdered", "int", "INTEGER", "", None),
+        ("priceEach", "decimal(10,2)", "REAL", "", None),
+        ("orderLineNumber", "smallint", "INTEGER", "", None),
+    ],
+    "payments": [
+        ("customerNumber", "int", "INTEGER", "PRI", ("customers", "customerNumber")),
+        ("checkNumber", "varchar(50)", "TEXT", "PRI", None),
+        ("paymentDate", "date", "TEXT", "", None),
+        ("amount", "decimal(10,2)", "REAL", "", None),
+    ],
+}
+
+VIEWS = {
+    "chiffre_affaire": (
+        "SELECT o.orderNumber, o.customerNumber, o.orderDate, od.productCode, od.quantityOrdered, od.priceEach "
+        "FROM orders AS o JOIN orderdetails AS od ON od.orderNumber = o.orderNumber",
+        [("orderNumber", "int"), ("customerNumber", "int"), ("orderDate", "date"), ("productCode", "varchar(15)"),
+         ("quantityOrdered", "int"), ("priceEach", "decimal(10,2)")],
+    ),
+    "commande_client": (
+        "SELECT c.customerNumber, c.customerName, c.country, "
+        "SUM(od.quantityOrdered * od.priceEach) AS chiffre_affaire_client "
+        "FROM customers AS c JOIN orders AS o ON o.customerNumber = c.customerNumber "
+        "JOIN orderdetails AS od ON od.orderNumber = o.orderNumber "
+        "GROUP BY c.customerNumber, c.customerName, c.country",
+        [("customerNumber", "int"), ("customerName", "varchar(50)"), ("country", "varchar(50)"),
+         ("chiffre_affaire_client", "decimal(41,2)")],
+    ),
+}
+
+OFFICES = [
+    ("1", "San Francisco", "USA", "NA"), ("2", "Boston", "USA", "NA"), ("3", "NYC", "USA", "NA"),
+    ("4", "Paris", "France", "EMEA"), ("5", "Tokyo", "Japan", "Japan"), ("6", "Sydney", "Australia", "APAC"),
+    ("7", "London", "UK", "EMEA"),
+]
+PRODUCT_LINES = ["Classic Cars", "Motorcycles", "Planes", "Ships", "Trains", "Trucks and Buses", "Vintage Cars"]
+COUNTRIES = [
+    ("USA", 36), ("Germany", 13), ("France", 12), ("Spain", 7), ("Australia", 5), ("UK", 5), ("Italy", 4),
+    ("New Zealand", 4), ("Canada", 3), ("Finland", 3), ("Switzerland", 3), ("Singapore", 3), ("Denmark", 2),
+    ("Japan", 2), ("Norway", 2), ("Sweden", 2), ("Belgium", 2), ("Austria", 2), ("Ireland", 2), ("Philippines", 2),
+    ("Hong Kong", 1),
+]
+STATUSES = [("Shipped", 303), ("Cancelled", 6), ("Resolved", 4), ("On Hold", 4), ("In Process", 6), ("Disputed", 3)]
+FIRST_DATE = datetime.date(2003, 1, 6)
+LAST_DATE = datetime.date(2005, 5, 31)
+
+# Volumes de la base d'origine (facteur 1).
+BASE_CUSTOMERS, BASE_ORDERS, BASE_PAYMENTS, PRODUCTS = 122, 326, 273, 110
+
+
+def _weighted(rng, pairs):
+    values, weights = zip(*pairs)
+    return rng.choices(values, weights=weights)[0]
+
+
+def _date(rng, start=FIRST_DATE, end=LAST_DATE):
+    return start + datetime.timedelta(days=rng.randint(0, (end - start).days))
+
+
+def generate_rows(scale=1, seed=42):
+    """Lignes de chaque table (tuples dans l'ordre des colonnes de TABLES)."""
+    rng = random.Random(seed)
+    rows = {"offices": OFFICES}
+
+    employees = [(1002, "Murphy", "Diane", "dmurphy@classicmodelcars.com", "1", None, "President")]
+    managers = [(1056, "VP Sales"), (1076, "VP Marketing"), (1088, "Sales Manager (APAC)"),
+                (1102, "Sale Manager (EMEA)"), (1143, "Sales Manager (NA)")]
+    for number, title in managers:
+        employees.append((number, f"Manager{number}", "Alex", f"m{number}@classicmodelcars.com", "1", 1002, title))
+    sales_reps = []
+    for index in range(17):
+        number = 1165 + index * 17
+        office = OFFICES[index % len(OFFICES)][0]
+        employees.append((number, f"Rep{number}", "Sam", f"r{number}@classicmodelcars.com", office,
+                          rng.choice([1088, 1102, 1143]), "Sales Rep"))
+        sales_reps.append(number)
+    rows["employees"] = employees
+
+    rows["productlines"] = [(line, f"Gamme {line}") for line in PRODUCT_LINES]
+    products = []
+    for index in range(PRODUCTS):
+        line = PRODUCT_LINES[index % len(PRODUCT_LINES)]
+        buy_price = round(rng.uniform(15, 105), 2)
+        products.append((
+            f"S{10 + index % 9 * 2}_{1000 + index * 37}", f"{rng.randint(1900, 2005)} {line} model {index}", line,
+            rng.choice(["1:10", "1:12", "1:18", "1:24", "1:32", "1:700"]), f"Vendor {index % 13}",
+            rng.randint(15, 9997), buy_price, round(buy_price * rng.uniform(1.4, 2.2), 2),
+        ))
+    rows["products"] = products
+
+    customers = []
+    for index in range(BASE_CUSTOMERS * scale):
+        customers.append((
+            103 + index, f"Client {index:06d} Collectables", f"City {index % 95}", None,
+            f"{rng.randint(10000, 99999)}", _weighted(rng, COUNTRIES),
+            rng.choice(sales_reps) if rng.random() > 0.2 else None, round(rng.uniform(0, 227600), 2),
+        ))
+    rows["customers"] = customers
+
+    orders, details = [], []
+    for index in range(BASE_ORDERS * scale):
+        order_number = 10100 + index
+        order_date = _date(rng)
+        status = _weighted(rng, STATUSES)
+        shipped = order_date + datetime.timedelta(days=rng.randint(1, 6)) if status == "Shipped" else None
+        orders.append((
+            order_number, order_date.isoformat(), (order_date + datetime.timedelta(days=rng.randint(7, 10))).isoformat(),
+            shipped.isoformat() if shipped else None, status, None, rng.choice(customers)[0],
+        ))
+        for line_number, product in enumerate(rng.sample(products, rng.randint(1, 17)), start=1):
+            details.append((order_number, product[0], rng.randint(10, 66), round(product[7] * rng.uniform(0.8, 1.0), 2), line_number))
+    rows["orders"], rows["orderdetails"] = orders, details
+
+    payments, checks = [], set()
+    for _ in range(BASE_PAYMENTS * scale):
+        check = f"{rng.choice('ABCDEFGHJKLMNPQRSTUVWXYZ')}{rng.choice('ABCDEFGHJKLMNPQRSTUVWXYZ')}{rng.randint(100000, 999999)}"
+        if check in checks:
+            continue
+        checks.add(check)
+        payments.append((rng.choice(customers)[0], check, _date(rng).isoformat(), round(rng.uniform(615, 120166), 2)))
+    rows["payments"] = payments
+    return rows
+
+
+# --- Fonctions MySQL absentes de SQLite ---
+def _parse_date(value):
+    if value is None:
+        return None
+    return datetime.datetime.fromisoformat(str(value)[:19])
+
+
+def _date_part(extract):
+    def function(value):
+        date = _parse_date(value)
+        return None if date is None else extract(date)
+    return function
+
+
+_MYSQL_TO_STRFTIME = {"%Y": "%Y", "%y": "%y", "%m": "%m", "%c": "%m", "%d": "%d", "%e": "%d", "%M": "%B",
+                      "%b": "%b", "%H": "%H", "%i": "%M", "%s": "%S", "%W": "%A", "%a": "%a"}
+
+
+def _date_format(value, mysql_format):
+    date = _parse_date(value)
+    if date is None:
+        return None
+    return date.strftime(re.sub(r"%[a-zA-Z]", lambda m: _MYSQL_TO_STRFTIME.get(m.group(0), m.group(0)), mysql_format))
+
+
+def _concat_ws(separator, *values):
+    return separator.join(str(value) for value in values if value is not None)
+
+
+def register_mysql_functions(connection):
+    connection.create_function("DATABASE", 0, lambda: DATABASE_NAME, deterministic=True)
+    connection.create_function("YEAR", 1, _date_part(lambda d: d.year), deterministic=True)
+    connection.create_function("MONTH", 1, _date_part(lambda d: d.month), deterministic=True)
+    connection.create_function("DAY", 1, _date_part(lambda d: d.day), deterministic=True)
+    connection.create_function("QUARTER", 1, _date_part(lambda d: (d.month - 1) // 3 + 1), deterministic=True)
+    connection.create_function("MONTHNAME", 1, _date_part(lambda d: d.strftime("%B")), deterministic=True)
+    connection.create_function("DATE_FORMAT", 2, _date_format, deterministic=True)
+    connection.create_function("CONCAT", -1, lambda *values: None if None in values else "".join(map(str, values)), deterministic=True)
+    connection.create_function("CONCAT_WS", -1, _concat_ws, deterministic=True)
+    connection.create_function("CRC32", 1, lambda value: zlib.crc32(str(value).encode("utf-8")), deterministic=True)
+    connection.create_function("NOW", 0, lambda: datetime.datetime.now().isoformat(sep=" ", timespec="seconds"))
+    connection.create_function("CURDATE", 0, lambda: datetime.date.today().isoformat())
+
+
+def _information_schema(connection):
+    """Tables COLUMNS, KEY_COLUMN_USAGE et TABLES d'information_schema, dans une base attachée."""
+    connection.execute("ATTACH DATABASE ':memory:' AS information_schema")
+    connection.executescript("""
+        CREATE TABLE information_schema.COLUMNS (
+            TABLE_SCHEMA TEXT, TABLE_NAME TEXT, COLUMN_NAME TEXT, ORDINAL_POSITION INTEGER,
+            COLUMN_TYPE TEXT, COLUMN_KEY TEXT, IS_NULLABLE TEXT);
+        CREATE TABLE information_schema.KEY_COLUMN_USAGE (
+            TABLE_SCHEMA TEXT, TABLE_NAME TEXT, COLUMN_NAME TEXT,
+            REFERENCED_TABLE_NAME TEXT, REFERENCED_COLUMN_NAME TEXT);
+        CREATE TABLE information_schema.TABLES (TABLE_SCHEMA TEXT, TABLE_NAME TEXT, UPDATE_TIME TEXT);
+    """)
+    columns, keys, tables = [], [], []
+    for table, definition in TABLES.items():
+        tables.append((DATABASE_NAME, table, None))
+        for position, (name, mysql_type, _, key, reference) in enumerate(definition, start=1):
+            columns.append((DATABASE_NAME, table, name, position, mysql_type, key, "NO" if key == "PRI" else "YES"))
+            if reference:
+                keys.append((DATABASE_NAME, table, name) + reference)
+    for view, (_, definition) in VIEWS.items():
+        tables.append((DATABASE_NAME, view, None))
+        for position, (name, mysql_type) in enumerate(definition, start=1):
+            columns.append((DATABASE_NAME, view, name, position, mysql_type, "", "YES"))
+    connection.executemany("INSERT INTO information_schema.COLUMNS VALUES (?, ?, ?, ?, ?, ?, ?)", columns)
+    connection.executemany("INSERT INTO information_schema.KEY_COLUMN_USAGE VALUES (?, ?, ?, ?, ?)", keys)
+    connection.executemany("INSERT INTO information_schema.TABLES VALUES (?, ?, ?)", tables)
+
+
+def fixture_path(scale, seed=42):
+    directory = os.getenv("BENCH_FIXTURE_DIR", os.path.join(tempfile.gettempdir(), "sqler-bench"))
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, f"classicmodels_x{scale}_seed{seed}.sqlite")
+
+
+def build_fixture(scale=1, seed=42, rebuild=False):
+    """Crée (ou réutilise) le fichier SQLite de la base au facteur `scale` et renvoie son chemin."""
+    path = fixture_path(scale, seed)
+    if os.path.exists(path) and not rebuild:
+        return path
+    if os.path.exists(path):
+        os.remove(path)
+    connection = sqlite3.connect(path)
+    for table, definition in TABLES.items():
+        primary = [name for name, _, _, key, _ in definition if key == "PRI"]
+        columns = ", ".join(f"{name} {sqlite_type}" for name, _, sqlite_type, _, _ in definition)
+        connection.execute(f"CREATE TABLE {table} ({columns}, PRIMARY KEY ({', '.join(primary)}))")
+    for table, rows in generate_rows(scale, seed).items():
+        placeholders = ", ".join("?" * len(TABLES[table]))
+        connection.executemany(f"INSERT INTO {table} VALUES ({placeholders})", rows)
+    for view, (query, _) in VIEWS.items():
+        connection.execute(f"CREATE VIEW {view} AS {query}")
+    for table, column in [("orders", "customerNumber"), ("orders", "orderDate"), ("orderdetails", "productCode"),
+                          ("customers", "country"), ("payments", "paymentDate"), ("products", "productLine")]:
+        connection.execute(f"CREATE INDEX idx_{table}_{column} ON {table} ({column})")
+    connection.commit()
+    connection.close()
+    return path
+
+
+# --- Connexion compatible mysql-connector ---
+_DATE_PATTERN = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+_DATETIME_PATTERN = re.compile(r"^\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}:\d{2}")
+
+
+def _infer_type(values):
+    """Code de type MySQL d'une colonne d'après ses premières valeurs (SQLite n'en fournit pas)."""
+    kinds = set()
+    for value in values:
+        if value is None:
+            continue
+        if isinstance(value, bool) or isinstance(value, int):
+            kinds.add(FieldType.LONGLONG)
+        elif isinstance(value, float):
+            kinds.add(FieldType.DOUBLE)
+        elif isinstance(value, bytes):
+            kinds.add(FieldType.BLOB)
+        elif _DATE_PATTERN.match(value):
+            kinds.add(FieldType.DATE)
+        elif _DATETIME_PATTERN.match(value):
+            kinds.add(FieldType.DATETIME)
+        else:
+            kinds.add(FieldType.VAR_STRING)
+    if kinds == {FieldType.LONGLONG}:
+        return FieldType.LONGLONG
+    if kinds <= {FieldType.LONGLONG, FieldType.DOUBLE} and kinds:
+        return FieldType.DOUBLE
+    if len(kinds) == 1:
+        return kinds.pop()
+    return FieldType.VAR_STRING
+
+
+class SQLiteCursor:
+    """Curseur SQLite présentant `description` avec des codes de type MySQL."""
+
+    # Lignes lues d'avance pour déduire le type des colonnes.
+    INFER_ROWS = 256
+
+    def __init__(self, connection):
+        self._cursor = connection.raw.cursor()
+        self._buffer = []
+        self.description = None
+
+    def execute(self, query, params=()):
+        self._cursor.execute(query, params)
+        if self._cursor.description is None:
+            self.description = None
+            return
+        self._buffer = self._cursor.fetchmany(self.INFER_ROWS)
+        columns = list(zip(*self._buffer)) if self._buffer else [()] * len(self._cursor.description)
+        self.description = [
+            (column[0], _infer_type(values), None, None, None, None, True)
+            for column, values in zip(self._cursor.description, columns)
+        ]
+
+    def fetchmany(self, size=1):
+        rows, self._buffer = self._buffer[:size], self._buffer[size:]
+        if len(rows) < size:
+            rows += self._cursor.fetchmany(size - len(rows))
+        return rows
+
+    def fetchall(self):
+        rows, self._buffer = self._buffer, []
+        return rows + self._cursor.fetchall()
+
+    def fetchone(self):
+        rows = self.fetchmany(1)
+        return rows[0] if rows else None
+
+    def close(self):
+        self._cursor.close()
+
+
+class SQLiteConnection:
+    """Connexion SQLite utilisable à la place d'une connexion mysql-connector par l'agent."""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, path):
+        self.raw = sqlite3.connect(path, check_same_thread=False)
+        register_mysql_functions(self.raw)
+        _information_schema(self.raw)
+        self.connection_id = next(self._ids)
+
+    def cursor(self, dictionary=False):
+        return SQLiteCursor(self)
+
+    def consume_results(self):
+        pass
+
+    def is_connected(self):
+        return True
+
+    def ping(self, reconnect=False, attempts=1, delay=0):
+        pass
+
+    def close(self):
+        self.raw.close()
+
+
+def connect(scale=1, seed=42, rebuild=False):
+    """Connexion à la base Classicmodels locale au facteur `scale`."""
+    return SQLiteConnection(build_fixture(scale, seed, rebuild))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Base Classicmodels locale (SQLite) à l'échelle voulue.")
+    parser.add_argument("--scale", type=int, default=1, help="Facteur d'échelle (1, 10, 100...).")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--rebuild", action="store_true")
+    args = parser.parse_args()
+    path = build_fixture(args.scale, args.seed, args.rebuild)
+    connection = sqlite3.connect(path)
+    for table in TABLES:
+        print(f"{table:<14} {connection.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]:>10}")
+    print(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+# fake_groq.py
+#
+# Client Groq factice, sans réseau : renvoie des complétions prédéfinies avec une latence
+# simulée (délai avant le premier token, puis délai par morceau), en mode normal ou streaming.
+
+# Importations
+import time
+from types import SimpleNamespace
+
+
+class _Completions:
+    def __init__(self, client):
+        self._client = client
+
+    def create(self, messages, model=None, temperature=None, max_tokens=None, stream=False, **kwargs):
+        client = self._client
+        client.calls += 1
+        text = client.reply_for(messages)
+        if stream:
+            return client.stream_chunks(text)
+        time.sleep(client.first_token_delay + client.chunk_delay * len(client.split(text)))
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=text))],
+            usage=SimpleNamespace(prompt_tokens=0, completion_tokens=len(client.split(text))),
+        )
+
+
+class FakeGroqClient:
+    """
+    Remplaçant local de `groq.Groq` pour les benchmarks.
+
+    Args:
+        reply (str | callable): Texte renvoyé, ou fonction `messages -> texte`.
+        first_token_delay (float): Délai simulé avant le premier morceau (secondes).
+        chunk_delay (float): Délai simulé entre deux morceaux (secondes).
+        chunk_size (int): Nombre de caractères par morceau.
+    """
+
+    def __init__(self, reply="SELECT 1;", first_token_delay=0.3, chunk_delay=0.01, chunk_size=4):
+        self.reply = reply
+        self.first_token_delay = first_token_delay
+        self.chunk_delay = chunk_delay
+        self.chunk_size = chunk_size
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=_Completions(self))
+
+    def reply_for(self, messages):
+        return self.reply(messages) if callable(self.reply) else self.reply
+
+    def split(self, text):
+        return [text[i:i + self.chunk_size] for i in range(0, len(text), self.chunk_size)] or [""]
+
+    def stream_chunks(self, text):
+        time.sleep(self.first_token_delay)
+        for index, piece in enumerate(self.split(text)):
+            if index:
+                time.sleep(self.chunk_delay)
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=piece))])
@@ -0,0 +1,155 @@
+# fake_groq_server.py
+#
+# Serveur HTTP local qui imite l'API Groq (/openai/v1/chat/completions), en réponse complète
+# ou en streaming (SSE), avec latence simulée et erreurs 429/503 injectées. Permet de tester
+# la passerelle LLM (agent/llm_gateway.py) avec le vrai SDK, sans réseau :
+#
+#   python -m bench.fake_groq_server --port 8765 --fail-rate 0.2
+#   GROQ_BASE_URL=http://127.0.0.1:8765 GROQ_API_KEY=test streamlit run app.py
+
+# Importations
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+COMPLETIONS_PATH = "/openai/v1/chat/completions"
+
+
+class FakeGroqServer(ThreadingHTTPServer):
+    """
+    Args:
+        address (tuple): (hôte, port) ; port 0 = port libre choisi par le système.
+        reply (str | callable): Texte renvoyé, ou fonction `messages -> texte`.
+        latency (float): Délai avant la réponse (ou le premier morceau), en secondes.
+        chunk_delay (float): Délai entre deux morceaux en streaming.
+        fail_rate (float): Proportion de requêtes rejetées (429 ou 503, au hasard).
+        retry_after (float): Valeur de l'en-tête Retry-After des réponses 429 (None = absent).
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address=("127.0.0.1", 0), reply="SELECT 1;", latency=0.2, chunk_delay=0.01,
+                 chunk_size=4, fail_rate=0.0, retry_after=None, seed=None):
+        super().__init__(address, _Handler)
+        self.reply = reply
+        self.latency = latency
+        self.chunk_delay = chunk_delay
+        self.chunk_size = chunk_size
+        self.fail_rate = fail_rate
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.failures = 0
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        """Démarre le serveur dans un thread et renvoie son URL (à passer en GROQ_BASE_URL)."""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self.base_url
+
+    def reply_for(self, messages):
+        return self.reply(messages) if callable(self.reply) else self.reply
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        server = self.server
+        if self.path.split("?")[0] != COMPLETIONS_PATH:
+            self._send_json(404, {"error": {"message": f"Chemin inconnu : {self.path}"}})
+            return
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        with server.lock:
+            server.requests += 1
+            failed = server.random.random() < server.fail_rate
+            if failed:
+                server.failures += 1
+                status = server.random.choice([429, 503])
+        if failed:
+            headers = {"Retry-After": str(server.retry_after)} if status == 429 and server.retry_after else None
+            self._send_json(status, {"error": {"message": "Erreur simulée", "type": "fake_error"}}, headers)
+            return
+
+        text = server.reply_for(request.get("messages", []))
+        model = request.get("model", "fake-model")
+        pieces = [text[i:i + server.chunk_size] for i in range(0, len(text), server.chunk_size)] or [""]
+        completion_id = f"chatcmpl-fake-{server.requests}"
+        created = int(time.time())
+        time.sleep(server.latency)
+
+        if not request.get("stream"):
+            self._send_json(200, {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": 0, "completion_tokens": len(pieces), "total_tokens": len(pieces)},
+            })
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        for index, piece in enumerate(pieces + [None]):
+            if index:
+                time.sleep(server.chunk_delay)
+            chunk = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "delta": {"content": piece} if piece is not None else {},
+                    "finish_reason": None if piece is not None else "stop",
+                }],
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serveur Groq factice (API compatible OpenAI).")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--reply", default="```sql\nSELECT 1;\n```", help="Texte renvoyé à chaque requête.")
+    parser.add_argument("--latency", type=float, default=0.3, help="Délai avant la réponse (s).")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Proportion de réponses 429/503.")
+    parser.add_argument("--retry-after", type=float, default=None, help="En-tête Retry-After des réponses 429 (s).")
+    args = parser.parse_args()
+
+    server = FakeGroqServer((args.host, args.port), reply=args.reply, latency=args.latency,
+                            fail_rate=args.fail_rate, retry_after=args.retry_after)
+    print(f"Serveur Groq factice : {server.base_url} (GROQ_BASE_URL)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
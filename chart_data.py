@@ -0,0 +1,164 @@
+# chart_data.py
+
+# Réduction des données avant le tracé : le temps de rendu doit rester à peu près constant
+# quelle que soit la taille du résultat (des centaines de milliers de lignes de commande,
+# ou un client par barre).
+
+# Importations
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+from chart_planner import MAX_PIE_SLICES, _is_date_objects, humanize
+
+OTHERS_LABEL = "Autres"
+
+# Colonnes à moyenner plutôt qu'à additionner lorsqu'on regroupe des lignes.
+MEAN_NAME = re.compile(r"(avg|moyen|average|mean|taux|rate|ratio|pourcentage|percent|prix|price|marge|margin|rotation)", re.IGNORECASE)
+
+# Périodes candidates pour le regroupement temporel, de la plus fine à la plus large,
+# avec leur durée approximative en jours.
+TIME_BUCKETS = [("D", 1), ("W", 7), ("M", 30.44), ("Q", 91.31), ("Y", 365.25)]
+
+
+def max_points():
+    """Nombre maximal de points d'une courbe (CHART_MAX_POINTS)."""
+    return int(os.getenv("CHART_MAX_POINTS", "500"))
+
+
+def max_categories():
+    """Nombre maximal de barres, « Autres » compris (CHART_MAX_CATEGORIES)."""
+    return int(os.getenv("CHART_MAX_CATEGORIES", "20"))
+
+
+def aggregation_for(column):
+    """'mean' pour les moyennes, taux et prix, 'sum' pour les totaux et comptages."""
+    return "mean" if MEAN_NAME.search(humanize(column)) else "sum"
+
+
+def lttb_indices(x, y, threshold):
+    """
+    Indices des points retenus par l'algorithme LTTB (Largest-Triangle-Three-Buckets).
+
+    Le premier et le dernier point sont conservés ; pour chaque tranche intermédiaire, on
+    garde le point qui forme le plus grand triangle avec le point précédemment retenu et
+    la moyenne de la tranche suivante, ce qui préserve pics et creux de la courbe.
+
+    Args:
+        x (ndarray): Abscisses (numériques, triées).
+        y (ndarray): Ordonnées.
+        threshold (int): Nombre de points souhaité.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+    selected = np.empty(threshold, dtype=int)
+    selected[0], selected[-1] = 0, n - 1
+    anchor = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[end:next_end].mean()
+        avg_y = y[end:next_end].mean()
+        area = np.abs(
+            (x[anchor] - avg_x) * (y[start:end] - y[anchor])
+            - (x[anchor] - x[start:end]) * (avg_y - y[anchor])
+        )
+        anchor = start + int(area.argmax())
+        selected[i + 1] = anchor
+    return selected
+
+
+def bucket_time(df, x_column, y_column, limit):
+    """
+    Regroupe une série temporelle par jour, semaine, mois, trimestre ou année : la période
+    la plus fine qui donne au plus `limit` points.
+    """
+    dates = pd.to_datetime(df[x_column], errors="coerce")
+    span_days = (dates.max() - dates.min()) / pd.Timedelta(days=1) if dates.notna().any() else 0
+    freq = TIME_BUCKETS[-1][0]
+    for candidate, days in TIME_BUCKETS:
+        if span_days / days < limit:
+            freq = candidate
+            break
+    periods = dates.dt.to_period(freq)
+    grouped = df[y_column].groupby(periods).agg(aggregation_for(y_column))
+    return pd.DataFrame({x_column: grouped.index.to_timestamp(), y_column: grouped.to_numpy()})
+
+
+def top_n_with_others(df, x_column, y_column, limit):
+    """Garde les `limit - 1` catégories les plus fortes et regroupe le reste dans « Autres »."""
+    how = aggregation_for(y_column)
+    grouped = df.groupby(x_column, sort=False)[y_column].agg(how)
+    if len(grouped) <= limit:
+        return grouped.reset_index()
+    ordered = grouped.sort_values(ascending=False)
+    head, tail = ordered.iloc[:limit - 1], ordered.iloc[limit - 1:]
+    others = tail.sum() if how == "sum" else df.loc[df[x_column].isin(tail.index), y_column].mean()
+    reduced = pd.DataFrame({x_column: head.index.astype(str), y_column: head.to_numpy()})
+    return pd.concat([reduced, pd.DataFrame({x_column: [OTHERS_LABEL], y_column: [others]})], ignore_index=True)
+
+
+def _is_temporal(series):
+    return pd.api.types.is_datetime64_any_dtype(series) or _is_date_objects(series)
+
+
+def reduce_line(df, x_column, y_column, limit):
+    """Courbe d'au plus `limit` points : regroupement temporel, sinon sous-échantillonnage LTTB."""
+    temporal = _is_temporal(df[x_column])
+    if temporal:
+        if df[x_column].nunique() > limit or df[x_column].duplicated().any():
+            df = bucket_time(df, x_column, y_column, limit)
+    elif df[x_column].duplicated().any():
+        df = df.groupby(x_column, sort=False)[y_column].agg(aggregation_for(y_column)).reset_index()
+    if len(df) <= limit:
+        return df
+    if temporal:
+        df = df.sort_values(x_column)
+        positions = pd.to_datetime(df[x_column]).to_numpy().astype("int64").astype(float)
+    else:
+        positions = np.arange(len(df), dtype=float)
+    keep = lttb_indices(positions, df[y_column].to_numpy(dtype=float), limit)
+    return df.iloc[keep]
+
+
+def prepare_chart_data(df, chart_config):
+    """
+    Met les données à la taille du graphique avant le tracé.
+
+    - « année » et « trimestre » sont fusionnés en une seule abscisse ;
+    - courbes : regroupement temporel puis LTTB au-delà de CHART_MAX_POINTS points ;
+    - barres et secteurs : top N + « Autres » au-delà de CHART_MAX_CATEGORIES barres
+      (MAX_PIE_SLICES secteurs).
+
+    Returns:
+        tuple: (DataFrame réduit ne contenant que les colonnes tracées, configuration)
+    """
+    chart_config = dict(chart_config)
+
+    # Vérifier si les colonnes 'year' et 'quarter' existent pour les regrouper.
+    if 'year' in df.columns and 'quarter' in df.columns:
+        # Créer une nouvelle colonne pour un affichage "année-trimestre"
+        df = df.assign(year_quarter=df['year'].astype(str) + '-T' + df['quarter'].astype(str))
+        # Mettre à jour la colonne x dans la configuration du graphique
+        chart_config['x_column'] = 'year_quarter'
+        chart_config['x_label'] = 'Année et Trimestre'
+
+    x_column, y_column = chart_config['x_column'], chart_config['y_column']
+    # Les DECIMAL MySQL arrivent en objets Decimal : conversion en flottants pour le tracé.
+    df = pd.DataFrame({
+        x_column: df[x_column].to_numpy(),
+        y_column: pd.to_numeric(df[y_column], errors='coerce').to_numpy(),
+    }).dropna(subset=[y_column])
+
+    chart_type = chart_config['chart_type']
+    if chart_type == 'line':
+        df = reduce_line(df, x_column, y_column, max_points())
+    elif chart_type == 'bar' and len(df) > max_categories():
+        df = top_n_with_others(df, x_column, y_column, max_categories())
+    elif chart_type == 'pie' and len(df) > MAX_PIE_SLICES:
+        df = top_n_with_others(df, x_column, y_column, MAX_PIE_SLICES)
+    return df.reset_index(drop=True), chart_config
@@ -0,0 +1,209 @@
+# chart_planner.py
+
+# Planification locale du graphique (type, axes, titre) à partir des colonnes, de leurs types
+# et de la question, pour éviter un appel au LLM dans la majorité des cas.
+
+# Importations
+import datetime
+import os
+import re
+import threading
+import unicodedata
+
+import pandas as pd
+
+# Motifs appliqués au libellé lisible de la colonne (« orderDate » -> « order date »).
+TEMPORAL_NAME = re.compile(r"\b(year|annee|month|mois|quarter|trimestre|date|period|periode|week|semaine|day|jour)", re.IGNORECASE)
+NUMERIC_NAME = re.compile(
+    r"(total|sum|somme|count|nombre|nb_|montant|amount|chiffre|ca_|revenue|sales|ventes?|taux|rate|marge|margin|"
+    r"valeur|value|avg|moyen|average|quantit|rotation|price|prix|stock|revenu|paye|credit)",
+    re.IGNORECASE,
+)
+# Colonnes numériques qui désignent une période (année 2004, mois 1-12...), d'après le nom
+# et l'étendue des valeurs ; « nb jours », « days to pay » restent des mesures.
+YEAR_NAME = re.compile(r"\b(year|annee)", re.IGNORECASE)
+CYCLE_NAME = re.compile(r"\b(month|mois|quarter|trimestre|week|semaine)", re.IGNORECASE)
+SHARE_WORDS = re.compile(r"(part |parts |pourcentage|percentage|proportion|repartition|share|%|distribution)")
+TREND_WORDS = re.compile(r"(evolution|tendance|trend|over time|au fil|par mois|par annee|par trimestre|monthly|yearly)")
+
+# Au-delà de ce nombre de catégories, un camembert devient illisible.
+MAX_PIE_SLICES = 8
+
+
+def _normalize(text):
+    text = "".join(c for c in unicodedata.normalize("NFKD", text) if not unicodedata.combining(c))
+    return text.lower()
+
+
+def humanize(column_name):
+    """Libellé lisible d'un nom de colonne (camelCase / snake_case)."""
+    text = re.sub(r"([a-z])([A-Z])", r"\1 \2", str(column_name)).replace("_", " ")
+    return text.strip().capitalize()
+
+
+def _is_numeric(series):
+    if pd.api.types.is_bool_dtype(series):
+        return False
+    if pd.api.types.is_numeric_dtype(series):
+        return True
+    # mysql-connector renvoie les DECIMAL sous forme d'objets Decimal.
+    if series.dtype == object:
+        non_null = series.dropna()
+        return len(non_null) > 0 and pd.to_numeric(non_null, errors="coerce").notna().all()
+    return False
+
+
+def _is_date_objects(series):
+    # Les colonnes DATE/DATETIME arrivent en objets datetime.date via mysql-connector.
+    non_null = series.dropna()
+    return len(non_null) > 0 and all(isinstance(value, datetime.date) for value in non_null.head(50))
+
+
+def _is_period(name, series):
+    """Colonne numérique d'années (1900-2100) ou de mois, trimestres, semaines (1-53)."""
+    if NUMERIC_NAME.search(name.replace(" ", "_")):
+        return False
+    if YEAR_NAME.search(name):
+        low, high = 1900, 2100
+    elif CYCLE_NAME.search(name):
+        low, high = 1, 53
+    else:
+        return False
+    values = pd.to_numeric(series.dropna(), errors="coerce")
+    return (
+        len(values) > 0 and values.notna().all() and (values == values.round()).all()
+        and low <= values.min() and values.max() <= high
+    )
+
+
+def classify_columns(columns, data=None):
+    """
+    Rôle de chaque colonne : 'temporal', 'numeric' ou 'categorical'.
+
+    Sans données, le rôle est deviné d'après le nom seul.
+    """
+    roles = {}
+    for column in columns:
+        name = humanize(column)
+        if data is not None and column in data:
+            series = data[column]
+            if pd.api.types.is_datetime64_any_dtype(series):
+                roles[column] = "temporal"
+            elif _is_numeric(series):
+                # Le type prime sur le nom : seules les années et les mois restent des périodes.
+                roles[column] = "temporal" if _is_period(name, series) else "numeric"
+            elif _is_date_objects(series) or TEMPORAL_NAME.search(name):
+                roles[column] = "temporal"
+            else:
+                roles[column] = "categorical"
+        elif TEMPORAL_NAME.search(name):
+            roles[column] = "temporal"
+        elif NUMERIC_NAME.search(name):
+            roles[column] = "numeric"
+        else:
+            roles[column] = "categorical"
+    return roles
+
+
+def _best_numeric(numeric_columns, question):
+    """Colonne numérique la plus proche de la question (sinon la dernière, souvent l'agrégat)."""
+    words = set(re.findall(r"[a-z]{4,}", _normalize(question)))
+    for column in numeric_columns:
+        column_words = set(re.findall(r"[a-z]{4,}", _normalize(humanize(column))))
+        if words & column_words:
+            return column
+    return numeric_columns[-1]
+
+
+def plan_chart(user_question, columns, data=None):
+    """
+    Propose une configuration de graphique et un indice de confiance entre 0 et 1.
+
+    Args:
+        user_question (str): La question posée par l'utilisateur.
+        columns (list): Les noms des colonnes du résultat.
+        data (DataFrame): Les données, si elles sont déjà disponibles (types et cardinalités).
+
+    Returns:
+        tuple: (configuration au format de generate_chart_config ou None, confiance)
+    """
+    columns = list(columns)
+    roles = classify_columns(columns, data)
+    temporal = [c for c in columns if roles[c] == "temporal"]
+    numeric = [c for c in columns if roles[c] == "numeric"]
+    categorical = [c for c in columns if roles[c] == "categorical"]
+    question = _normalize(user_question)
+
+    if not numeric:
+        return None, 0.0
+    y_column = _best_numeric(numeric, question)
+    # Une seule ligne : rien à comparer, le LLM jugera s'il y a lieu de tracer quelque chose.
+    if data is not None and len(data) <= 1:
+        return None, 0.2
+
+    if temporal:
+        x_column = temporal[0]
+        chart_type = "line"
+        confidence = 0.9 if not categorical else 0.6
+    elif categorical:
+        x_column = categorical[0]
+        cardinality = data[x_column].nunique() if data is not None else None
+        if SHARE_WORDS.search(question) and (cardinality is None or cardinality <= MAX_PIE_SLICES):
+            chart_type = "pie"
+        else:
+            chart_type = "bar"
+        confidence = 0.9 if len(categorical) == 1 else 0.7
+        if TREND_WORDS.search(question):
+            confidence -= 0.3
+    elif len(numeric) >= 2:
+        x_column = numeric[0]
+        y_column = _best_numeric(numeric[1:], question)
+        chart_type = "bar"
+        confidence = 0.4
+    else:
+        return None, 0.2
+
+    # Sans données, les rôles sont devinés d'après les noms : confiance plafonnée.
+    if data is None:
+        confidence = min(confidence, 0.75)
+    if len(numeric) > 2:
+        confidence -= 0.1
+
+    title = user_question.strip().rstrip("?").strip()
+    chart_config = {
+        "chart_type": chart_type,
+        "x_column": x_column,
+        "y_column": y_column,
+        "title": title[:1].upper() + title[1:],
+        "x_label": humanize(x_column),
+        "y_label": humanize(y_column),
+    }
+    return chart_config, round(max(0.0, min(1.0, confidence)), 2)
+
+
+def min_confidence():
+    """Seuil de confiance au-dessous duquel le LLM est consulté (CHART_PLANNER_MIN_CONFIDENCE)."""
+    return float(os.getenv("CHART_PLANNER_MIN_CONFIDENCE", "0.7"))
+
+
+class PlannerStats:
+    """Compteurs : graphiques planifiés localement ou par le LLM."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.local = 0
+        self.llm = 0
+
+    def record(self, used_llm):
+        with self._lock:
+            if used_llm:
+                self.llm += 1
+            else:
+                self.local += 1
+
+    def summary(self):
+        total = self.local + self.llm
+        return {"local": self.local, "llm": self.llm, "local_rate": self.local / total if total else 0.0}
+
+
+planner_stats = PlannerStats()
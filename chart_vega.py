@@ -0,0 +1,90 @@
+# chart_vega.py
+
+# Traduction de la configuration de graphique (chart_type, x_column, y_column, ...) en
+# spécification Vega-Lite : le navigateur dessine le graphique (st.vega_lite_chart), le
+# serveur ne fait que sérialiser quelques centaines de points au plus.
+
+# Importations
+import json
+
+import pandas as pd
+
+from chart_planner import _is_date_objects
+
+VEGA_LITE_SCHEMA = "https://vega.github.io/schema/vega-lite/v5.json"
+
+
+def _field_type(series):
+    if pd.api.types.is_datetime64_any_dtype(series) or _is_date_objects(series):
+        return "temporal"
+    if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+        return "quantitative"
+    return "nominal"
+
+
+def _field(name):
+    # Vega-Lite lit « . » et « [] » comme un accès à un champ imbriqué : o.orderDate ou
+    # SUM(od.quantityOrdered * od.priceEach) désignent ici des colonnes entières.
+    return str(name).replace(".", "\\.").replace("[", "\\[").replace("]", "\\]")
+
+
+def _records(df):
+    # to_json gère les types NumPy, les dates (ISO 8601) et les valeurs manquantes (null).
+    return json.loads(df.to_json(orient="records", date_format="iso"))
+
+
+def build_vega_spec(df, chart_config):
+    """
+    Spécification Vega-Lite équivalente au graphique matplotlib de `render_chart`.
+
+    Args:
+        df (DataFrame): Les données, déjà réduites par `prepare_chart_data`.
+        chart_config (dict): chart_type, x_column, y_column, title, x_label, y_label.
+
+    Returns:
+        dict: La spécification (données incluses), ou None si le type n'est pas pris en charge.
+    """
+    chart_type = chart_config['chart_type']
+    x_column, y_column = chart_config['x_column'], chart_config['y_column']
+    x_type = _field_type(df[x_column])
+    tooltip = [
+        {"field": _field(x_column), "type": x_type, "title": chart_config.get('x_label', x_column)},
+        {"field": _field(y_column), "type": "quantitative", "title": chart_config.get('y_label', y_column), "format": ",.2f"},
+    ]
+    spec = {
+        "$schema": VEGA_LITE_SCHEMA,
+        "title": chart_config.get('title', ''),
+        "data": {"values": _records(df)},
+    }
+
+    if chart_type == 'pie':
+        spec["mark"] = {"type": "arc", "tooltip": True}
+        spec["encoding"] = {
+            "theta": {"field": _field(y_column), "type": "quantitative", "stack": True},
+            "color": {"field": _field(x_column), "type": "nominal", "title": chart_config.get('x_label', x_column)},
+            "tooltip": tooltip,
+        }
+        return spec
+
+    if chart_type not in ('bar', 'line'):
+        print("Type de graphique non pris en charge.")
+        return None
+
+    x_encoding = {"field": _field(x_column), "type": x_type, "title": chart_config.get('x_label', x_column)}
+    if x_type == "nominal":
+        # Conserver l'ordre des lignes (celui de l'ORDER BY) plutôt que l'ordre alphabétique.
+        x_encoding["sort"] = None
+        x_encoding["axis"] = {"labelAngle": -45}
+    spec["mark"] = {"type": "bar"} if chart_type == 'bar' else {"type": "line", "point": True, "strokeDash": [6, 4]}
+    spec["encoding"] = {
+        "x": x_encoding,
+        # Même lecture que _y_formatter : 1.2M, 350k...
+        "y": {"field": _field(y_column), "type": "quantitative", "title": chart_config.get('y_label', y_column), "axis": {"format": "~s"}},
+        "tooltip": tooltip,
+    }
+    if chart_type == 'bar':
+        spec["encoding"]["color"] = {"field": _field(x_column), "type": "nominal", "legend": None, "scale": {"scheme": "viridis"}, "sort": None}
+    if x_type != "nominal":
+        # Zoom et déplacement à la molette / souris sur les axes continus.
+        spec["params"] = [{"name": "zoom", "select": "interval", "bind": "scales"}]
+    return spec
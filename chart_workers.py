@@ -0,0 +1,176 @@
+# chart_workers.py
+
+# Rendu des graphiques dans des processus dédiés : matplotlib/seaborn sont gourmands en CPU
+# et gardent le GIL, un gros graphique ne doit pas bloquer les autres sessions Streamlit.
+
+# Importations
+import atexit
+import multiprocessing
+import os
+import queue
+import threading
+
+
+class RenderError(Exception):
+    """Le rendu du graphique a échoué dans le processus de rendu."""
+
+
+class RenderTimeoutError(RenderError):
+    """Le rendu a dépassé le délai imparti et a été annulé."""
+
+
+class RenderQueueFullError(RenderError):
+    """Trop de rendus sont déjà en attente."""
+
+
+def _worker_main(conn):
+    """Boucle d'un processus de rendu : modules importés une fois, puis un rendu par message."""
+    import matplotlib
+    matplotlib.use("Agg")
+    from visualizer import render_chart
+
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:
+            break
+        if job is None:
+            break
+        df, chart_config, fmt = job
+        try:
+            conn.send(("ok", render_chart(df, chart_config, fmt)))
+        except Exception as e:
+            conn.send(("error", f"{type(e).__name__}: {e}"))
+
+
+class _Worker:
+    def __init__(self, context):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child_conn,), daemon=True)
+        self.process.start()
+        child_conn.close()
+
+    def kill(self):
+        self.process.terminate()
+        self.process.join(timeout=1)
+        self.conn.close()
+
+
+class ChartRenderPool:
+    """
+    Pool de processus de rendu préchauffés.
+
+    Args:
+        workers (int): Nombre de processus de rendu.
+        queue_depth (int): Nombre de rendus pouvant attendre un processus libre ; au-delà,
+            `render` échoue immédiatement avec RenderQueueFullError.
+        timeout (float): Durée maximale d'un rendu (secondes). Un rendu trop long est annulé :
+            son processus est tué puis remplacé, sans toucher aux autres rendus en cours.
+    """
+
+    def __init__(self, workers=2, queue_depth=8, timeout=20.0, start_method="spawn"):
+        self.workers = workers
+        self.queue_depth = queue_depth
+        self.timeout = timeout
+        self._context = multiprocessing.get_context(start_method)
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._closed = False
+        for _ in range(workers):
+            self._idle.put(_Worker(self._context))
+
+    @classmethod
+    def from_env(cls):
+        """Pool configuré par CHART_WORKERS, CHART_QUEUE_DEPTH et CHART_RENDER_TIMEOUT."""
+        return cls(
+            workers=chart_worker_count(),
+            queue_depth=int(os.getenv("CHART_QUEUE_DEPTH", "8")),
+            timeout=float(os.getenv("CHART_RENDER_TIMEOUT", "20")),
+            start_method=os.getenv("CHART_WORKER_START_METHOD", "spawn"),
+        )
+
+    def render(self, df, chart_config, fmt="png", timeout=None):
+        """Rend le graphique dans un processus du pool et renvoie l'image (bytes)."""
+        timeout = self.timeout if timeout is None else timeout
+        with self._lock:
+            if self._closed:
+                raise RenderError("Le pool de rendu est arrêté.")
+            if self._pending >= self.workers + self.queue_depth:
+                raise RenderQueueFullError(
+                    "Trop de graphiques en cours de rendu, veuillez réessayer dans un instant."
+                )
+            self._pending += 1
+        try:
+            try:
+                worker = self._idle.get(timeout=timeout)
+            except queue.Empty:
+                raise RenderTimeoutError(
+                    f"Aucun processus de rendu disponible après {timeout:.0f} s."
+                ) from None
+            return self._run(worker, (df, chart_config, fmt), timeout)
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def _run(self, worker, job, timeout):
+        try:
+            worker.conn.send(job)
+            finished = worker.conn.poll(timeout)
+            status, payload = worker.conn.recv() if finished else (None, None)
+        except (EOFError, OSError):
+            worker.kill()
+            self._replace()
+            raise RenderError("Le processus de rendu s'est arrêté de façon inattendue.") from None
+        if not finished:
+            # Seul le processus bloqué est tué ; les autres rendus continuent.
+            worker.kill()
+            self._replace()
+            raise RenderTimeoutError(
+                f"Le rendu du graphique a dépassé {timeout:.0f} s et a été annulé "
+                "(données trop volumineuses ?)."
+            )
+        self._idle.put(worker)
+        if status == "error":
+            raise RenderError(payload)
+        return payload
+
+    def _replace(self):
+        if not self._closed:
+            self._idle.put(_Worker(self._context))
+
+    def close(self):
+        """Arrête tous les processus de rendu inactifs."""
+        self._closed = True
+        while True:
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                worker.conn.send(None)
+            except OSError:
+                pass
+            worker.kill()
+
+
+def chart_worker_count():
+    """Nombre de processus de rendu (CHART_WORKERS ; 0 = rendu dans le processus courant)."""
+    default = min(4, os.cpu_count() or 1)
+    return int(os.getenv("CHART_WORKERS", str(default)))
+
+
+_render_pool = None
+_render_pool_lock = threading.Lock()
+
+
+def get_render_pool():
+    """Pool de rendu partagé par le processus (créé et préchauffé au premier appel), ou None."""
+    global _render_pool
+    if chart_worker_count() <= 0:
+        return None
+    with _render_pool_lock:
+        if _render_pool is None:
+            _render_pool = ChartRenderPool.from_env()
+            atexit.register(_render_pool.close)
+        return _render_pool
@@ -0,0 +1,7 @@
+# conftest.py
+
+# Les modules de l'application (agent, chart_*) sont importés depuis la racine du dépôt.
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,43 @@
+# test_chart_data.py
+
+import numpy as np
+import pandas as pd
+
+from chart_data import OTHERS_LABEL, lttb_indices, prepare_chart_data, top_n_with_others
+
+
+def test_lttb_keeps_ends_and_peaks():
+    x = np.arange(1000, dtype=float)
+    y = np.zeros(1000)
+    y[500], y[700] = 100.0, -100.0
+    indices = lttb_indices(x, y, 50)
+    assert len(indices) == 50
+    assert indices[0] == 0 and indices[-1] == 999
+    assert 500 in indices and 700 in indices
+    assert (np.diff(indices) > 0).all()
+
+
+def test_lttb_returns_all_points_under_threshold():
+    assert lttb_indices(np.arange(10.0), np.arange(10.0), 20).tolist() == list(range(10))
+
+
+def test_top_n_with_others_sums_the_tail():
+    df = pd.DataFrame({"pays": list("abcdef"), "total": [6.0, 5.0, 4.0, 3.0, 2.0, 1.0]})
+    reduced = top_n_with_others(df, "pays", "total", 3)
+    assert reduced["pays"].tolist() == ["a", "b", OTHERS_LABEL]
+    assert reduced["total"].tolist() == [6.0, 5.0, 10.0]
+
+
+def test_top_n_with_others_averages_rates():
+    df = pd.DataFrame({"pays": list("abcd"), "taux": [4.0, 3.0, 2.0, 1.0]})
+    reduced = top_n_with_others(df, "pays", "taux", 3)
+    assert reduced["taux"].tolist() == [4.0, 3.0, 1.5]
+
+
+def test_prepare_chart_data_reduces_long_lines(monkeypatch):
+    monkeypatch.setenv("CHART_MAX_POINTS", "100")
+    df = pd.DataFrame({"x": np.arange(5000), "total": np.sin(np.arange(5000) / 100)})
+    reduced, config = prepare_chart_data(df, {"chart_type": "line", "x_column": "x", "y_column": "total"})
+    assert len(reduced) == 100
+    assert list(reduced.columns) == ["x", "total"]
+    assert config["x_column"] == "x"
@@ -0,0 +1,76 @@
+# test_followup.py
+
+import pandas as pd
+import pytest
+
+from agent.followup import MISSING, apply_operations, parse_followup, refine
+
+
+@pytest.fixture
+def sales():
+    return pd.DataFrame({
+        "country": ["France", "France", "USA", "USA", "Spain"],
+        "customerName": ["a", "b", "c", "d", "e"],
+        "orderYear": [2003, 2004, 2004, 2003, 2004],
+        "totalSales": [5.0, 9.0, 8.0, 3.0, 1.0],
+    })
+
+
+def test_top_n_sorts_by_measure(sales):
+    operations = parse_followup("seulement le top 2", sales)
+    assert operations == [{"op": "head", "n": 2, "column": "totalSales", "ascending": False}]
+    assert apply_operations(sales, operations)["customerName"].tolist() == ["b", "c"]
+
+
+def test_filter_on_value_and_year(sales):
+    operations = parse_followup("juste France", sales)
+    assert operations == [{"op": "filter", "column": "country", "operator": "==", "value": "France"}]
+    operations = parse_followup("top 1 en 2004", sales)
+    assert [operation["op"] for operation in operations] == ["filter", "head"]
+    assert apply_operations(sales, operations)["customerName"].tolist() == ["b"]
+
+
+def test_equal_filters_on_same_column_are_merged(sales):
+    operations = parse_followup("France et Espagne", sales)
+    assert operations == [{"op": "filter", "column": "country", "operator": "in", "value": ["France", "Spain"]}]
+
+
+def test_sort_and_ratio(sales):
+    operations = parse_followup("trie par pays, en pourcentage", sales)
+    result = apply_operations(sales, operations)
+    assert result["country"].tolist() == ["France", "France", "Spain", "USA", "USA"]
+    assert result["totalSales (%)"].sum() == pytest.approx(100, abs=0.05)
+
+
+def test_group_by_column(sales):
+    result = apply_operations(sales, parse_followup("par pays", sales))
+    assert result.set_index("country")["totalSales"].to_dict() == {"France": 14.0, "USA": 11.0, "Spain": 1.0}
+
+
+def test_top_n_per_group(sales):
+    operations = parse_followup("top 1 par pays", sales)
+    assert operations == [{"op": "head", "n": 1, "column": "totalSales", "ascending": False, "by": "country"}]
+    assert sorted(apply_operations(sales, operations)["customerName"]) == ["b", "c", "e"]
+
+
+def test_missing_column_needs_sql(sales):
+    assert parse_followup("par ville", sales) is MISSING
+    assert parse_followup("top 2 par ville", sales) is MISSING
+
+
+def test_apply_operations_does_not_modify_input(sales):
+    before = sales.copy()
+    apply_operations(sales, [{"op": "sort", "column": "totalSales", "ascending": True}])
+    pd.testing.assert_frame_equal(sales, before)
+
+
+def test_refine_ignores_new_questions(sales):
+    assert refine("quels clients de France ont commandé en 2004", "ventes par client", sales) is None
+
+
+def test_refine_limited_result_only_narrows_locally(sales):
+    ordered = sales.sort_values("totalSales", ascending=False)
+    ordered.attrs["limited"] = True
+    assert refine("top 2", "ventes par client", ordered).mode == "local"
+    for followup in ("bottom 2", "juste 2004", "en pourcentage", "trie par pays"):
+        assert refine(followup, "ventes par client", ordered).mode == "sql"
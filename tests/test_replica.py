@@ -0,0 +1,37 @@
+# test_replica.py
+
+import pytest
+
+from agent.replica import UnsupportedSQLError, translate_mysql
+
+
+def test_translates_date_format_like_and_limit_offset():
+    sql = "SELECT DATE_FORMAT(o.orderDate, '%Y-%m') AS mois FROM orders o WHERE c.name LIKE 'a%' LIMIT 5, 10;"
+    assert translate_mysql(sql) == (
+        "SELECT strftime(o.orderDate, '%Y-%m') AS mois FROM orders o WHERE c.name ILIKE 'a%' LIMIT 10 OFFSET 5"
+    )
+
+
+def test_translates_date_arithmetic_casts_and_div():
+    sql = "SELECT DATEDIFF(a, b), DATE_ADD(a, INTERVAL 3 DAY), CAST(x AS SIGNED), 7 DIV 2 FROM t"
+    assert translate_mysql(sql) == (
+        "SELECT date_diff('day', CAST(b AS DATE), CAST(a AS DATE)), (a + INTERVAL (3) DAY), CAST(x AS BIGINT), 7 // 2 FROM t"
+    )
+
+
+def test_quotes_and_hints():
+    sql = "SELECT /*+ MAX_EXECUTION_TIME(5) */ `order` FROM t WHERE x = \"it's\""
+    assert translate_mysql(sql) == "SELECT  \"order\" FROM t WHERE x = 'it''s'"
+
+
+def test_literals_are_not_rewritten():
+    assert translate_mysql("SELECT 'LIKE', 'a DIV b' FROM t") == "SELECT 'LIKE', 'a DIV b' FROM t"
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT GROUP_CONCAT(a SEPARATOR ',') FROM t",
+    "SELECT @x := 1",
+])
+def test_unsupported_syntax(sql):
+    with pytest.raises(UnsupportedSQLError):
+        translate_mysql(sql)
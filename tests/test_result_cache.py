@@ -0,0 +1,52 @@
+# test_result_cache.py
+
+import pandas as pd
+
+from agent.result_cache import ResultCache, extract_tables, normalize_sql
+
+
+def test_normalize_sql_collapses_whitespace_and_drops_comments():
+    sql = "SELECT  a,\n\tb -- colonnes\nFROM t /* table */ ;"
+    assert normalize_sql(sql) == "SELECT a, b FROM t"
+
+
+def test_normalize_sql_keeps_whitespace_inside_literals():
+    assert normalize_sql("SELECT 'a  b'") != normalize_sql("SELECT 'a b'")
+    assert normalize_sql("SELECT * FROM t WHERE a = 'it''s  ok'  -- x") == "SELECT * FROM t WHERE a = 'it''s  ok'"
+
+
+def test_extract_tables():
+    sql = "SELECT * FROM `Orders` o JOIN classicmodels.customers c ON c.id = o.id"
+    assert extract_tables(sql) == {"orders", "customers"}
+    assert extract_tables("SELECT * FROM orders o, payments p WHERE o.id = p.id") == {"orders", "payments"}
+
+
+def _cache():
+    cache = ResultCache()
+    # Versions déjà lues : aucun accès à MySQL.
+    cache._checked_at = float("inf")
+    return cache
+
+
+def test_result_cache_hit_and_table_invalidation():
+    cache = _cache()
+    results = pd.DataFrame({"a": [1]})
+    cache.put("SELECT a FROM t", results)
+    assert cache.get(None, "SELECT  a FROM t;") is results
+    cache.bump_table_version("t")
+    assert cache.get(None, "SELECT a FROM t") is None
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_result_cache_invalidates_views_through_their_base_tables():
+    cache = _cache()
+    cache._view_tables = {"recouvrement": {"customers", "payments"}, "synthese": {"recouvrement"}}
+    cache.put("SELECT * FROM synthese", pd.DataFrame({"a": [1]}))
+    cache.bump_table_version("payments")
+    assert cache.get(None, "SELECT * FROM synthese") is None
+
+
+def test_result_cache_ignores_writes():
+    cache = _cache()
+    cache.put("UPDATE t SET a = 1", pd.DataFrame({"a": [1]}))
+    assert cache.stats()["entries"] == 0
@@ -0,0 +1,34 @@
+# test_rules.py
+
+from agent.rules import ALWAYS_ON, RuleMatcher, normalize_text, parse_rules
+
+RULES_TEXT = """Règles :
+1. Répondez uniquement par la requête SQL.
+2. Le chiffre d'affaires se calcule avec quantityOrdered * priceEach.
+29. Jamais d'agrégat imbriqué.
+45. Le taux de recouvrement est dans la vue recouvrement.
+"""
+
+
+def test_normalize_text():
+    assert normalize_text("  Chiffre   d'Affaires ÉTÉ ") == "chiffre d'affaires ete"
+
+
+def test_parse_rules_splits_numbered_rules():
+    header, rules = parse_rules(RULES_TEXT)
+    assert header == "Règles :\n"
+    assert [rule.number for rule in rules] == [1, 2, 29, 45]
+    assert rules[1].text.startswith("2. Le chiffre") and rules[1].text.endswith("priceEach.\n")
+    assert [rule.always for rule in rules] == [number in ALWAYS_ON for number in (1, 2, 29, 45)]
+
+
+def test_rule_matcher_keeps_always_on_and_triggered_rules():
+    matcher = RuleMatcher(RULES_TEXT)
+    assert [rule.number for rule in matcher.match("Quels sont les managers ?")] == [1, 29]
+    assert [rule.number for rule in matcher.match("Chiffre d'affaires en 2004")] == [1, 2, 29]
+
+
+def test_rule_matcher_render_keeps_original_order():
+    rendered = RuleMatcher(RULES_TEXT).render("CA par pays")
+    assert rendered.startswith("Règles :\n1. ")
+    assert rendered.index("2. ") < rendered.index("29. ")
@@ -0,0 +1,110 @@
+# test_sql_guard.py
+
+import pytest
+
+from agent.sql_guard import (
+    QueryRejectedError, SQLGuard, check_read_only, ensure_limit, is_single_row_aggregate, reaches_limit,
+    strip_comments,
+)
+
+
+# --- Commentaires ---
+def test_strip_comments_removes_line_and_block_comments():
+    sql = "SELECT a -- colonne\nFROM t /* table */ WHERE b = 1 # fin"
+    assert strip_comments(sql) == "SELECT a \nFROM t   WHERE b = 1"
+
+
+def test_strip_comments_keeps_quoted_markers_and_hints():
+    sql = "SELECT /*+ MAX_EXECUTION_TIME(5) */ '--a', \"#b\", `c/*d*/` FROM t"
+    assert strip_comments(sql) == sql
+
+
+def test_strip_comments_ignores_apostrophe_inside_comment():
+    assert strip_comments("SELECT a FROM t -- l'année\nWHERE b = 'x'") == "SELECT a FROM t \nWHERE b = 'x'"
+
+
+def test_double_dash_without_space_is_not_a_comment():
+    assert strip_comments("SELECT 1--1") == "SELECT 1--1"
+
+
+# --- Lecture seule ---
+def test_check_read_only_returns_statement_without_comments_or_semicolon():
+    assert check_read_only("SELECT a FROM t; -- l'essentiel") == ("SELECT a FROM t", "SELECT")
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT 1; SELECT 2",
+    "SELECT 1; DROP TABLE t",
+    "SELECT 1 /* ; */; DELETE FROM t",
+])
+def test_check_read_only_rejects_multiple_statements(sql):
+    with pytest.raises(QueryRejectedError):
+        check_read_only(sql)
+
+
+@pytest.mark.parametrize("sql", [
+    "DELETE FROM t",
+    "UPDATE t SET a = 1",
+    "WITH x AS (SELECT 1) DELETE FROM t",
+    "SELECT * FROM t INTO OUTFILE '/tmp/t.csv'",
+    "SELECT * FROM t FOR UPDATE",
+    "-- commentaire\nDROP TABLE t",
+])
+def test_check_read_only_rejects_writes(sql):
+    with pytest.raises(QueryRejectedError):
+        check_read_only(sql)
+
+
+def test_check_read_only_accepts_write_words_in_strings_and_functions():
+    sql = "SELECT REPLACE(name, 'a', 'b'), 'DELETE FROM t; UPDATE' FROM t"
+    assert check_read_only(sql) == (sql, "SELECT")
+
+
+# --- LIMIT ---
+def test_ensure_limit_appends_limit():
+    assert ensure_limit("SELECT a FROM t", 1000) == ("SELECT a FROM t\nLIMIT 1000", True)
+
+
+def test_ensure_limit_keeps_existing_top_level_limit():
+    assert ensure_limit("SELECT a FROM t LIMIT 5", 1000) == ("SELECT a FROM t LIMIT 5", False)
+
+
+def test_ensure_limit_ignores_limit_in_subquery_and_string():
+    sql = "SELECT a FROM (SELECT a FROM t LIMIT 5) AS x WHERE b <> 'LIMIT 3'"
+    assert ensure_limit(sql, 1000) == (sql + "\nLIMIT 1000", True)
+
+
+@pytest.mark.parametrize("sql, rows, expected", [
+    ("SELECT a FROM t LIMIT 10", 10, True),
+    ("SELECT a FROM t LIMIT 10", 3, False),
+    ("SELECT a FROM t LIMIT 5, 10", 3, True),
+    ("SELECT a FROM t LIMIT 10 OFFSET 20", 3, True),
+    ("SELECT a FROM (SELECT a FROM t LIMIT 1) AS x", 1, False),
+])
+def test_reaches_limit(sql, rows, expected):
+    assert reaches_limit(sql, rows) is expected
+
+
+@pytest.mark.parametrize("sql, expected", [
+    ("SELECT COUNT(*) FROM t", True),
+    ("SELECT SUM(a) / SUM(b) AS ratio, MAX(c) FROM t", True),
+    ("SELECT a, COUNT(*) FROM t GROUP BY a", False),
+    ("SELECT a FROM t", False),
+    ("SELECT ROW_NUMBER() OVER (ORDER BY a) FROM t", False),
+])
+def test_is_single_row_aggregate(sql, expected):
+    assert is_single_row_aggregate(sql) is expected
+
+
+def test_prepare_flags_auto_limit_but_not_single_row_aggregates():
+    guard = SQLGuard(max_execution_ms=0)
+    statement, warnings, limited = guard.prepare(None, "SELECT a FROM t;", explain=False)
+    assert statement == "SELECT a FROM t\nLIMIT 1000"
+    assert limited and len(warnings) == 1
+    _, warnings, limited = guard.prepare(None, "SELECT COUNT(*) FROM t", explain=False)
+    assert not limited and warnings == []
+
+
+def test_prepare_adds_execution_time_hint():
+    statement, _, _ = SQLGuard(max_execution_ms=5000).prepare(None, "SELECT a FROM t LIMIT 3", explain=False)
+    assert statement == "SELECT /*+ MAX_EXECUTION_TIME(5000) */ a FROM t LIMIT 3"
@@ -0,0 +1,40 @@
+# test_templates.py
+
+import pytest
+
+from agent.templates import match_template
+
+
+def test_turnover_with_year():
+    name, sql = match_template("Quel est le chiffre d'affaires en 2004 ?")
+    assert name == "turnover"
+    assert "YEAR(o.orderDate) = 2004" in sql and sql.endswith("LIMIT 1;")
+
+
+def test_best_customers_with_country_and_top_n():
+    name, sql = match_template("top 5 meilleurs clients en France")
+    assert name == "best_customers"
+    assert "c.country = 'France'" in sql
+    assert sql.endswith("cc.chiffre_affaire_client DESC\nLIMIT 5;")
+
+
+def test_top_products_ascending():
+    name, sql = match_template("top 3 produits les moins vendus en 2003")
+    assert name == "top_products"
+    assert "YEAR(o.orderDate) = 2003" in sql and sql.endswith("quantite_vendue ASC\nLIMIT 3;")
+
+
+def test_listing_templates_are_limited():
+    _, sql = match_template("Quels sont les managers ?")
+    assert sql.endswith("LIMIT 100;")
+
+
+@pytest.mark.parametrize("question", [
+    "top 0 clients",
+    # Le modèle de chiffre d'affaires ne filtre pas par pays.
+    "chiffre d'affaires de la France",
+    # Mots que le modèle n'explique pas : la question part vers le LLM.
+    "chiffre d'affaires des clients qui ont payé par chèque",
+])
+def test_unsupported_questions_go_to_the_llm(question):
+    assert match_template(question) == (None, None)
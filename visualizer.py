@@ -2,41 +2,55 @@
 
 # Importations pour la visualisation
 import pandas as pd
-import matplotlib.pyplot as plt
 import seaborn as sns
+import hashlib
+import io
 import json
 import os
-from groq import Groq
 import re 
-import subprocess
-import sys
+from matplotlib.figure import Figure
 from matplotlib.ticker import FuncFormatter
 
+from agent.cache import LRUCache
+from agent.llm_gateway import create_groq_client, gateway
+from agent.metrics import metrics
+from chart_data import prepare_chart_data
+from chart_vega import build_vega_spec
+from chart_workers import RenderQueueFullError, RenderTimeoutError, get_render_pool
+from chart_planner import min_confidence, plan_chart, planner_stats
+
+# Style Seaborn appliqué une seule fois au chargement du module : le rendu ne touche
+# ensuite à aucun état global de pyplot et peut s'exécuter dans plusieurs threads.
+sns.set_theme(style="whitegrid")
+
+# Graphiques déjà rendus, indexés par le contenu (configuration + données + format).
+chart_cache = LRUCache(max_entries=int(os.getenv("CHART_CACHE_SIZE", "128")))
+
+CHART_BACKENDS = ("matplotlib", "vega")
+
+def chart_backend():
+    """Moteur de rendu par défaut (CHART_BACKEND) : 'matplotlib' (image PNG/SVG) ou 'vega'."""
+    backend = os.getenv("CHART_BACKEND", "matplotlib").lower()
+    return backend if backend in CHART_BACKENDS else "matplotlib"
+
 def setup_groq_client():
     """Configure et retourne le client Groq."""
-    api_key = os.getenv("GROQ_API_KEY")
-    if not api_key:
-        raise ValueError("GROQ_API_KEY not found in environment variables.")
-    return Groq(api_key=api_key)
+    return create_groq_client()
 
-def generate_visualization(user_question, query_results, groq_client):
+def generate_chart_config(user_question, columns, groq_client):
     """
-    Génère un graphique à partir des résultats d'une requête.
-    
+    Demande au LLM la configuration du graphique à partir des seuls noms de colonnes.
+
+    Ne dépend pas des données : peut donc être lancée pendant l'exécution de la requête.
+
     Args:
         user_question (str): La question posée par l'utilisateur.
-        query_results (list): Les résultats de la requête SQL sous forme de liste de dictionnaires.
+        columns (list): Les noms des colonnes du résultat.
         groq_client: L'instance du client Groq pour interagir avec le LLM.
-    
+
     Returns:
-        str: Le chemin vers le fichier image du graphique généré, ou None en cas d'échec.
+        dict: La configuration du graphique, ou None en cas d'échec.
     """
-    if not query_results:
-        print("Les résultats de la requête sont vides, aucun graphique à générer.")
-        return None
-
-    df = pd.DataFrame(query_results)
-
     # L'invite pour demander au LLM de choisir les paramètres de visualisation.
     visualization_prompt = f"""
     Based on the following user question and the data provided, generate a single JSON object to configure a chart.
@@ -44,7 +58,7 @@ def generate_visualization(user_question, query_results, groq_client):
     
     User Question: {user_question}
     
-    Data Columns: {list(df.columns)}
+    Data Columns: {list(columns)}
     
     JSON Object must contain the following keys:
     'chart_type': The best chart type (e.g., 'bar', 'line', 'pie'). Choose 'bar' for rankings or categorical data. Choose 'line' for time-series data. Use 'pie' for part-to-whole analysis (e.g., percentage of total).
@@ -65,16 +79,18 @@ def generate_visualization(user_question, query_results, groq_client):
     }}
     """
     
+    json_output = ""
     try:
-        chat_completion = groq_client.chat.completions.create(
+        json_output = gateway.complete(
+            groq_client,
+            purpose="chart_config",
             messages=[
                 {"role": "user", "content": visualization_prompt}
             ],
-            model="llama-3.1-8b-instant",
             temperature=0,
             max_tokens=500
         )
-        json_output = chat_completion.choices[0].message.content.strip()
+        json_output = json_output.strip()
 
         json_match = re.search(r'\{.*\}', json_output, re.DOTALL)
         if not json_match:
@@ -82,95 +98,165 @@ def generate_visualization(user_question, query_results, groq_client):
             print(f"Réponse brute de l'IA : {json_output}")
             return None
             
-        chart_config = json.loads(json_match.group(0))
+        return json.loads(json_match.group(0))
         
     except Exception as e:
         print(f"Erreur lors de la génération JSON de la visualisation : {e}")
         print(f"Réponse brute de l'IA : {json_output}")
         return None
 
-    # Création du graphique basée sur la configuration du LLM
+
+def chart_cache_key(df, chart_config, fmt):
+    """Empreinte d'un graphique : même configuration et mêmes données donnent la même image."""
+    digest = hashlib.sha256()
+    digest.update(json.dumps(chart_config, sort_keys=True, default=str).encode("utf-8"))
+    digest.update(fmt.encode("utf-8"))
+    digest.update(json.dumps([str(c) for c in df.columns]).encode("utf-8"))
     try:
-        # Utiliser Seaborn pour un style plus professionnel
-        sns.set_theme(style="whitegrid")
-        plt.figure(figsize=(12, 8))
-
-        # Vérifier si les colonnes 'year' et 'quarter' existent pour les regrouper.
-        if 'year' in df.columns and 'quarter' in df.columns:
-            # Créer une nouvelle colonne pour un affichage "année-trimestre"
-            df['year_quarter'] = df['year'].astype(str) + '-T' + df['quarter'].astype(str)
-            # Mettre à jour la colonne x dans la configuration du graphique
-            chart_config['x_column'] = 'year_quarter'
-            chart_config['x_label'] = 'Année et Trimestre'
-
-        # Trier les données pour le graphique
-        # if chart_config['y_column'] in df.columns:
-            #df = df.sort_values(by=chart_config['y_column'], ascending=False)
-        
-        if chart_config['chart_type'] == 'bar':
-            # Utiliser la colonne x_column pour les étiquettes de l'axe x
-            x_values = df[chart_config['x_column']]
-            
-            # Créer le graphique à barres
-            sns.barplot(x=x_values, y=df[chart_config['y_column']], palette="viridis", hue=x_values, legend=False)
+        digest.update(pd.util.hash_pandas_object(df, index=False).values.tobytes())
+    except TypeError:
+        digest.update(df.to_csv(index=False).encode("utf-8"))
+    return digest.hexdigest()
 
-            # Correction de l'avertissement 'set_ticklabels' en utilisant plt.xticks
-            plt.xticks(rotation=45, ha='right')
-            
-        elif chart_config['chart_type'] == 'line':
-            # Amélioration : Augmenter l'épaisseur de la ligne et la taille des marqueurs
-            sns.lineplot(x=df[chart_config['x_column']], y=df[chart_config['y_column']], marker='o', linestyle='--', linewidth=2.5, markersize=8)
-            # Ajouter une rotation pour les étiquettes de l'axe X pour les dates
-            plt.xticks(rotation=45, ha='right')
-        
-        elif chart_config['chart_type'] == 'pie':
-            # Créer un graphique en secteurs
-            plt.figure(figsize=(10, 10))
-            plt.pie(df[chart_config['y_column']], labels=df[chart_config['x_column']], autopct='%1.1f%%', startangle=90)
-            plt.title(chart_config['title'], fontsize=16, fontweight='bold')
-            plt.axis('equal') # S'assure que le graphique en secteurs est un cercle
-        
-        else:
-            print("Type de graphique non pris en charge.")
-            return None
 
-        # Amélioration : Formater l'axe Y pour une meilleure lisibilité pour les graphiques à barres et linéaires
-        if chart_config['chart_type'] in ['bar', 'line']:
-            def y_formatter(y, pos):
-                # Formate les valeurs en millions avec " M" ou en milliers avec " K"
-                if y >= 1e6:
-                    return f'{y*1e-6:.1f} M\u20AC'
-                elif y >= 1e3:
-                    return f'{y*1e-3:.1f} K\u20AC'
-                return f'{y:.0f}'
-
-            plt.gca().yaxis.set_major_formatter(FuncFormatter(y_formatter))
-
-        plt.title(chart_config['title'], fontsize=16, fontweight='bold')
-        if chart_config['chart_type'] in ['bar', 'line']:
-            plt.xlabel(chart_config['x_label'], fontsize=12)
-            plt.ylabel(chart_config['y_label'], fontsize=12)
-        plt.tight_layout()
-
-        # Enregistrer le graphique
-        file_path = "chart.png"
-        plt.savefig(file_path)
-        plt.close()
-
-        # Ajouter le code pour ouvrir automatiquement le fichier image
-        print(f"Graphique généré : {file_path}")
-        try:
-            if sys.platform == 'win32':
-                os.startfile(file_path)
-            elif sys.platform == 'darwin':  # macOS
-                subprocess.call(('open', file_path))
-            else:  # linux
-                subprocess.call(('xdg-open', file_path))
-        except FileNotFoundError:
-            print(f"Impossible d'ouvrir le fichier {file_path}. Veuillez le faire manuellement.")
-        
-        return file_path
+def _y_formatter(y, pos):
+    # Formate les valeurs en millions avec " M" ou en milliers avec " K"
+    if y >= 1e6:
+        return f'{y*1e-6:.1f} M\u20AC'
+    elif y >= 1e3:
+        return f'{y*1e-3:.1f} K\u20AC'
+    return f'{y:.0f}'
+
+
+def render_chart(df, chart_config, fmt="png"):
+    """
+    Dessine le graphique décrit par `chart_config` et renvoie l'image en mémoire.
+
+    Utilise un objet `Figure` dédié (pas l'état global de pyplot) et n'écrit aucun fichier.
+
+    Args:
+        df (DataFrame): Les données à représenter, déjà réduites par `prepare_chart_data`.
+        chart_config (dict): chart_type, x_column, y_column, title, x_label, y_label.
+        fmt (str): 'png' ou 'svg'.
+
+    Returns:
+        bytes: L'image encodée, ou None si le type de graphique n'est pas pris en charge.
+    """
+    chart_type = chart_config['chart_type']
+    x_values = df[chart_config['x_column']]
+    # Les DECIMAL MySQL arrivent en objets Decimal : conversion en flottants pour le tracé.
+    y_values = pd.to_numeric(df[chart_config['y_column']], errors='coerce')
+
+    if chart_type == 'bar':
+        fig = Figure(figsize=(12, 8))
+        ax = fig.subplots()
+        # Utiliser la colonne x_column pour les étiquettes de l'axe x
+        sns.barplot(x=x_values, y=y_values, palette="viridis", hue=x_values, legend=False, ax=ax)
+        ax.tick_params(axis='x', labelrotation=45)
+        for label in ax.get_xticklabels():
+            label.set_horizontalalignment('right')
+
+    elif chart_type == 'line':
+        fig = Figure(figsize=(12, 8))
+        ax = fig.subplots()
+        # Amélioration : Augmenter l'épaisseur de la ligne et la taille des marqueurs
+        sns.lineplot(x=x_values, y=y_values, marker='o', linestyle='--', linewidth=2.5, markersize=8, ax=ax)
+        # Ajouter une rotation pour les étiquettes de l'axe X pour les dates
+        ax.tick_params(axis='x', labelrotation=45)
+        for label in ax.get_xticklabels():
+            label.set_horizontalalignment('right')
+
+    elif chart_type == 'pie':
+        # Créer un graphique en secteurs
+        fig = Figure(figsize=(10, 10))
+        ax = fig.subplots()
+        ax.pie(y_values, labels=x_values, autopct='%1.1f%%', startangle=90)
+        ax.axis('equal') # S'assure que le graphique en secteurs est un cercle
+
+    else:
+        print("Type de graphique non pris en charge.")
+        return None
+
+    # Amélioration : Formater l'axe Y pour une meilleure lisibilité pour les graphiques à barres et linéaires
+    if chart_type in ['bar', 'line']:
+        ax.yaxis.set_major_formatter(FuncFormatter(_y_formatter))
+        ax.set_xlabel(chart_config['x_label'], fontsize=12)
+        ax.set_ylabel(chart_config['y_label'], fontsize=12)
+
+    ax.set_title(chart_config['title'], fontsize=16, fontweight='bold')
+    fig.tight_layout()
+
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format=fmt)
+    return buffer.getvalue()
+
+
+def generate_visualization(user_question, query_results, groq_client, chart_config=None, fmt="png", backend=None):
+    """
+    Génère un graphique à partir des résultats d'une requête.
+    
+    Args:
+        user_question (str): La question posée par l'utilisateur.
+        query_results (DataFrame): Les résultats de la requête SQL (ou une liste de dictionnaires).
+        groq_client: L'instance du client Groq pour interagir avec le LLM.
+        chart_config (dict): Configuration déjà obtenue (voir generate_chart_config) ; si elle est
+            absente ou ne correspond pas aux colonnes réelles, elle est planifiée localement
+            (chart_planner) ou, faute de confiance suffisante, redemandée au LLM.
+        fmt (str): Format de l'image, 'png' ou 'svg'.
+        backend (str): 'matplotlib' ou 'vega' ; par défaut, voir chart_backend().
     
+    Returns:
+        bytes: L'image du graphique (backend 'matplotlib'), ou None en cas d'échec. Une question
+        déjà posée (même configuration, mêmes données) est servie depuis `chart_cache`.
+        dict: La spécification Vega-Lite (backend 'vega'), dessinée par le navigateur.
+
+    Raises:
+        RenderTimeoutError, RenderQueueFullError: Rendu annulé ou refusé par le pool de
+            rendu (voir chart_workers) ; le message peut être affiché tel quel.
+    """
+    if query_results is None or len(query_results) == 0:
+        print("Les résultats de la requête sont vides, aucun graphique à générer.")
+        return None
+
+    # Le DataFrame de execute_sql_dataframe est utilisé tel quel, sans copie.
+    df = query_results if isinstance(query_results, pd.DataFrame) else pd.DataFrame(query_results)
+
+    if not chart_config or not {chart_config.get('x_column'), chart_config.get('y_column')} <= set(df.columns):
+        # Planification locale d'après les types des colonnes ; le LLM n'est consulté qu'en cas de doute.
+        with metrics.span("chart_plan"):
+            chart_config, confidence = plan_chart(user_question, df.columns, df)
+        planner_stats.record(used_llm=confidence < min_confidence())
+        if confidence < min_confidence():
+            chart_config = generate_chart_config(user_question, df.columns, groq_client)
+        if not chart_config:
+            return None
+
+    # Création du graphique basée sur la configuration
+    try:
+        if (backend or chart_backend()) == "vega":
+            # Aucun rendu côté serveur : seule la sérialisation des données réduites.
+            with metrics.span("chart_render", backend="vega"):
+                df, chart_config = prepare_chart_data(df, chart_config)
+                return build_vega_spec(df, chart_config)
+
+        cache_key = chart_cache_key(df, chart_config, fmt)
+        image = chart_cache.get(cache_key)
+        if image is None:
+            with metrics.span("chart_render", backend="matplotlib"):
+                # Seules les colonnes tracées, réduites à la taille du graphique, sont dessinées.
+                df, chart_config = prepare_chart_data(df, chart_config)
+                # Rendu dans un processus dédié (CHART_WORKERS), ou sur place si le pool est désactivé.
+                render_pool = get_render_pool()
+                if render_pool is not None:
+                    image = render_pool.render(df, chart_config, fmt)
+                else:
+                    image = render_chart(df, chart_config, fmt)
+            if image is not None:
+                chart_cache.put(cache_key, image)
+        return image
+
+    except (RenderTimeoutError, RenderQueueFullError):
+        raise
     except Exception as e:
         print(f"Erreur lors de la création du graphique : {e}")
         return None